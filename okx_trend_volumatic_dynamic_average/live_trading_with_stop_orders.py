@@ -2985,101 +2985,15 @@ class LiveTradingBotWithStopOrders:
             
         print(f"🔍 _save_indicator_signal被调用: timestamp={timestamp}")
         try:
-            # 提取指标数据
-            sar_result = result.get('sar_result', {})
-            print(f"🔍 sar_result keys: {list(sar_result.keys()) if sar_result else 'None'}")
-            
-            # 从ATR计算器获取ATR数据
-            atr_info = self.strategy.atr_calculator.get_atr_volatility_ratio() if hasattr(self, 'strategy') else {}
-            
-            # 从EMA计算器获取EMA数据
-            ema_info = self.strategy.ema_calculator.get_ema_info() if hasattr(self, 'strategy') else {}
-            
-            # 辅助函数：保留两位小数
-            def round_value(val):
-                if val is None:
-                    return None
-                if isinstance(val, (int, float)):
-                    return round(val, 2)
-                return val
-            
-            # 构建指标字典（使用正确的字段名，数值保留两位小数）
-            indicators_dict = {
-                'sar': {
-                    'value': round_value(sar_result.get('sar_value')),
-                    'direction': sar_result.get('trend_direction'),  # 'up' 或 'down'
-                    'sar_direction': sar_result.get('sar_direction'),  # 1 或 -1
-                    'sar_rising': sar_result.get('sar_rising'),
-                    'sar_falling': sar_result.get('sar_falling'),
-                    'bars_since_turn_up': sar_result.get('bars_since_turn_up', 0),
-                    'bars_since_turn_down': sar_result.get('bars_since_turn_down', 0)
-                },
-                'bollinger': {
-                    'upper': round_value(sar_result.get('upper')),
-                    'basis': round_value(sar_result.get('basis')),
-                    'lower': round_value(sar_result.get('lower')),
-                    'width': round_value(sar_result.get('bollinger_width')),
-                    'quarter_width': round_value(sar_result.get('quarter_bollinger_width')),
-                    'regressive_ma': round_value(sar_result.get('regressive_ma'))
-                },
-                'rsi': {
-                    'value': round_value(sar_result.get('rsi')),  # 注意：是'rsi'不是'rsi_value'
-                    'period': 14  # VIDYA策略使用默认RSI周期
-                },
-                'atr': {
-                    'atr_3': round_value(atr_info.get('atr_3')),
-                    'atr_14': round_value(atr_info.get('atr_14')),
-                    'ratio': round_value(atr_info.get('atr_ratio')),
-                    'is_filter_passed': atr_info.get('is_atr_filter_passed')
-                },
-                'ema': {
-                    'ema24': round_value(ema_info.get('ema24')),
-                    'ema50': round_value(ema_info.get('ema50')),
-                    'ema100': round_value(ema_info.get('ema100')),
-                    'previous_ema24': round_value(ema_info.get('previous_ema24')),
-                    'is_long_signal': ema_info.get('is_long_signal'),
-                    'is_short_signal': ema_info.get('is_short_signal')
-                }
-            }
-            
-            print(f"🔍 构建的指标字典: {indicators_dict}")
-            
-            # 提取信号信息
-            signal_type = None
-            signal_reason = None
-            if result.get('signals'):
-                first_signal = result['signals'][0]
-                signal_type = first_signal.get('type')
-                signal_reason = first_signal.get('reason')
-            
-            # 获取当前持仓信息
-            position = self.strategy.position
-            entry_price = self.strategy.entry_price if position else None
-            stop_loss_level = self.strategy.stop_loss_level if position else None
-            take_profit_level = self.strategy.take_profit_level if position else None
+            row = self._build_indicator_signal_row(result, timestamp, open_price, high_price, low_price, close_price, volume)
+            signal_type = row['signal_type']
             
             # 保存到数据库
             print(f"🔍 准备调用trading_db.save_indicator_signal...")
             print(f"   symbol={self.symbol}, timeframe={self.config['timeframe']}")
-            print(f"   position={position}, signal_type={signal_type}")
-            
-            signal_id = self.trading_db.save_indicator_signal(
-                timestamp=timestamp,
-                symbol=self.symbol,
-                timeframe=self.config['timeframe'],
-                open_price=open_price,
-                high_price=high_price,
-                low_price=low_price,
-                close_price=close_price,
-                volume=volume,
-                indicators_dict=indicators_dict,
-                signal_type=signal_type,
-                signal_reason=signal_reason,
-                position=position,
-                entry_price=entry_price,
-                stop_loss_level=stop_loss_level,
-                take_profit_level=take_profit_level
-            )
+            print(f"   position={row['position']}, signal_type={signal_type}")
+            
+            signal_id = self.trading_db.save_indicator_signal(**row)
             
             print(f"✅ 保存成功! signal_id={signal_id}")
             
@@ -3093,6 +3007,102 @@ class LiveTradingBotWithStopOrders:
             import traceback
             traceback.print_exc()
     
+    def _build_indicator_signal_row(self, result, timestamp, open_price, high_price, low_price, close_price, volume):
+        """构建一条指标信号记录（trading_db.save_indicator_signal 的参数字典）
+        
+        指标和持仓状态取调用时刻的值，批量保存时可以先构建、稍后一起写入
+        """
+        # 提取指标数据
+        sar_result = result.get('sar_result', {})
+        print(f"🔍 sar_result keys: {list(sar_result.keys()) if sar_result else 'None'}")
+        
+        # 从ATR计算器获取ATR数据
+        atr_info = self.strategy.atr_calculator.get_atr_volatility_ratio() if hasattr(self, 'strategy') else {}
+        
+        # 从EMA计算器获取EMA数据
+        ema_info = self.strategy.ema_calculator.get_ema_info() if hasattr(self, 'strategy') else {}
+        
+        # 辅助函数：保留两位小数
+        def round_value(val):
+            if val is None:
+                return None
+            if isinstance(val, (int, float)):
+                return round(val, 2)
+            return val
+        
+        # 构建指标字典（使用正确的字段名，数值保留两位小数）
+        indicators_dict = {
+            'sar': {
+                'value': round_value(sar_result.get('sar_value')),
+                'direction': sar_result.get('trend_direction'),  # 'up' 或 'down'
+                'sar_direction': sar_result.get('sar_direction'),  # 1 或 -1
+                'sar_rising': sar_result.get('sar_rising'),
+                'sar_falling': sar_result.get('sar_falling'),
+                'bars_since_turn_up': sar_result.get('bars_since_turn_up', 0),
+                'bars_since_turn_down': sar_result.get('bars_since_turn_down', 0)
+            },
+            'bollinger': {
+                'upper': round_value(sar_result.get('upper')),
+                'basis': round_value(sar_result.get('basis')),
+                'lower': round_value(sar_result.get('lower')),
+                'width': round_value(sar_result.get('bollinger_width')),
+                'quarter_width': round_value(sar_result.get('quarter_bollinger_width')),
+                'regressive_ma': round_value(sar_result.get('regressive_ma'))
+            },
+            'rsi': {
+                'value': round_value(sar_result.get('rsi')),  # 注意：是'rsi'不是'rsi_value'
+                'period': 14  # VIDYA策略使用默认RSI周期
+            },
+            'atr': {
+                'atr_3': round_value(atr_info.get('atr_3')),
+                'atr_14': round_value(atr_info.get('atr_14')),
+                'ratio': round_value(atr_info.get('atr_ratio')),
+                'is_filter_passed': atr_info.get('is_atr_filter_passed')
+            },
+            'ema': {
+                'ema24': round_value(ema_info.get('ema24')),
+                'ema50': round_value(ema_info.get('ema50')),
+                'ema100': round_value(ema_info.get('ema100')),
+                'previous_ema24': round_value(ema_info.get('previous_ema24')),
+                'is_long_signal': ema_info.get('is_long_signal'),
+                'is_short_signal': ema_info.get('is_short_signal')
+            }
+        }
+        
+        print(f"🔍 构建的指标字典: {indicators_dict}")
+        
+        # 提取信号信息
+        signal_type = None
+        signal_reason = None
+        if result.get('signals'):
+            first_signal = result['signals'][0]
+            signal_type = first_signal.get('type')
+            signal_reason = first_signal.get('reason')
+        
+        # 获取当前持仓信息
+        position = self.strategy.position
+        entry_price = self.strategy.entry_price if position else None
+        stop_loss_level = self.strategy.stop_loss_level if position else None
+        take_profit_level = self.strategy.take_profit_level if position else None
+        
+        return {
+            'timestamp': timestamp,
+            'symbol': self.symbol,
+            'timeframe': self.config['timeframe'],
+            'open_price': open_price,
+            'high_price': high_price,
+            'low_price': low_price,
+            'close_price': close_price,
+            'volume': volume,
+            'indicators_dict': indicators_dict,
+            'signal_type': signal_type,
+            'signal_reason': signal_reason,
+            'position': position,
+            'entry_price': entry_price,
+            'stop_loss_level': stop_loss_level,
+            'take_profit_level': take_profit_level
+        }
+    
     def check_and_fill_missing_data(self):
         """主动检查并补充缺失数据（每分钟05秒触发）
         
@@ -3198,6 +3208,7 @@ class LiveTradingBotWithStopOrders:
                             self.logger.log(f"ℹ️  缺失数据已存在于缓存，检查是否需要触发策略...")
                         
                         # 🔴 处理补充的数据：无论是否是周期末尾，都要更新策略（包括Delta Volume计算）
+                        signal_rows = []  # 补充数据产生的指标信号，处理完后一次批量写入
                         for filled_kline in filled_klines:
                             minute = filled_kline['timestamp'].minute
                             is_period_last_minute = (minute + 1) % self.period_minutes == 0
@@ -3240,18 +3251,21 @@ class LiveTradingBotWithStopOrders:
                                         filled_kline.get('volume', 0)
                                     )
                                 
-                                # 保存指标信号到数据库（只在有SAR结果时）
-                                if result and 'sar_result' in result:
+                                # 记录指标信号（只在有SAR结果时），循环结束后批量保存
+                                if result and 'sar_result' in result and self._is_trading_db_available():
                                     kline_timestamp = result.get('kline_timestamp', filled_kline['timestamp'])
-                                    self._save_indicator_signal(
-                                        result, 
-                                        kline_timestamp, 
-                                        filled_kline['open'], 
-                                        filled_kline['high'], 
-                                        filled_kline['low'], 
-                                        filled_kline['close'], 
-                                        filled_kline.get('volume', 0)
-                                    )
+                                    try:
+                                        signal_rows.append(self._build_indicator_signal_row(
+                                            result, 
+                                            kline_timestamp, 
+                                            filled_kline['open'], 
+                                            filled_kline['high'], 
+                                            filled_kline['low'], 
+                                            filled_kline['close'], 
+                                            filled_kline.get('volume', 0)
+                                        ))
+                                    except Exception as e:
+                                        print(f"❌ 构建指标信号失败: {e}")
                                 
                                 # 处理交易信号（只在首个完整周期完成后）
                                 if result and result.get('signals'):
@@ -3269,6 +3283,10 @@ class LiveTradingBotWithStopOrders:
                                     filled_kline.get('volume', 0)
                                 )
                         
+                        # 🔴 补充数据产生的指标信号一次写入数据库
+                        if signal_rows:
+                            self.trading_db.save_indicator_signals_bulk(signal_rows)
+                        
                         # 🔴 补充数据后，验证数据是否已正确添加到缓存
                         # 避免下次检查时再次发现"缺失"
                         if added_count > 0:
@@ -3688,11 +3706,11 @@ class LiveTradingBotWithStopOrders:
                     self.periodic_sync_with_okx()
                     last_periodic_sync_time = current_time
                 
-                # 🔴 每10秒：检查并优化止损单和开仓条件单（V2混合方案）
+                # 🔴 检查并优化止损单和开仓条件单（V2混合方案），间隔由交易接口按离目标价的远近给出（5秒~2分钟）
                 should_optimize_check = (
                     not self.is_warmup_phase and
                     hasattr(self.trader, 'check_and_optimize_stop_orders') and
-                    (last_optimize_check_time is None or (current_time - last_optimize_check_time).total_seconds() >= 10)  # 10秒
+                    (last_optimize_check_time is None or (current_time - last_optimize_check_time).total_seconds() >= self.trader.next_check_interval())
                 )
                 
                 if should_optimize_check:
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+日志初始化
+各模块的日志共用一个队列和一个后台线程写stdout，调用方不阻塞在IO上，多个模块的输出也保持先后顺序
+"""
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+
+_log_queue = queue.Queue(-1)
+_log_listener = None
+_listener_lock = threading.Lock()
+_warned_levels = set()  # 已警告过的无效 LOG_LEVEL，多个模块导入时只提示一次
+
+
+def _env_log_level(default):
+    """读取环境变量 LOG_LEVEL；未设置或拼错（如 VERBOSE）时用默认级别，拼错时打印警告而不是在import时抛异常"""
+    name = os.environ.get('LOG_LEVEL', '').strip().upper()
+    if not name:
+        return default
+    level = logging.getLevelName(name)  # 已知级别名返回数字，未知的返回 'Level XXX' 字符串
+    if isinstance(level, int):
+        return level
+    if name not in _warned_levels:
+        _warned_levels.add(name)
+        print(f"⚠️  无效的 LOG_LEVEL={name!r}，使用默认级别 {logging.getLevelName(default)}")
+    return default
+
+
+def _start_listener():
+    """首次调用时启动共用的后台输出线程"""
+    global _log_listener
+    with _listener_lock:
+        if _log_listener is None:
+            handler = logging.StreamHandler(sys.stdout)
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            _log_listener = logging.handlers.QueueListener(_log_queue, handler)
+            _log_listener.start()
+            atexit.register(_log_listener.stop)  # 退出前把队列里剩余的日志写完
+
+
+def get_queued_logger(name, default_level=logging.INFO):
+    """获取经共用队列输出的模块日志器
+    
+    Args:
+        name: 日志器名称（一般传 __name__）
+        default_level: 默认日志级别，环境变量 LOG_LEVEL（如 WARNING）可覆盖
+    
+    Returns:
+        logging.Logger
+    """
+    logger = logging.getLogger(name)
+    if not logger.handlers:
+        _start_listener()
+        logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+        logger.propagate = False
+    logger.setLevel(_env_log_level(default_level))
+    return logger
@@ -46,6 +46,7 @@ OKX_API_CONFIG = {
 TRADING_CONFIG = {
     'mode': 'live',  # 'paper'=模拟盘, 'live'=实盘
     'test_mode': False,  # True=测试模式（只打印不下单）, False=实际下单（⚠️ 谨慎！）
+    'debug': False,  # True=打印余额/保证金诊断（每次挂单额外请求一次余额接口）
     
     # 交易对配置
     'symbols': {
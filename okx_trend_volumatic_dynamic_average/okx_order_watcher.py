@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+OKX WebSocket 订单监听器（私有频道）
+实时接收订单/条件单状态推送（orders、orders-algo），成交后立即回调，无需轮询持仓
+以及USDT余额推送（account），查询余额时直接读推送，无需每次请求REST
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import threading
+import time
+import websocket
+
+
+class OKXOrderWatcher:
+    """OKX订单监听器 - 登录私有频道，推送永续合约订单和条件单的状态变化，以及USDT余额变化"""
+    
+    def __init__(self, api_key, secret, passphrase, on_order, paper=False):
+        """
+        初始化订单监听器
+        
+        Args:
+            api_key / secret / passphrase: OKX API凭证
+            on_order: 回调函数 on_order(channel, data)，channel为 'orders'、'orders-algo' 或 'account'，
+                      data为单条订单推送（在WebSocket线程中调用，回调内不要做耗时操作）
+            paper: 是否模拟盘
+        """
+        self.api_key = api_key
+        self.secret = secret
+        self.passphrase = passphrase
+        self.on_order = on_order
+        
+        # WebSocket URL
+        if paper:
+            self.ws_url = "wss://wspap.okx.com:8443/ws/v5/private?brokerId=9999"
+        else:
+            self.ws_url = "wss://ws.okx.com:8443/ws/v5/private"
+        
+        # WebSocket连接
+        self.ws = None
+        self.ws_thread = None
+        self.running = False
+        self.logged_in = False
+        self.login_count = 0  # 登录成功次数，变化说明发生过重连（断线期间的推送可能丢失）
+    
+    def start(self):
+        """启动订单监听（后台线程，不等待连接建立）"""
+        if self.running:
+            return
+        
+        self.running = True
+        self.ws_thread = threading.Thread(target=self._run_websocket, daemon=True)
+        self.ws_thread.start()
+        print("📡 订单监听器已启动（orders / orders-algo / account）")
+    
+    def stop(self):
+        """停止订单监听"""
+        self.running = False
+        if self.ws:
+            self.ws.close()
+        print("🛑 订单监听器已停止")
+    
+    def _login_args(self):
+        """生成登录签名：Base64(HMAC-SHA256(secret, timestamp + 'GET' + '/users/self/verify'))"""
+        timestamp = str(int(time.time()))
+        message = timestamp + 'GET' + '/users/self/verify'
+        sign = base64.b64encode(
+            hmac.new(self.secret.encode(), message.encode(), hashlib.sha256).digest()
+        ).decode()
+        return [{
+            "apiKey": self.api_key,
+            "passphrase": self.passphrase,
+            "timestamp": timestamp,
+            "sign": sign
+        }]
+    
+    def _run_websocket(self):
+        """运行WebSocket连接（在独立线程中）"""
+        while self.running:
+            try:
+                self.ws = websocket.WebSocketApp(
+                    self.ws_url,
+                    on_open=self._on_open,
+                    on_message=self._on_message,
+                    on_error=self._on_error,
+                    on_close=self._on_close
+                )
+                
+                # 运行WebSocket（阻塞），OKX 30秒无数据会断开，定时ping保活
+                self.ws.run_forever(ping_interval=20, ping_timeout=10)
+                
+                # 如果断开，等待5秒后重连
+                if self.running:
+                    print("🔄 订单WebSocket断开，5秒后重连...")
+                    time.sleep(5)
+            
+            except Exception as e:
+                print(f"❌ 订单WebSocket运行异常: {e}")
+                if self.running:
+                    time.sleep(5)
+    
+    def _on_open(self, ws):
+        """WebSocket连接建立，先登录，登录成功后再订阅"""
+        ws.send(json.dumps({"op": "login", "args": self._login_args()}))
+    
+    def _on_message(self, ws, message):
+        """接收WebSocket消息"""
+        if message == 'pong':
+            return
+        
+        try:
+            data = json.loads(message)
+            
+            if 'event' in data:
+                if data['event'] == 'login':
+                    if data.get('code') == '0':
+                        self.logged_in = True
+                        self.login_count += 1
+                        ws.send(json.dumps({
+                            "op": "subscribe",
+                            "args": [
+                                {"channel": "orders", "instType": "SWAP"},
+                                {"channel": "orders-algo", "instType": "SWAP"},
+                                {"channel": "account", "ccy": "USDT"}
+                            ]
+                        }))
+                    else:
+                        print(f"❌ 订单WebSocket登录失败: {data.get('msg')}")
+                elif data['event'] == 'error':
+                    print(f"❌ 订单WebSocket错误: {data.get('code')} {data.get('msg')}")
+                return
+            
+            channel = data.get('arg', {}).get('channel')
+            if channel in ('orders', 'orders-algo', 'account'):
+                for item in data.get('data', []):
+                    self.on_order(channel, item)
+        
+        except Exception as e:
+            print(f"❌ 处理订单消息失败: {e}")
+    
+    def _on_error(self, ws, error):
+        """WebSocket错误"""
+        print(f"❌ 订单WebSocket错误: {error}")
+    
+    def _on_close(self, ws, close_status_code, close_msg):
+        """WebSocket连接关闭"""
+        self.logged_in = False
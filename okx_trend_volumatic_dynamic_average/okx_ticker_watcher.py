@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+OKX WebSocket 行情监听器
+实时获取最新成交价（tickers 频道），供监听队列替代逐个 REST 轮询
+以及5档订单簿（books5 频道），供开仓时读取买N/卖N价，替代每次 REST 拉取订单簿
+"""
+
+import json
+import threading
+import time
+import websocket
+
+
+class OKXTickerWatcher:
+    """OKX行情监听器 - WebSocket实时订阅最新价和5档订单簿，支持动态增减交易对"""
+    
+    def __init__(self, symbols=None, paper=False):
+        """
+        初始化行情监听器
+        
+        Args:
+            symbols: 初始交易对列表，如 ['SOL-USDT-SWAP']
+            paper: 是否模拟盘
+        """
+        self.symbols = set(symbols or [])
+        self.paper = paper
+        
+        # WebSocket URL
+        if paper:
+            self.ws_url = "wss://wspap.okx.com:8443/ws/v5/public?brokerId=9999"
+        else:
+            self.ws_url = "wss://ws.okx.com:8443/ws/v5/public"
+        
+        # 最新价缓存 {symbol: (time.monotonic()时间戳, 最新价)}
+        self.last_prices = {}
+        
+        # 订阅5档订单簿的交易对，及订单簿缓存 {symbol: (time.monotonic()时间戳, {'bids': [[价格, 数量], ...], 'asks': [...]})}
+        self.book_symbols = set()
+        self.order_books = {}
+        
+        # WebSocket连接
+        self.ws = None
+        self.ws_thread = None
+        self.running = False
+        self.connected = False
+        
+        # 锁，保证线程安全
+        self.lock = threading.Lock()
+        # 订单簿更新通知（与lock共用同一把锁），追价开仓时等待下一次盘口推送
+        self.book_updated = threading.Condition(self.lock)
+    
+    def start(self):
+        """启动行情监听（后台线程，不等待连接建立）"""
+        if self.running:
+            return
+        
+        self.running = True
+        self.ws_thread = threading.Thread(target=self._run_websocket, daemon=True)
+        self.ws_thread.start()
+        print(f"📡 行情监听器已启动: {', '.join(sorted(self.symbols)) or '暂无交易对'}")
+    
+    def stop(self):
+        """停止行情监听"""
+        self.running = False
+        if self.ws:
+            self.ws.close()
+        print("🛑 行情监听器已停止")
+    
+    def set_symbols(self, symbols):
+        """同步订阅列表：新增的订阅，移除的退订"""
+        symbols = set(symbols)
+        with self.lock:
+            added = symbols - self.symbols
+            removed = self.symbols - symbols
+            self.symbols = symbols
+            for symbol in removed:
+                self.last_prices.pop(symbol, None)
+        
+        if added:
+            self._send('subscribe', added)
+        if removed:
+            self._send('unsubscribe', removed)
+    
+    def get_last_price(self, symbol, max_age=2.0):
+        """
+        获取最新价
+        
+        Args:
+            symbol: 交易对符号
+            max_age: 最大允许延迟（秒），超过视为过期
+        
+        Returns:
+            float: 最新价，没有数据或已过期返回 None
+        """
+        with self.lock:
+            cached = self.last_prices.get(symbol)
+        if not cached or time.monotonic() - cached[0] > max_age:
+            return None
+        return cached[1]
+    
+    def watch_order_book(self, symbol):
+        """订阅交易对的5档订单簿（books5，每次推送完整5档快照），已订阅则忽略"""
+        with self.lock:
+            if symbol in self.book_symbols:
+                return
+            self.book_symbols.add(symbol)
+        self._send('subscribe', [symbol], 'books5')
+    
+    def get_order_book(self, symbol, max_age=1.0):
+        """
+        获取5档订单簿
+        
+        Args:
+            symbol: 交易对符号
+            max_age: 最大允许延迟（秒），超过视为过期
+        
+        Returns:
+            dict: {'bids': [[价格, 数量], ...], 'asks': [...]}，没有数据或已过期返回 None
+        """
+        with self.lock:
+            cached = self.order_books.get(symbol)
+        if not cached or time.monotonic() - cached[0] > max_age:
+            return None
+        return cached[1]
+    
+    def wait_order_book(self, symbol, timeout):
+        """
+        等待交易对的下一次订单簿推送
+        
+        Returns:
+            bool: timeout秒内是否收到新的订单簿
+        """
+        with self.book_updated:
+            cached = self.order_books.get(symbol)
+            return self.book_updated.wait_for(lambda: self.order_books.get(symbol) is not cached, timeout)
+    
+    def _send(self, op, symbols, channel='tickers'):
+        """发送订阅/退订请求（未连接时跳过，连接建立后统一订阅）"""
+        if not self.connected or not symbols:
+            return
+        msg = {
+            "op": op,
+            "args": [{"channel": channel, "instId": symbol} for symbol in sorted(symbols)]
+        }
+        try:
+            self.ws.send(json.dumps(msg))
+        except Exception as e:
+            print(f"❌ 发送{op}请求失败: {e}")
+    
+    def _run_websocket(self):
+        """运行WebSocket连接（在独立线程中）"""
+        while self.running:
+            try:
+                self.ws = websocket.WebSocketApp(
+                    self.ws_url,
+                    on_open=self._on_open,
+                    on_message=self._on_message,
+                    on_error=self._on_error,
+                    on_close=self._on_close
+                )
+                
+                # 运行WebSocket（阻塞），OKX 30秒无数据会断开，定时ping保活
+                self.ws.run_forever(ping_interval=20, ping_timeout=10)
+                
+                # 如果断开，等待5秒后重连
+                if self.running:
+                    print("🔄 行情WebSocket断开，5秒后重连...")
+                    time.sleep(5)
+            
+            except Exception as e:
+                print(f"❌ 行情WebSocket运行异常: {e}")
+                if self.running:
+                    time.sleep(5)
+    
+    def _on_open(self, ws):
+        """WebSocket连接建立，订阅当前所有交易对"""
+        self.connected = True
+        with self.lock:
+            symbols = set(self.symbols)
+            book_symbols = set(self.book_symbols)
+        self._send('subscribe', symbols)
+        self._send('subscribe', book_symbols, 'books5')
+    
+    def _on_message(self, ws, message):
+        """接收WebSocket消息"""
+        try:
+            data = json.loads(message)
+            
+            # 订阅确认/错误消息
+            if 'event' in data:
+                if data['event'] == 'error':
+                    print(f"❌ 行情订阅失败: {data.get('msg')}")
+                return
+            
+            arg = data.get('arg', {})
+            channel = arg.get('channel')
+            if channel == 'tickers' and data.get('data'):
+                now = time.monotonic()
+                with self.lock:
+                    for item in data['data']:
+                        if item['instId'] in self.symbols:
+                            self.last_prices[item['instId']] = (now, float(item['last']))
+            
+            elif channel == 'books5' and data.get('data'):
+                # books5 每条推送都是完整的5档快照，直接整体替换；档位格式 [价格, 数量, 废弃字段, 订单数]
+                item = data['data'][0]
+                book = {
+                    'bids': [[float(level[0]), float(level[1])] for level in item.get('bids', [])],
+                    'asks': [[float(level[0]), float(level[1])] for level in item.get('asks', [])]
+                }
+                now = time.monotonic()
+                with self.lock:
+                    if arg.get('instId') in self.book_symbols:
+                        self.order_books[arg['instId']] = (now, book)
+                        self.book_updated.notify_all()
+        
+        except Exception as e:
+            print(f"❌ 处理行情消息失败: {e}")
+    
+    def _on_error(self, ws, error):
+        """WebSocket错误"""
+        print(f"❌ 行情WebSocket错误: {error}")
+    
+    def _on_close(self, ws, close_status_code, close_msg):
+        """WebSocket连接关闭"""
+        self.connected = False
+
+
+# 测试代码
+if __name__ == '__main__':
+    watcher = OKXTickerWatcher(['SOL-USDT-SWAP'])
+    watcher.start()
+    
+    try:
+        while True:
+            time.sleep(1)
+            print(f"SOL-USDT-SWAP 最新价: {watcher.get_last_price('SOL-USDT-SWAP')}")
+    except KeyboardInterrupt:
+        print("\n退出...")
+        watcher.stop()
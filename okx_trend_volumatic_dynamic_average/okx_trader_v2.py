@@ -7,15 +7,268 @@ OKX 交易接口 V2版本
 """
 
 import ccxt
+import json
+import logging
+import math
+import os
+import numpy as np
+import operator
+import re
+import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
 from datetime import datetime
+from log_setup import get_queued_logger
 from okx_config import OKX_API_CONFIG, TRADING_CONFIG
+from okx_order_watcher import OKXOrderWatcher
+from okx_ticker_watcher import OKXTickerWatcher
+from requests.adapters import HTTPAdapter
+
+try:
+    import orjson  # 可选：解析OKX响应比标准json快数倍
+except ImportError:
+    orjson = None
+
+# 🔴 日志先进队列，由后台线程写stdout，下单路径不阻塞在IO上（队列和输出线程与数据库服务共用，输出保持先后顺序）
+# 调试模式（TRADING_CONFIG['debug']）下输出DEBUG级别的余额/保证金诊断；环境变量 LOG_LEVEL（如 WARNING）可覆盖日志级别
+logger = get_queued_logger(__name__, logging.DEBUG if TRADING_CONFIG.get('debug') else logging.INFO)
+
+# 日志分隔线（模块级常量，避免每次下单重复拼接）
+SEP = "=" * 60
+SUB = "-" * 60
+SEP_OPEN = "\n" + SEP
+SEP_CLOSE = SEP + "\n"
+SEP_INNER_CLOSE = "   " + SEP + "\n"
+SUB_INNER_CLOSE = "   " + SUB + "\n"
+
+# 止损单查表：(持仓方向, 类型) -> (当前价是否已越过止损价, 日志中的比较符)；止盈越价由交易所撤销Post-Only单处理
+_LEG_TRIGGERED = {
+    ('long', 'sl'): (operator.le, '<='),
+    ('short', 'sl'): (operator.ge, '>='),
+}
+_LEG_LABELS = {'sl': ('止损', '🛡️ '), 'tp': ('止盈', '💰')}
+# 推送中表示订单已结束的状态：普通订单成交/撤销；条件单已触发/撤销/委托失败
+_ORDER_DONE_STATES = {
+    'orders': ('filled', 'canceled'),
+    'orders-algo': ('effective', 'canceled', 'order_failed'),
+}
+# 表示订单不存在的OKX错误码（51603已由ccxt映射为OrderNotFound，51600没有映射）；ccxt异常信息中附带原始响应JSON
+_ORDER_MISSING_CODES = frozenset({'51600', '51603'})
+_OKX_CODE_RE = re.compile(r'"s?[Cc]ode"\s*:\s*"(\d+)"')
+# 止损类订单类型（cancel_all_stop_orders 中与 reduceOnly 订单一起撤销）
+_STOP_ORDER_TYPES = frozenset({'stop', 'stop_limit', 'stop_market'})
+# 减仓方向：平多卖出，平空买入
+_CLOSE_SIDE = {'long': 'sell', 'short': 'buy'}
+# 止损优化结果处理：订单类型 → (是否从监听队列移除, 提示)
+_STOP_OPTIMIZE_RESULT = {
+    'limit': (True, "   ✅ 优化成功！已替换为限价单"),
+    'conditional_limit': (False, "   💡 降级为条件单，继续监听"),
+}
+_STOP_OPTIMIZE_FAILED = (True, "   ⚠️  挂单失败，从队列移除")  # 失败：可能已经被触发了
+
+BATCH_CANCEL_SIZE = 20  # OKX批量撤单接口每次最多20个订单
+OPTIMIZER_WORKERS = 4  # 监听队列并行检查的线程数
+STOP_CHECK_BAND = 0.02  # 止损单价差超过2%时本轮不核对订单状态（离触发价远，无需优化，结束时由推送清理）
+OPTIMIZE_MIN_INTERVAL = 5.0  # 监听检查最小间隔（秒），过密的调用直接跳过
+# 监听检查建议间隔（秒），按最近一个目标价的价差自适应：价差 ≤ 阈值时用对应间隔，更远用 OPTIMIZE_FAR_INTERVAL
+OPTIMIZE_INTERVALS = ((0.005, 5.0), (0.02, 20.0))
+OPTIMIZE_FAR_INTERVAL = 60.0
+OPTIMIZE_IDLE_INTERVAL = 120.0  # 两个监听队列都为空时
+REST_TIMEOUT_MS = 5000  # 单次REST请求超时（毫秒），接口卡住时不拖住整轮检查（ccxt默认10秒）
+HTTP_POOL_SIZE = OPTIMIZER_WORKERS + 4  # REST长连接池大小：并行检查线程 + 主线程/成交推送线程
+BALANCE_PUSH_MAX_AGE = 30.0  # 余额推送缓存的最长使用时间（秒），超过（推送断开或长时间无推送）时走REST
+ORDER_PUSH_POLL_S = 3.0  # 订单推送在线时，等待成交期间REST兜底核对的间隔（秒），防止漏推送
+OKX_API_HOSTS = ('www.okx.com', 'aws.okx.com')  # 实盘REST候选域名，启动时选延迟最低的（配置里指定了hostname则不探测）
+ENTRY_CHASE_TIMEOUT_S = 300  # 追价开仓最长挂单时间（秒）
+ENTRY_BOOK_WAIT_S = 2.0  # 挂单被撤后等待新盘口推送的最长时间（秒），避免按旧价反复挂撤
+REPRICE_CHECK_S = 0.5  # 追价挂单时检查盘口是否移动的间隔（秒），读内存订单簿
+TRADE_RATE_LIMIT = (60, 2.0)  # 下单/改单/撤单限速：每2秒最多60个请求（OKX交易接口的单接口限频）
+ORDERBOOK_REST_TTL = 0.25  # REST订单簿短时缓存（秒）：没有推送时，同一时刻的买N/卖N查询共用一次请求
+
+
+def _amount_step(min_size):
+    """合约张数的取整倍数：最小下单量1张→整数，0.1张→1位小数，0.01张→2位小数，更小→4位小数"""
+    if min_size >= 1:
+        return 1
+    if min_size >= 0.1:
+        return 10
+    if min_size >= 0.01:
+        return 100
+    return 10000
+
+
+def _parse_balance_detail(detail):
+    """把账户推送中的币种明细解析为 {'total', 'free', 'used'}（与ccxt fetch_balance 的解析规则一致）"""
+    eq = float(detail.get('eq') or 0)
+    if detail.get('availEq'):
+        # 全仓/跨币种保证金账户：可用=有效可用权益
+        free = float(detail['availEq'])
+        return {'total': eq, 'free': free, 'used': eq - free}
+    free = float(detail.get('availBal') or 0)
+    used = float(detail.get('frozenBal') or 0)
+    return {'total': free + used, 'free': free, 'used': used}
+
+
+def _is_missing_order(exc):
+    """ccxt异常是否表示订单不存在：按OKX响应中的 code/sCode 字段判断，
+    不做子串匹配（错误信息里的订单ID是长数字串，可能恰好包含 51600）"""
+    return not _ORDER_MISSING_CODES.isdisjoint(_OKX_CODE_RE.findall(str(exc)))
+
+
+def _apply_algo_push(algo_map, data):
+    """按一条orders-algo推送更新活跃条件单表：仍在委托的写入，已触发/撤销/失败的移除"""
+    if data.get('state') in _ORDER_DONE_STATES['orders-algo']:
+        algo_map.pop(data.get('algoId'), None)
+    else:
+        algo_map[data.get('algoId')] = data
+
+
+@dataclass(slots=True)
+class PendingStopLoss:
+    """监听队列中待优化的止损条件单"""
+    conditional_order_id: str
+    trigger_price: float
+    amount: float
+    side: str  # 'long' 或 'short'
+    order_type: str = 'conditional_limit'  # 'conditional_limit' 或 'limit'
+
+
+@dataclass(slots=True)
+class PendingEntry:
+    """监听队列中待优化的开仓条件单"""
+    conditional_order_id: str
+    limit_price: float
+    amount: float
+    direction: str  # 'long' 或 'short'
+    stop_loss_price: float = None
+    take_profit_price: float = None
+    order_type: str = 'conditional'
+
+
+class PendingQueue(dict):
+    """监听队列 {symbol: 记录}，附带按需重建的 numpy 价格区间索引
+    
+    队列增删时只标记失效，下一次 near() 时再重建区间数组，
+    这样每轮监听只需一次向量化比较即可找出所有接近目标价的交易对。
+    """
+    
+    def __init__(self, price_attr, band, check_band=None):
+        super().__init__()
+        self.price_attr = price_attr  # 记录中的目标价字段名
+        self.band = band              # 价差阈值（相对当前价），例如 0.005 = 0.5%
+        self.check_band = check_band  # 需要核对订单状态的价差阈值（比band宽），None表示每轮都核对
+        self._dirty = True
+        self._symbols = []
+        self._lows = np.empty(0)
+        self._highs = np.empty(0)
+        self._check_lows = np.empty(0)
+        self._check_highs = np.empty(0)
+        self._prices = np.empty(0)
+        self.on_change = None  # 队列增删后的回调（持久化监听队列用）
+    
+    def __setitem__(self, symbol, record):
+        super().__setitem__(symbol, record)
+        self._changed()
+    
+    def __delitem__(self, symbol):
+        super().__delitem__(symbol)
+        self._changed()
+    
+    def pop(self, *args):
+        record = super().pop(*args)
+        self._changed()
+        return record
+    
+    def clear(self):
+        super().clear()
+        self._changed()
+    
+    def _changed(self):
+        self._dirty = True
+        if self.on_change is not None:
+            self.on_change()
+    
+    def _rebuild(self):
+        self._symbols = list(self)
+        prices = np.fromiter((getattr(r, self.price_attr) for r in self.values()), dtype=float, count=len(self._symbols))
+        self._prices = prices
+        # |当前价 - 目标价| / 当前价 <= band  ⇔  目标价/(1+band) <= 当前价 <= 目标价/(1-band)
+        self._lows = prices / (1 + self.band)
+        self._highs = prices / (1 - self.band)
+        if self.check_band is not None:
+            self._check_lows = prices / (1 + self.check_band)
+            self._check_highs = prices / (1 - self.check_band)
+        self._dirty = False
+    
+    def near(self, last_prices):
+        """返回最新价落在目标价区间内的交易对集合
+        
+        Args:
+            last_prices: {symbol: 最新价}，缺失的交易对视为不接近
+        """
+        if self._dirty:
+            self._rebuild()
+        return self._within(last_prices, self._lows, self._highs)
+    
+    def to_check(self, last_prices):
+        """返回本轮需要核对订单状态的交易对集合（最新价落在 check_band 区间内；未设置 check_band 时为全部）"""
+        if self.check_band is None:
+            return set(self)
+        if self._dirty:
+            self._rebuild()
+        return self._within(last_prices, self._check_lows, self._check_highs)
+    
+    def min_gap(self, last_prices):
+        """返回队列中 |最新价 - 目标价| / 最新价 的最小值（队列为空或都取不到最新价时返回 None）"""
+        if self._dirty:
+            self._rebuild()
+        lasts = self._lasts(last_prices)
+        gaps = np.abs(lasts - self._prices) / lasts
+        if not gaps.size or np.isnan(gaps).all():
+            return None
+        return float(np.nanmin(gaps))
+    
+    def _within(self, last_prices, lows, highs):
+        lasts = self._lasts(last_prices)
+        mask = (lasts >= lows) & (lasts <= highs)
+        return {self._symbols[i] for i in np.flatnonzero(mask)}
+    
+    def _lasts(self, last_prices):
+        get = last_prices.get
+        return np.fromiter((get(s, np.nan) for s in self._symbols), dtype=float, count=len(self._symbols))
+
+
+class TokenBucket:
+    """线程安全的令牌桶：每 per 秒最多 rate 个请求，令牌不足时阻塞到补足为止
+    
+    并行检查线程共用一个桶，撤单/下单风暴时平滑放行，不再撞上限频错误（50011）后重试。
+    """
+    
+    def __init__(self, rate, per):
+        self.rate = rate
+        self.per = per
+        self._tokens = float(rate)
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def take(self, n=1):
+        """取n个令牌；不足时先预占（令牌记为负数），在锁外等待补足"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate, self._tokens + (now - self._stamp) * self.rate / self.per)
+            self._stamp = now
+            self._tokens -= n
+            wait = -self._tokens * self.per / self.rate
+        if wait > 0:
+            time.sleep(wait)
 
 
 class OKXTraderV2:
     """OKX交易接口V2 - 优化版（省手续费）"""
     
-    def __init__(self, test_mode=True, leverage=1, symbols=None):
+    def __init__(self, test_mode=True, leverage=1, symbols=None, state_file=None):
         """
         初始化OKX交易接口V2
         
@@ -23,56 +276,517 @@ class OKXTraderV2:
             test_mode: 测试模式
             leverage: 杠杆倍数
             symbols: 需要监听的交易对列表
+            state_file: 监听队列持久化文件，None时按启动脚本名和运行模式生成（测试模式不持久化）
         """
         self.test_mode = test_mode or TRADING_CONFIG['test_mode']
         self.leverage = leverage
+        self.paper = TRADING_CONFIG['mode'] == 'paper'  # 运行期不变，初始化时读取一次
         
         # 初始化CCXT交易所
         try:
             # 🔴 兼容旧配置键名（api_key → apiKey）
             api_config = dict(OKX_API_CONFIG)
+            api_config.setdefault('timeout', REST_TIMEOUT_MS)
             if 'api_key' in api_config and 'apiKey' not in api_config:
                 api_config['apiKey'] = api_config.pop('api_key')
             self.exchange = ccxt.okx(api_config)
             
-            if TRADING_CONFIG['mode'] == 'paper':
+            # 🔴 安装了orjson时用它解析REST响应（OKX v5的数值字段本身都是字符串，解析结果与标准json一致）
+            if orjson is not None:
+                self.exchange.parse_json = orjson.loads
+            
+            # 🔴 复用HTTPS长连接（keep-alive）：连接池按并发线程数放大，避免并行请求时反复TCP/TLS握手
+            self.exchange.session.mount('https://', HTTPAdapter(pool_connections=2, pool_maxsize=HTTP_POOL_SIZE))
+            
+            if self.paper:
                 self.exchange.set_sandbox_mode(True)
-                print("⚠️  【模拟盘模式】已启用 OKX 沙盒环境")
+                logger.info("⚠️  【模拟盘模式】已启用 OKX 沙盒环境")
             else:
-                print("🔴 【实盘模式】注意！将在真实市场交易！")
+                logger.warning("🔴 【实盘模式】注意！将在真实市场交易！")
+                if 'hostname' not in api_config:
+                    self.exchange.hostname = self._pick_api_hostname()
             
             self.exchange.load_markets()
-            print(f"✅ OKX 交易接口V2初始化成功")
-            print(f"📊 默认杠杆倍数: {self.leverage}x")
-            print(f"💰 优化: 限价单优先 | 订单簿定价 | 省手续费")
-            
+            logger.info("✅ OKX 交易接口V2初始化成功")
+            logger.info("📊 默认杠杆倍数: %sx", self.leverage)
+            logger.info("💰 优化: 限价单优先 | 订单簿定价 | 省手续费")
+        
         except Exception as e:
-            print(f"❌ OKX 交易接口初始化失败: {e}")
+            logger.error("❌ OKX 交易接口初始化失败: %s", e)
             self.exchange = None
             raise
         
+        # 🔴 下单/改单/撤单共用一个令牌桶限速（并行检查线程共享）
+        self._trade_bucket = TokenBucket(*TRADE_RATE_LIMIT)
+        
+        # 🔴 撤单方法按订单类型分派：条件单走algo撤单接口，限价单走普通撤单接口
+        self._cancel_fns = {
+            'conditional_limit': self._cancel_conditional_order,
+            'limit': self._cancel_order,
+        }
+        
         # 不使用WebSocket订单簿监听器，直接用ccxt获取
         self.orderbook_watcher = None
-        print("📊 使用ccxt直接获取订单簿（无需WebSocket）")
+        self._ticker_cache = {}  # {symbol: (时间戳, ticker)} 短时缓存，避免轮询时重复请求
+        self._orderbook_cache = {}  # {symbol: (时间戳, 订单簿)} REST订单簿短时缓存（推送未到时用）
+        self.ticker_watcher = None  # WebSocket行情监听（监听队列非空或开仓查询订单簿时才启动）
+        self._algo_pending_cache = None  # (时间戳, {algoId: 条件单}) 同一轮检查共用一次查询
+        self._algo_live = None  # {algoId: 条件单} 订单推送维护的活跃条件单（REST查一次做底，之后按orders-algo推送增减）
+        self._algo_live_login = None  # _algo_live 做底时订单推送的登录次数，重连后（可能漏推送）重新做底
+        self._algo_events = None  # 做底查询进行中收到的条件单推送，查询返回后重放
+        self._positions_snapshot = None  # (时间戳, {symbol: [持仓]}) 同一轮检查共用一次查询
+        self._open_orders_snapshot = None  # (时间戳, {订单ID: 订单}) 当前委托 + 本轮单独查过的订单，同一轮检查共用
+        self._instrument_meta = {}  # {symbol: (合约规格, 最小下单量)} 合约信息不会变，查到一次后缓存
+        self._long_short_mode = None  # 是否双向持仓（下单需带posSide），首次下单时查询一次
+        self._pos_mode_from_config = False  # _long_short_mode 是否来自账户配置查询（而不是51000重试推断）
+        self._leverage_cache = {}  # {(symbol, 保证金模式): 杠杆} 设置成功后缓存，相同设置不再重复请求
+        logger.info("📊 订单簿优先读WebSocket 5档推送（books5），无推送时走REST")
         
         # 记录当前止损止盈单ID
-        self.stop_loss_order_id = None
-        self.stop_loss_order_type = None  # 记录订单类型：'limit' 或 'conditional_limit'
-        self.take_profit_order_id = None
+        # 🔴 按交易对记录当前止损/止盈单，多个交易对共用一个trader时互不覆盖（读写在 _pending_lock 下）
+        self.stop_loss_orders = {}  # {symbol: (订单ID, 订单类型 'limit' 或 'conditional_limit')}
+        self.take_profit_orders = {}  # {symbol: 订单ID}
         
-        # 🔴 混合方案：监听待优化的止损止盈单
-        self.pending_stop_loss = {}  # {symbol: {'side': 'long', 'trigger_price': 3800, 'amount': 1, 'conditional_order_id': 'xxx'}}
-        self.pending_take_profit = {}  # 同上
+        # 🔴 混合方案：监听待优化的止损单（按交易对一条记录，订单结束时由推送或轮询移除）
+        self.pending_stop_loss = PendingQueue('trigger_price', 0.005, STOP_CHECK_BAND)  # {symbol: PendingStopLoss}，价差≤0.5%时优化
         # 🔴 监听待优化的开仓条件单
-        self.pending_entry_orders = {}  # {symbol: {'direction': 'long'/'short', 'limit_price': 158.64, 'amount': 1, 'conditional_order_id': 'xxx', 'stop_loss_price': xxx, 'take_profit_price': xxx}}
+        self.pending_entry_orders = PendingQueue('limit_price', 0.003)  # {symbol: PendingEntry}，价差≤0.3%时优化
+        # 🔴 成交推送（WebSocket线程）和轮询检查（主线程）都会从队列取出开仓单，用锁保证只处理一次
+        self._pending_lock = threading.RLock()
+        self.order_watcher = None  # WebSocket订单推送（有开仓条件单或止损单时才启动）
+        self._order_push_login_seen = None  # 上次REST核对止损单时订单推送的登录次数
+        self._order_waiters = {}  # {订单ID: threading.Event} 等待成交的限价单，推送到结束状态时唤醒
+        self._balance_cache = None  # (time.monotonic()时间戳, {'total', 'free', 'used'}) 账户推送的USDT余额
+        self._event_executor = None  # 成交后挂止损止盈的工作线程，不占用WebSocket线程
+        self._optimizer_executor = None  # 监听队列多交易对并行检查的线程池
+        self._leg_executor = None  # 止损止盈两条腿同时下单的线程池
+        self._optimize_lock = threading.Lock()  # 同一时间只允许一轮监听检查
+        self._last_optimize_ts = 0.0  # 上一轮监听检查开始时间（time.monotonic）
+        self._min_price_gap = None  # 上一轮监听检查时最近一个目标价的相对价差（决定下一轮检查间隔）
+        self._checked_symbols = frozenset()  # 上一轮监听检查时两个队列中的交易对
+        
+        # 🔴 监听队列和止损止盈单记录写入本地文件，进程重启后恢复，继续监听重启前挂出的条件单
+        self._state_file = None
+        if not self.test_mode:
+            script = os.path.splitext(os.path.basename(sys.argv[0]))[0] or 'okx_trader'
+            self._state_file = state_file or f"okx_pending_state_{script}_{TRADING_CONFIG['mode']}.json"
+            self._load_pending_state()
+            self.pending_stop_loss.on_change = self._save_pending_state
+            self.pending_entry_orders.on_change = self._save_pending_state
+    
+    def _load_pending_state(self):
+        """从持久化文件恢复监听队列和止损止盈单记录（文件不存在或损坏时从空队列开始）"""
+        try:
+            with open(self._state_file, encoding='utf-8') as f:
+                state = json.load(f)
+            for symbol, record in state.get('pending_stop_loss', {}).items():
+                self.pending_stop_loss[symbol] = PendingStopLoss(**record)
+            for symbol, record in state.get('pending_entry_orders', {}).items():
+                self.pending_entry_orders[symbol] = PendingEntry(**record)
+            self.stop_loss_orders = {symbol: tuple(order) for symbol, order in state.get('stop_loss_orders', {}).items()}
+            self.take_profit_orders = dict(state.get('take_profit_orders', {}))
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.warning("⚠️  恢复监听队列失败（从空队列开始）: %s", e)
+            return
+        
+        if self.pending_stop_loss or self.pending_entry_orders or self.stop_loss_orders:
+            logger.info("♻️  已恢复监听队列: 止损%s个, 开仓%s个, 当前止损单%s个",
+                        len(self.pending_stop_loss), len(self.pending_entry_orders), len(self.stop_loss_orders))
+            self._ensure_order_watcher()  # 重启期间结束的订单由下一轮检查核对，之后的变化由推送处理
+    
+    def _save_pending_state(self):
+        """把监听队列和止损止盈单记录写入持久化文件（先写临时文件再替换，进程中途退出也不会留下半个文件）"""
+        if self._state_file is None:
+            return
+        with self._pending_lock:
+            state = {
+                'pending_stop_loss': {symbol: asdict(record) for symbol, record in self.pending_stop_loss.items()},
+                'pending_entry_orders': {symbol: asdict(record) for symbol, record in self.pending_entry_orders.items()},
+                'stop_loss_orders': self.stop_loss_orders,
+                'take_profit_orders': self.take_profit_orders,
+            }
+            try:
+                tmp_path = self._state_file + '.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(state, f, ensure_ascii=False)
+                os.replace(tmp_path, self._state_file)
+            except Exception as e:
+                logger.warning("⚠️  保存监听队列失败: %s", e)
+    
+    def _pick_api_hostname(self, rounds=3):
+        """探测各候选REST域名（公共时间接口，每个取最快一次），返回延迟最低的；都不通时用ccxt默认域名"""
+        best_host, best_rtt = self.exchange.hostname, None
+        for host in OKX_API_HOSTS:
+            rtts = []
+            for _ in range(rounds):
+                try:
+                    start = time.perf_counter()
+                    self.exchange.session.get(f'https://{host}/api/v5/public/time', timeout=2).raise_for_status()
+                    rtts.append(time.perf_counter() - start)
+                except Exception:
+                    break
+            if rtts and (best_rtt is None or min(rtts) < best_rtt):
+                best_host, best_rtt = host, min(rtts)
+        if best_rtt is not None:
+            logger.info("🌐 REST域名: %s (延迟%.0fms)", best_host, best_rtt * 1000)
+        return best_host
+    
+    def _get_orderbook(self, symbol, max_age=1.0):
+        """获取5档订单簿：优先WebSocket books5推送，没有或过期时走REST
+        
+        第一次查询某交易对时顺带订阅其订单簿推送，开仓循环里后续的买N/卖N查询直接读内存
+        """
+        if self.test_mode:
+            return self._fetch_orderbook(symbol)
+        if self.ticker_watcher:
+            orderbook = self.ticker_watcher.get_order_book(symbol, max_age)
+            if orderbook:
+                return orderbook
+        self._start_ticker_watcher().watch_order_book(symbol)
+        return self._fetch_orderbook(symbol)
+    
+    def _wait_orderbook_update(self, symbol, timeout):
+        """等待该交易对的下一次订单簿推送，最多timeout秒（没有行情推送时直接等满）"""
+        if self.ticker_watcher is None:
+            time.sleep(timeout)
+        else:
+            self.ticker_watcher.wait_order_book(symbol, timeout)
     
-    def _get_orderbook(self, symbol):
-        """直接使用ccxt获取订单簿"""
+    def _fetch_orderbook(self, symbol):
+        """直接使用ccxt获取订单簿（ORDERBOOK_REST_TTL秒内复用上一次结果）"""
+        now = time.monotonic()
+        cached = self._orderbook_cache.get(symbol)
+        if cached and now - cached[0] < ORDERBOOK_REST_TTL:
+            return cached[1]
         try:
-            return self.exchange.fetch_order_book(symbol, limit=5)
+            orderbook = self.exchange.fetch_order_book(symbol, limit=5)
         except Exception as e:
-            print(f"❌ 获取订单簿失败: {e}")
+            logger.error("❌ 获取订单簿失败: %s", e)
             return None
+        self._orderbook_cache[symbol] = (now, orderbook)
+        return orderbook
+    
+    def _get_ticker(self, symbol, max_age=1.0):
+        """获取ticker（max_age秒内复用缓存）"""
+        now = time.monotonic()
+        cached = self._ticker_cache.get(symbol)
+        if cached and now - cached[0] < max_age:
+            return cached[1]
+        ticker = self.exchange.fetch_ticker(symbol)
+        self._ticker_cache[symbol] = (now, ticker)
+        return ticker
+    
+    def _fetch_tickers(self, symbols, max_age=0):
+        """批量获取ticker {symbol: ticker}（一次请求），批量接口失败时逐个获取
+        
+        Args:
+            symbols: 交易对列表
+            max_age: max_age秒内缓存过的ticker直接复用，不再请求
+        """
+        result = {}
+        now = time.monotonic()
+        for symbol in symbols:
+            cached = self._ticker_cache.get(symbol)
+            if cached and now - cached[0] < max_age:
+                result[symbol] = cached[1]
+        symbols = [symbol for symbol in symbols if symbol not in result]
+        if not symbols:
+            return result
+        
+        try:
+            tickers = self.exchange.fetch_tickers(symbols)
+            by_inst = {t.get('info', {}).get('instId'): t for t in tickers.values()}
+            now = time.monotonic()
+            for symbol in symbols:
+                ticker = tickers.get(symbol) or by_inst.get(symbol)
+                if ticker:
+                    self._ticker_cache[symbol] = (now, ticker)
+                    result[symbol] = ticker
+        except Exception as e:
+            logger.warning("   ⚠️  批量获取行情失败，逐个获取: %s", e)
+        for symbol in symbols:
+            if symbol not in result:
+                try:
+                    result[symbol] = self._get_ticker(symbol, max_age=0)
+                except Exception as e:
+                    logger.error("   ❌ 获取%s行情失败: %s", symbol, e)
+        return result
+    
+    def _sync_ticker_watcher(self):
+        """让WebSocket行情订阅与监听队列保持一致（队列非空时才启动连接）"""
+        symbols = set(self.pending_entry_orders) | set(self.pending_stop_loss)
+        if self.ticker_watcher is None and (not symbols or self.test_mode):
+            return
+        self._start_ticker_watcher().set_symbols(symbols)
+    
+    def _start_ticker_watcher(self):
+        """返回行情监听器，尚未启动时创建并启动"""
+        if self.ticker_watcher is None:
+            self.ticker_watcher = OKXTickerWatcher(paper=self.paper)
+            self.ticker_watcher.start()
+        return self.ticker_watcher
+    
+    def _ensure_order_watcher(self):
+        """启动私有频道订单推送（只启动一次），开仓条件单成交时立即挂止损止盈，止损单结束时立即清理记录，等待中的限价单成交/撤销时立即唤醒，余额变化时更新余额缓存"""
+        if self.test_mode:
+            return
+        with self._pending_lock:
+            if self.order_watcher is not None:
+                return
+            self._event_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='okx-fill')
+            self.order_watcher = OKXOrderWatcher(
+                self.exchange.apiKey, self.exchange.secret, self.exchange.password,
+                on_order=self._on_order_event,
+                paper=self.paper
+            )
+        self.order_watcher.start()
+    
+    def _on_order_event(self, channel, data):
+        """订单推送回调（WebSocket线程）
+        
+        - 开仓条件单触发后的委托完全成交：取出队列记录交给工作线程挂止损止盈
+        - 当前止损单/止盈单/止损监听队列中的订单结束（成交、触发、撤销）：立即清理记录，不再等轮询核对
+        - _place_limit_order 正在等待的订单结束：唤醒等待，不再等下一次轮询
+        - 账户推送：更新USDT余额缓存，get_balance 直接读取
+        """
+        if channel == 'account':
+            for detail in data.get('details') or ():
+                if detail.get('ccy') == 'USDT':
+                    self._balance_cache = (time.monotonic(), _parse_balance_detail(detail))
+            return
+        
+        state = data.get('state')
+        symbol = data.get('instId')
+        
+        if channel == 'orders-algo' and data.get('ordType') == 'conditional':
+            self._on_algo_push(data)
+        
+        if channel == 'orders' and state == 'filled' and data.get('algoId'):
+            pending = self._claim_pending_entry(symbol, data['algoId'])
+            if pending:
+                logger.info("\n⚡ 开仓条件单已成交（推送）: %s, 条件单ID=%s, 成交价=$%s", symbol, data['algoId'], data.get('avgPx'))
+                self._event_executor.submit(self._arm_entry_protection, symbol, pending)
+                return
+        
+        if state in _ORDER_DONE_STATES.get(channel, ()):
+            order_id = str(data.get('ordId') if channel == 'orders' else data.get('algoId'))
+            waiter = self._order_waiters.get(order_id)
+            if waiter is not None:
+                waiter.set()
+            self._on_stop_order_done(symbol, order_id, state)
+    
+    def _on_stop_order_done(self, symbol, order_id, state):
+        """止损/止盈单已结束（推送）：清空当前止损/止盈单记录，并移出止损监听队列"""
+        with self._pending_lock:
+            if self._clear_stop_loss(symbol, order_id):
+                logger.info("\n⚡ 止损单已结束（推送）: %s, ID=%s, 状态=%s", symbol, order_id, state)
+            elif self._clear_take_profit(symbol, order_id):
+                logger.info("\n⚡ 止盈单已结束（推送）: %s, ID=%s, 状态=%s", symbol, order_id, state)
+            
+            pending = self.pending_stop_loss.get(symbol)
+            if pending is not None and pending.conditional_order_id == order_id:
+                del self.pending_stop_loss[symbol]
+    
+    def _on_algo_push(self, data):
+        """条件单推送：增量更新活跃条件单表（做底查询进行中时先记下，查询返回后重放）"""
+        with self._pending_lock:
+            if self._algo_events is not None:
+                self._algo_events.append(data)
+            if self._algo_live is not None:
+                _apply_algo_push(self._algo_live, data)
+                self._algo_pending_cache = None  # 条件单列表已变化，下次读取推送维护的最新表
+    
+    def _clear_stop_loss(self, symbol, order_id):
+        """清空交易对的当前止损单记录（只在记录的仍是这张订单时清空，已被新止损单替换的不动）
+        
+        Returns:
+            bool: 是否清空了记录
+        """
+        with self._pending_lock:
+            current = self.stop_loss_orders.get(symbol)
+            if current is None or current[0] != order_id:
+                return False
+            del self.stop_loss_orders[symbol]
+            self._save_pending_state()
+            return True
+    
+    def _clear_take_profit(self, symbol, order_id):
+        """清空交易对的当前止盈单记录（只在记录的仍是这张订单时清空，已被新止盈单替换的不动）
+        
+        Returns:
+            bool: 是否清空了记录
+        """
+        with self._pending_lock:
+            if self.take_profit_orders.get(symbol) != order_id:
+                return False
+            del self.take_profit_orders[symbol]
+            self._save_pending_state()
+            return True
+    
+    def _claim_pending_entry(self, symbol, order_id):
+        """从开仓监听队列取出指定条件单（推送和轮询只有一方能取到）
+        
+        Returns:
+            PendingEntry: 取到的记录；已被取走或ID不匹配时返回None
+        """
+        with self._pending_lock:
+            pending = self.pending_entry_orders.get(symbol)
+            if pending is None or pending.conditional_order_id != order_id:
+                return None
+            del self.pending_entry_orders[symbol]
+            return pending
+    
+    def _remove_pending(self, queue, removals):
+        """统一移除本轮处理完的队列记录（只移除本轮看到的那条，推送线程可能已取走或替换）"""
+        with self._pending_lock:
+            for symbol, record in removals:
+                if queue.get(symbol) is record:
+                    del queue[symbol]
+    
+    def _arm_entry_protection(self, symbol, pending):
+        """开仓条件单成交后，按队列记录设置止损止盈"""
+        try:
+            legs = []
+            if pending.stop_loss_price:
+                logger.info("   🛡️  设置止损单: $%.2f", pending.stop_loss_price)
+                legs.append((self._set_stop_loss_limit, pending.stop_loss_price))
+            
+            if pending.take_profit_price:
+                logger.info("   🎯 设置止盈单: $%.2f", pending.take_profit_price)
+                legs.append((self._set_take_profit_limit, pending.take_profit_price))
+            
+            # 🔴 止损和止盈两条腿互不依赖：止盈交给下单线程池，止损在当前线程同时下，REST往返互相重叠
+            # （本方法可能运行在监听检查线程池里，所以用单独的线程池，避免互相等待占满线程）
+            futures = []
+            if len(legs) > 1:
+                with self._pending_lock:
+                    if self._leg_executor is None:
+                        self._leg_executor = ThreadPoolExecutor(max_workers=OPTIMIZER_WORKERS, thread_name_prefix='okx-leg')
+                set_leg, price = legs.pop()
+                futures.append(self._leg_executor.submit(set_leg, symbol, pending.direction, price, pending.amount))
+            for set_leg, price in legs:
+                set_leg(symbol, pending.direction, price, pending.amount)
+            for future in futures:
+                future.result()
+            
+            logger.info("   ✅ 止损止盈单已设置完成")
+        except Exception as e:
+            logger.error("   ❌ 设置止损止盈失败: %s", e)
+    
+    def _get_last_prices(self, symbols, max_age=2.0):
+        """获取最新价 {symbol: last}：优先WebSocket推送，缺失或过期的再批量走REST"""
+        last_prices = {}
+        if self.ticker_watcher:
+            for symbol in symbols:
+                last = self.ticker_watcher.get_last_price(symbol, max_age)
+                if last is not None:
+                    last_prices[symbol] = last
+        missing = [symbol for symbol in symbols if symbol not in last_prices]
+        if missing:
+            for symbol, ticker in self._fetch_tickers(missing, max_age).items():
+                last_prices[symbol] = ticker['last']
+        return last_prices
+    
+    def _get_algo_pending(self, max_age=2.0):
+        """获取当前活跃条件单 {algoId: 条件单数据}（max_age秒内复用，同一轮检查只请求一次）
+        
+        🔴 订单推送在线时直接读推送维护的条件单表，不再每轮请求REST；
+        推送未连接、发生过重连（断线期间可能漏推送）或 max_age=0 强制刷新时才查询REST，并用结果重新做底
+        
+        Returns:
+            dict: {algoId: 条件单数据}，查询失败返回 None
+        """
+        now = time.monotonic()
+        if self._algo_pending_cache and now - self._algo_pending_cache[0] < max_age:
+            return self._algo_pending_cache[1]
+        
+        watcher = self.order_watcher
+        login_count = None
+        if watcher is not None and watcher.logged_in:
+            login_count = watcher.login_count
+            with self._pending_lock:
+                if max_age > 0 and self._algo_live is not None and self._algo_live_login == login_count:
+                    algo_map = dict(self._algo_live)
+                    self._algo_pending_cache = (now, algo_map)
+                    return algo_map
+                self._algo_events = []  # 做底查询期间的推送先记下
+        
+        try:
+            response = self.exchange.private_get_trade_orders_algo_pending({'ordType': 'conditional'})
+            if response.get('code') != '0':
+                logger.warning("   ⚠️  查询条件单失败: %s", response.get('msg'))
+                return None
+            
+            algo_map = {d['algoId']: d for d in response.get('data') or ()}  # OKX返回的algoId本身就是字符串
+            if login_count is not None:
+                # 🔴 REST结果做底，重放查询期间收到的推送（避免查询返回前已触发/撤销的条件单被当成仍在委托）
+                with self._pending_lock:
+                    live = dict(algo_map)
+                    for data in self._algo_events or ():
+                        _apply_algo_push(live, data)
+                    self._algo_live = live
+                    self._algo_live_login = login_count
+                    algo_map = dict(live)
+            self._algo_pending_cache = (now, algo_map)
+            return algo_map
+        finally:
+            if login_count is not None:
+                with self._pending_lock:
+                    self._algo_events = None
+    
+    def _fetch_positions_by_symbol(self, symbols):
+        """批量获取持仓 {symbol: [持仓, ...]}（一次请求）"""
+        by_symbol = {}
+        for pos in self.exchange.fetch_positions(list(symbols)):
+            key = pos.get('info', {}).get('instId') or pos.get('symbol')
+            by_symbol.setdefault(key, []).append(pos)
+        return by_symbol
+    
+    def _get_positions_snapshot(self):
+        """本轮检查共用的持仓快照（早于条件单列表的快照会重新查询，避免把刚成交的单误判为无持仓）"""
+        algo_cache = self._algo_pending_cache
+        snapshot = self._positions_snapshot
+        if snapshot is None or algo_cache is None or snapshot[0] < algo_cache[0]:
+            snapshot = (time.monotonic(), self._fetch_positions_by_symbol(self.pending_entry_orders))
+            self._positions_snapshot = snapshot
+        return snapshot[1]
+    
+    def _get_order_status(self, order_id, symbol, max_age=2.0):
+        """查询普通订单状态：先查本轮共用的订单快照，不在快照中（已成交/已撤销/快照后新挂）才单独查询
+        
+        单独查询的结果也写入快照，同一轮内（max_age秒）再次查询同一订单直接复用，不重复请求。
+        
+        Returns:
+            dict: 订单信息（ccxt格式，含 status）
+        """
+        now = time.monotonic()
+        snapshot = self._open_orders_snapshot
+        if snapshot is None or now - snapshot[0] >= max_age:
+            try:
+                snapshot = (now, {str(o['id']): o for o in self.exchange.fetch_open_orders()})
+            except Exception as e:
+                logger.warning("   ⚠️  查询当前委托失败: %s", e)
+                snapshot = (now, {})
+            self._open_orders_snapshot = snapshot
+        
+        order = snapshot[1].get(order_id)
+        if order is None:
+            order = self.exchange.fetch_order(order_id, symbol)
+            snapshot[1][order_id] = order
+        return order
+    
+    def _cancel_one(self, order_id, order_type, symbol):
+        """按订单类型撤单（未知类型按普通订单处理）"""
+        self._open_orders_snapshot = None  # 当前委托已变化
+        cancel = self._cancel_fns.get(order_type, self._cancel_order)
+        return cancel(order_id, symbol)
+    
+    def _cancel_order(self, order_id, symbol):
+        """撤普通订单（经交易限速）"""
+        self._trade_bucket.take()
+        return self.exchange.cancel_order(order_id, symbol)
     
     def _cancel_conditional_order(self, order_id, symbol):
         """取消条件单（使用专用API）
@@ -80,33 +794,43 @@ class OKXTraderV2:
         Args:
             order_id: 条件单ID
             symbol: 交易对
-            
+        
         Returns:
             bool: 是否成功
         """
         try:
-            # 使用OKX的条件单取消API
-            # 参数格式：params 应该是一个列表，包含订单信息
-            params_list = [{
-                'instId': symbol,
-                'algoId': str(order_id)
-            }]
-            
-            response = self.exchange.private_post_trade_cancel_algos(params_list)
-            
-            if response.get('code') == '0':
-                print(f"✅ 条件单已取消: {order_id}")
+            if self._cancel_conditional_orders(symbol, [order_id]):
+                logger.info("✅ 条件单已取消: %s", order_id)
                 return True
-            else:
-                error_msg = response.get('msg', 'Unknown error')
-                print(f"❌ 取消条件单失败: {error_msg}")
-                print(f"   响应详情: {response}")
-                return False
-                
+            logger.error("❌ 取消条件单失败: %s", order_id)
+            return False
+        
         except Exception as e:
-            print(f"❌ 取消条件单异常: {e}")
+            logger.error("❌ 取消条件单异常: %s", e)
             return False
     
+    def _cancel_conditional_orders(self, symbol, order_ids):
+        """批量取消条件单（每批最多20个，一次请求），按每个子订单的sCode判断结果
+        
+        Returns:
+            list: 撤销成功的条件单ID
+        """
+        canceled = []
+        for i in range(0, len(order_ids), BATCH_CANCEL_SIZE):
+            chunk = order_ids[i:i + BATCH_CANCEL_SIZE]
+            # 使用OKX的条件单取消API，参数是订单列表
+            self._trade_bucket.take()
+            response = self.exchange.private_post_trade_cancel_algos(
+                [{'instId': symbol, 'algoId': str(order_id)} for order_id in chunk]
+            )
+            self._algo_pending_cache = None  # 条件单列表已变化
+            for item in response.get('data') or ():
+                if item.get('sCode') == '0':
+                    canceled.append(item.get('algoId'))
+                else:
+                    logger.warning("⚠️  取消条件单%s失败: %s", item.get('algoId'), item.get('sMsg'))
+        return canceled
+    
     def _get_bid_price(self, symbol, level=1):
         """获取买盘价格"""
         orderbook = self._get_orderbook(symbol)
@@ -122,15 +846,20 @@ class OKXTraderV2:
         return None
     
     def get_contract_size(self, symbol):
-        """获取合约规格"""
+        """获取合约规格（成功查到后缓存，下单路径不再重复查找市场信息）"""
         if self.test_mode:
             return 0.1, 0.01
         
+        meta = self._instrument_meta.get(symbol)
+        if meta is not None:
+            return meta
+        
         try:
             if self.exchange is None:
                 return 0.1, 0.01
             
-            markets = self.exchange.load_markets()
+            # 🔴 市场信息在初始化时已加载，直接读内存；只有初始化时加载失败才重新请求
+            markets = self.exchange.markets or self.exchange.load_markets()
             
             # 🔴 尝试多种symbol格式匹配
             symbol_variants = [
@@ -143,7 +872,7 @@ class OKXTraderV2:
             for sym_variant in symbol_variants:
                 if sym_variant in markets:
                     market = markets[sym_variant]
-                    print(f"   ✅ 找到市场信息: {sym_variant}")
+                    logger.info("   ✅ 找到市场信息: %s", sym_variant)
                     break
             
             if market:
@@ -152,16 +881,66 @@ class OKXTraderV2:
                 amount_limits = limits.get('amount', {})
                 min_size = amount_limits.get('min', 0.01)
                 
-                print(f"   📊 合约规格: {contract_size} SOL/张, 最小下单量: {min_size} 张")
+                logger.info("   📊 合约规格: %s SOL/张, 最小下单量: %s 张", contract_size, min_size)
+                self._instrument_meta[symbol] = (contract_size, min_size)
                 return contract_size, min_size
             else:
-                print(f"⚠️  未找到 {symbol} 的市场信息（已尝试: {symbol_variants}），使用默认值 0.1 SOL/张")
-                print(f"   💡 如果持续出现保证金不足错误，请检查合约规格是否正确")
+                logger.warning("⚠️  未找到 %s 的市场信息（已尝试: %s），使用默认值 0.1 SOL/张", symbol, symbol_variants)
+                logger.info("   💡 如果持续出现保证金不足错误，请检查合约规格是否正确")
                 return 0.1, 0.01
         except Exception as e:
-            print(f"❌ 获取合约规格失败: {e}")
+            logger.error("❌ 获取合约规格失败: %s", e)
             return 0.1, 0.01
     
+    def refresh_markets(self):
+        """重新加载市场信息并清空合约规格缓存（交易所调整合约规格后手动调用，下单路径不会自动刷新）"""
+        if self.test_mode or self.exchange is None:
+            return
+        try:
+            self.exchange.load_markets(reload=True)
+            self._instrument_meta.clear()
+            logger.info("✅ 市场信息已刷新: %s个交易对", len(self.exchange.markets))
+        except Exception as e:
+            logger.error("❌ 刷新市场信息失败: %s", e)
+    
+    def _uses_pos_side(self):
+        """账户是否为双向持仓模式（下单需要带posSide）
+        
+        首次调用时查询一次账户配置并缓存，避免单向持仓账户每次下单都先失败再重试；
+        查询失败时按双向持仓处理，由下单的51000重试兜底。
+        """
+        if self._long_short_mode is None:
+            try:
+                response = self.exchange.private_get_account_config()
+                self._long_short_mode = response['data'][0]['posMode'] == 'long_short_mode'
+                self._pos_mode_from_config = True
+                logger.info("   📊 持仓模式: %s", '双向持仓' if self._long_short_mode else '单向持仓')
+            except Exception as e:
+                logger.warning("   ⚠️  查询持仓模式失败: %s，按双向持仓下单", e)
+                return True
+        return self._long_short_mode
+    
+    def _remember_one_way_mode(self):
+        """不带posSide的重试下单成功后调用，记住单向持仓模式
+        
+        51000是OKX通用的参数错误，价格/数量不对也会触发，所以只在重试真正成功后才缓存；
+        若当前模式来自账户配置（双向）却被重试推翻，说明持仓模式可能被改过，清空缓存下次重新查询。
+        """
+        if self._pos_mode_from_config and self._long_short_mode:
+            self._long_short_mode = None
+            self._pos_mode_from_config = False
+        else:
+            self._long_short_mode = False
+    
+    def _to_coin_amount(self, symbol, amount):
+        """合约张数 → 币数量（下单和保证金诊断共用同一个换算结果）
+        
+        Returns:
+            tuple: (合约规格, 币数量)，币数量 = 合约张数 × 合约规格，保留两位小数（OKX 要求）
+        """
+        contract_size, _ = self.get_contract_size(symbol)
+        return contract_size, round(float(amount) * contract_size, 2)
+    
     def calculate_contract_amount(self, symbol, usdt_amount, current_price, leverage=None):
         """计算可以购买的合约张数
         
@@ -178,18 +957,9 @@ class OKXTraderV2:
         coin_amount = position_value / current_price
         contract_amount = coin_amount / contract_size
         
-        # 根据最小下单量调整
-        if contract_amount < min_size:
-            contract_amount = min_size
-        else:
-            if min_size >= 1:
-                contract_amount = int(contract_amount)
-            elif min_size >= 0.1:
-                contract_amount = int(contract_amount * 10) / 10
-            elif min_size >= 0.01:
-                contract_amount = int(contract_amount * 100) / 100
-            else:
-                contract_amount = round(contract_amount, 4)
+        # 根据最小下单量向下取整（取整倍数算一次，下面超额调整时复用）
+        step = _amount_step(min_size)
+        contract_amount = max(min_size, math.floor(contract_amount * step) / step)
         
         # 🔴 验证：计算实际所需保证金，确保不超过输入的 usdt_amount
         actual_coin_amount = contract_amount * contract_size  # 实际币数量
@@ -198,8 +968,8 @@ class OKXTraderV2:
         
         # 🔴 如果实际所需保证金超过输入金额，向下调整合约数量
         if actual_required_margin > usdt_amount:
-            print(f"   ⚠️  警告：计算出的合约数量需要保证金${actual_required_margin:.2f}，超过输入金额${usdt_amount:.2f}")
-            print(f"   🔄 向下调整合约数量...")
+            logger.warning("   ⚠️  警告：计算出的合约数量需要保证金$%.2f，超过输入金额$%.2f", actual_required_margin, usdt_amount)
+            logger.info("   🔄 向下调整合约数量...")
             
             # 反向计算：从可用保证金反推最大合约数量
             max_position_value = usdt_amount * leverage  # 最大持仓价值
@@ -207,42 +977,33 @@ class OKXTraderV2:
             max_contract_amount = max_coin_amount / contract_size  # 最大合约张数
             
             # 根据最小下单量向下取整
-            if max_contract_amount < min_size:
-                contract_amount = min_size
-            else:
-                if min_size >= 1:
-                    contract_amount = int(max_contract_amount)
-                elif min_size >= 0.1:
-                    contract_amount = int(max_contract_amount * 10) / 10
-                elif min_size >= 0.01:
-                    contract_amount = int(max_contract_amount * 100) / 100
-                else:
-                    contract_amount = round(max_contract_amount, 4)
+            contract_amount = max(min_size, math.floor(max_contract_amount * step) / step)
             
             # 重新计算实际所需保证金
             actual_coin_amount = contract_amount * contract_size
             actual_position_value = actual_coin_amount * current_price
             actual_required_margin = actual_position_value / leverage
             
-            print(f"   ✅ 调整后合约数量: {contract_amount} 张")
-            print(f"   ✅ 调整后所需保证金: ${actual_required_margin:.2f} (≤ 输入金额${usdt_amount:.2f})")
-        
-        # 🔴 详细的计算过程日志
-        print(f"\n   📊 【合约数量计算详情】")
-        print(f"      输入保证金: ${usdt_amount:.2f}")
-        print(f"      安全保证金(95%): ${safe_margin:.2f} (${usdt_amount:.2f} × 95%)")
-        print(f"      理论持仓价值: ${position_value:.2f} (安全保证金${safe_margin:.2f} × {leverage}倍杠杆)")
-        print(f"      理论币数量: {coin_amount:.4f} SOL (理论持仓价值${position_value:.2f} ÷ 价格${current_price:.2f})")
-        print(f"      合约规格: {contract_size} SOL/张")
-        print(f"      最终合约张数: {contract_amount} 张")
-        print(f"      实际币数量: {actual_coin_amount:.4f} SOL (数量{contract_amount} × 规格{contract_size})")
-        print(f"      实际持仓价值: ${actual_position_value:.2f} (币数量{actual_coin_amount:.4f} × 价格${current_price:.2f})")
-        print(f"      实际所需保证金: ${actual_required_margin:.2f} (持仓价值${actual_position_value:.2f} ÷ {leverage}倍杠杆)")
-        if actual_required_margin <= usdt_amount:
-            print(f"      ✅ 验证通过: 所需保证金${actual_required_margin:.2f} ≤ 输入金额${usdt_amount:.2f}")
-        else:
-            print(f"      ⚠️  警告: 所需保证金${actual_required_margin:.2f} > 输入金额${usdt_amount:.2f} (可能因为最小下单量限制)")
-        print(f"   {'-'*60}\n")
+            logger.info("   ✅ 调整后合约数量: %s 张", contract_amount)
+            logger.info("   ✅ 调整后所需保证金: $%.2f (≤ 输入金额$%.2f)", actual_required_margin, usdt_amount)
+        
+        # 🔴 详细的计算过程日志（只在调试级别输出）
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("\n   📊 【合约数量计算详情】")
+            logger.debug("      输入保证金: $%.2f", usdt_amount)
+            logger.debug("      安全保证金(95%%): $%.2f ($%.2f × 95%%)", safe_margin, usdt_amount)
+            logger.debug("      理论持仓价值: $%.2f (安全保证金$%.2f × %s倍杠杆)", position_value, safe_margin, leverage)
+            logger.debug("      理论币数量: %.4f SOL (理论持仓价值$%.2f ÷ 价格$%.2f)", coin_amount, position_value, current_price)
+            logger.debug("      合约规格: %s SOL/张", contract_size)
+            logger.debug("      最终合约张数: %s 张", contract_amount)
+            logger.debug("      实际币数量: %.4f SOL (数量%s × 规格%s)", actual_coin_amount, contract_amount, contract_size)
+            logger.debug("      实际持仓价值: $%.2f (币数量%.4f × 价格$%.2f)", actual_position_value, actual_coin_amount, current_price)
+            logger.debug("      实际所需保证金: $%.2f (持仓价值$%.2f ÷ %s倍杠杆)", actual_required_margin, actual_position_value, leverage)
+            if actual_required_margin <= usdt_amount:
+                logger.debug("      ✅ 验证通过: 所需保证金$%.2f ≤ 输入金额$%.2f", actual_required_margin, usdt_amount)
+            else:
+                logger.debug("      ⚠️  警告: 所需保证金$%.2f > 输入金额$%.2f (可能因为最小下单量限制)", actual_required_margin, usdt_amount)
+            logger.debug(SUB_INNER_CLOSE)
         
         return contract_amount
     
@@ -251,9 +1012,9 @@ class OKXTraderV2:
         开多单（使用限价单 + 订单簿优化 - 持续挂单直到成交）
         
         策略：
-        1. 每10秒检查一次，使用最新的买3价挂单
-        2. 如果买3价会立即成交，依次尝试买4价、买5价
-        3. 持续循环直到成交，最多尝试30次（5分钟）
+        1. 以Post-Only挂在最新的买3价（订单簿读WebSocket推送）
+        2. 买3价变化时撤单按新价重挂，始终跟住买3价
+        3. 持续追价直到成交，最多5分钟
         
         Args:
             symbol: 交易对符号
@@ -264,129 +1025,16 @@ class OKXTraderV2:
         Returns:
             dict: 订单信息
         """
-        result = {
-            'entry_order': None,
-            'stop_loss_order': None,
-            'take_profit_order': None
-        }
-        
-        if self.test_mode:
-            print(f"🧪 【测试模式】模拟开多单: {symbol}, 数量: {amount}")
-            result['entry_order'] = {'id': 'TEST_ENTRY', 'status': 'simulated'}
-            return result
-        
-        print(f"\n{'='*60}")
-        print(f"🔵 开始开多单流程: {symbol} (持续挂单模式)")
-        print(f"{'='*60}")
-        
-        entry_order = None
-        start_time = time.time()
-        attempt = 0
-        max_attempts = 30  # 最多尝试30次（5分钟）
-        
-        while not entry_order and attempt < max_attempts:
-            attempt += 1
-            elapsed = time.time() - start_time
-            print(f"\n📊 第{attempt}次尝试 (已过{elapsed:.0f}秒)")
-            
-            # 获取最新的买3价
-            bid3 = self._get_bid_price(symbol, level=3)
-            if bid3:
-                print(f"   买3价: ${bid3:.2f}")
-                entry_order = self._place_limit_order(symbol, 'buy', amount, bid3, timeout=10)
-                
-                # 🔴 检测到保证金不足错误，停止重试
-                if isinstance(entry_order, dict) and entry_order.get('error') == 'insufficient_margin':
-                    print(f"\n❌ 保证金不足，停止开仓")
-                    print(f"   错误: {entry_order.get('message', 'Unknown')}")
-                    break  # 停止循环
-                
-                # 🔴 如果买3会立即成交，尝试买4/买5
-                if not entry_order:
-                    print(f"   💡 买3价已穿过，尝试买4价...")
-                    bid4 = self._get_bid_price(symbol, level=4)
-                    if bid4:
-                        print(f"   买4价: ${bid4:.2f}")
-                        entry_order = self._place_limit_order(symbol, 'buy', amount, bid4, timeout=10)
-                        
-                        # 🔴 检测到保证金不足错误，停止重试
-                        if isinstance(entry_order, dict) and entry_order.get('error') == 'insufficient_margin':
-                            print(f"\n❌ 保证金不足，停止开仓")
-                            print(f"   错误: {entry_order.get('message', 'Unknown')}")
-                            break  # 停止循环
-                    
-                    if not entry_order:
-                        print(f"   💡 买4价已穿过，尝试买5价...")
-                        bid5 = self._get_bid_price(symbol, level=5)
-                        if bid5:
-                            print(f"   买5价: ${bid5:.2f}")
-                            entry_order = self._place_limit_order(symbol, 'buy', amount, bid5, timeout=10)
-                            
-                            # 🔴 检测到保证金不足错误，停止重试
-                            if isinstance(entry_order, dict) and entry_order.get('error') == 'insufficient_margin':
-                                print(f"\n❌ 保证金不足，停止开仓")
-                                print(f"   错误: {entry_order.get('message', 'Unknown')}")
-                                break  # 停止循环
-            
-            # 如果还没成交，等待一小段时间再重试（但如果是保证金不足，已经break了）
-            if not entry_order and attempt < max_attempts:
-                # 🔴 检查是否是保证金不足导致的停止
-                if isinstance(entry_order, dict) and entry_order.get('error') == 'insufficient_margin':
-                    break  # 已经break了，这里不会执行
-                print(f"   ⏳ 未成交，2秒后重试...")
-                time.sleep(2)
-        
-        # 如果达到最大尝试次数仍未成交
-        if not entry_order:
-            elapsed = time.time() - start_time
-            print(f"\n⏰ 达到最大尝试次数({max_attempts}次)，取消本次开仓 (已过{elapsed:.0f}秒)")
-            print(f"   💡 市场波动太大或流动性不足")
-            
-            # 🔴 清理所有可能残留的未成交订单
-            try:
-                print(f"   🧹 清理残留订单...")
-                open_orders = self.exchange.fetch_open_orders(symbol)
-                for order in open_orders:
-                    if order.get('side') == 'buy' and not order.get('reduceOnly'):
-                        try:
-                            self.exchange.cancel_order(order['id'], symbol)
-                            print(f"   ✅ 已取消订单: {order['id']}")
-                        except Exception as e:
-                            print(f"   ⚠️  取消订单失败: {e}")
-            except Exception as e:
-                print(f"   ⚠️  清理订单失败: {e}")
-        
-        result['entry_order'] = entry_order
-        
-        if not entry_order:
-            print(f"\n❌ 开多单失败: 超时未成交")
-            # 🔴 超时失败，不设置止损止盈
-            print(f"{'='*60}\n")
-            return result
-        
-        print(f"\n✅ 开多单成功: 订单ID={entry_order['id']}")
-        
-        # 🔴 不清空监听队列，因为新设置的止损单需要监听
-        # 注释掉：if symbol in self.pending_stop_loss:
-        #     del self.pending_stop_loss[symbol]
-        
-        # 🔴 不立即挂止损止盈单，等待开仓成交后再挂
-        # 止损止盈价格会在开仓成交后通过定时检查机制挂单
-        print(f"   💡 止损止盈单将在开仓成交后自动挂单")
-        print(f"   📝 止损价格: ${stop_loss_price:.2f}" if stop_loss_price else "   📝 止损价格: 未设置")
-        print(f"   📝 止盈价格: ${take_profit_price:.2f}" if take_profit_price else "   📝 止盈价格: 未设置")
-        
-        print(f"{'='*60}\n")
-        return result
+        return self._open_with_limit_order('long', symbol, amount, stop_loss_price, take_profit_price)
     
     def open_short_with_limit_order(self, symbol, amount, stop_loss_price=None, take_profit_price=None):
         """
         开空单（使用限价单 + 订单簿优化 - 持续挂单直到成交）
         
         策略：
-        1. 每10秒检查一次，使用最新的卖3价挂单
-        2. 如果卖3价会立即成交，依次尝试卖4价、卖5价
-        3. 持续循环直到成交，最多尝试30次（5分钟）
+        1. 以Post-Only挂在最新的卖3价（订单簿读WebSocket推送）
+        2. 卖3价变化时撤单按新价重挂，始终跟住卖3价
+        3. 持续追价直到成交，最多5分钟
         
         Args:
             symbol: 交易对符号
@@ -397,6 +1045,25 @@ class OKXTraderV2:
         Returns:
             dict: 订单信息
         """
+        return self._open_with_limit_order('short', symbol, amount, stop_loss_price, take_profit_price)
+    
+    def _open_with_limit_order(self, direction, symbol, amount, stop_loss_price=None, take_profit_price=None):
+        """
+        追价挂限价单开仓（多空共用流程）
+        
+        Args:
+            direction: 'long' 或 'short'
+            其余参数同 open_long_with_limit_order
+        
+        Returns:
+            dict: 订单信息
+        """
+        is_long = direction == 'long'
+        name = '多' if is_long else '空'
+        order_side = 'buy' if is_long else 'sell'
+        level_name = '买3价' if is_long else '卖3价'
+        get_price = self._get_bid_price if is_long else self._get_ask_price
+        
         result = {
             'entry_order': None,
             'stop_loss_order': None,
@@ -404,79 +1071,75 @@ class OKXTraderV2:
         }
         
         if self.test_mode:
-            print(f"🧪 【测试模式】模拟开空单: {symbol}, 数量: {amount}")
+            logger.info("🧪 【测试模式】模拟开%s单: %s, 数量: %s", name, symbol, amount)
             result['entry_order'] = {'id': 'TEST_ENTRY', 'status': 'simulated'}
             return result
         
-        print(f"\n{'='*60}")
-        print(f"🔴 开始开空单流程: {symbol} (持续挂单模式)")
-        print(f"{'='*60}")
+        logger.info(SEP_OPEN)
+        logger.info("%s 开始开%s单流程: %s (持续挂单模式)", '🔵' if is_long else '🔴', name, symbol)
+        logger.info(SEP)
         
         entry_order = None
         start_time = time.time()
         attempt = 0
-        max_attempts = 30  # 最多尝试30次（5分钟）
         
-        while not entry_order and attempt < max_attempts:
+        while not entry_order and time.time() - start_time < ENTRY_CHASE_TIMEOUT_S:
             attempt += 1
             elapsed = time.time() - start_time
-            print(f"\n📊 第{attempt}次尝试 (已过{elapsed:.0f}秒)")
+            logger.info("\n📊 第%s次挂单 (已过%.0f秒)", attempt, elapsed)
             
-            # 获取最新的卖3价
-            ask3 = self._get_ask_price(symbol, level=3)
-            if ask3:
-                print(f"   卖3价: ${ask3:.2f}")
-                entry_order = self._place_limit_order(symbol, 'sell', amount, ask3, timeout=10)
-                
-                # 🔴 如果卖3会立即成交，尝试卖4/卖5
-                if not entry_order:
-                    print(f"   💡 卖3价已穿过，尝试卖4价...")
-                    ask4 = self._get_ask_price(symbol, level=4)
-                    if ask4:
-                        print(f"   卖4价: ${ask4:.2f}")
-                        entry_order = self._place_limit_order(symbol, 'sell', amount, ask4, timeout=10)
-                    
-                    if not entry_order:
-                        print(f"   💡 卖4价已穿过，尝试卖5价...")
-                        ask5 = self._get_ask_price(symbol, level=5)
-                        if ask5:
-                            print(f"   卖5价: ${ask5:.2f}")
-                            entry_order = self._place_limit_order(symbol, 'sell', amount, ask5, timeout=10)
-            
-            # 如果还没成交，等待一小段时间再重试
-            if not entry_order and attempt < max_attempts:
-                print(f"   ⏳ 未成交，2秒后重试...")
-                time.sleep(2)
-        
-        # 如果达到最大尝试次数仍未成交
+            price = get_price(symbol, level=3)
+            if not price:
+                logger.warning("   ⚠️  未取到%s，稍后重试...", level_name)
+                self._wait_orderbook_update(symbol, 1)
+                continue
+            
+            logger.info("   %s: $%.2f", level_name, price)
+            # 🔴 挂单期间盘口的第3档价格一变就撤单重挂（读内存订单簿，不额外请求），不再逐档降级、固定间隔重试
+            entry_order = self._place_limit_order(
+                symbol, order_side, amount, price,
+                timeout=ENTRY_CHASE_TIMEOUT_S - elapsed,
+                reprice=lambda: get_price(symbol, level=3) not in (None, price)
+            )
+            
+            # 🔴 检测到保证金不足错误，停止重试
+            if isinstance(entry_order, dict) and entry_order.get('error') == 'insufficient_margin':
+                logger.error("\n❌ 保证金不足，停止开仓")
+                logger.info("   错误: %s", entry_order.get('message', 'Unknown'))
+                entry_order = None
+                break
+            
+            # 🔴 Post-Only被撤（价格已穿过）时盘口还是旧的，等下一次盘口推送（最多2秒）再重挂；因盘口移动撤单的直接按新价重挂
+            if not entry_order and get_price(symbol, level=3) in (None, price):
+                self._wait_orderbook_update(symbol, ENTRY_BOOK_WAIT_S)
+        
+        # 如果超时仍未成交
         if not entry_order:
             elapsed = time.time() - start_time
-            print(f"\n⏰ 达到最大尝试次数({max_attempts}次)，取消本次开仓 (已过{elapsed:.0f}秒)")
-            print(f"   💡 市场波动太大或流动性不足")
+            logger.info("\n⏰ 未成交，取消本次开仓 (已过%.0f秒, 挂单%s次)", elapsed, attempt)
+            logger.info("   💡 市场波动太大或流动性不足")
             
-            # 🔴 清理所有可能残留的未成交订单
+            # 🔴 清理所有可能残留的未成交开仓订单（一次批量撤单，不逐个请求）
             try:
-                print(f"   🧹 清理残留订单...")
+                logger.info("   🧹 清理残留订单...")
                 open_orders = self.exchange.fetch_open_orders(symbol)
-                for order in open_orders:
-                    if order.get('side') == 'sell' and not order.get('reduceOnly'):
-                        try:
-                            self.exchange.cancel_order(order['id'], symbol)
-                            print(f"   ✅ 已取消订单: {order['id']}")
-                        except Exception as e:
-                            print(f"   ⚠️  取消订单失败: {e}")
+                leftover = [
+                    order['id'] for order in open_orders
+                    if order.get('side') == order_side and not order.get('reduceOnly')
+                ]
+                self._cancel_orders_batch(symbol, leftover, label='开仓订单')
             except Exception as e:
-                print(f"   ⚠️  清理订单失败: {e}")
+                logger.warning("   ⚠️  清理订单失败: %s", e)
         
         result['entry_order'] = entry_order
         
         if not entry_order:
-            print(f"\n❌ 开空单失败: 超时未成交")
+            logger.error("\n❌ 开%s单失败: 超时未成交", name)
             # 🔴 超时失败，不设置止损止盈
-            print(f"{'='*60}\n")
+            logger.info(SEP_CLOSE)
             return result
         
-        print(f"\n✅ 开空单成功: 订单ID={entry_order['id']}")
+        logger.info("\n✅ 开%s单成功: 订单ID=%s", name, entry_order['id'])
         
         # 🔴 不清空监听队列，因为新设置的止损单需要监听
         # 注释掉：if symbol in self.pending_stop_loss:
@@ -484,11 +1147,14 @@ class OKXTraderV2:
         
         # 🔴 不立即挂止损止盈单，等待开仓成交后再挂
         # 止损止盈价格会在开仓成交后通过定时检查机制挂单
-        print(f"   💡 止损止盈单将在开仓成交后自动挂单")
-        print(f"   📝 止损价格: ${stop_loss_price:.2f}" if stop_loss_price else "   📝 止损价格: 未设置")
-        print(f"   📝 止盈价格: ${take_profit_price:.2f}" if take_profit_price else "   📝 止盈价格: 未设置")
+        logger.info("   💡 止损止盈单将在开仓成交后自动挂单")
+        for label, price in (('止损', stop_loss_price), ('止盈', take_profit_price)):
+            if price:
+                logger.info("   📝 %s价格: $%.2f", label, price)
+            else:
+                logger.info("   📝 %s价格: 未设置", label)
         
-        print(f"{'='*60}\n")
+        logger.info(SEP_CLOSE)
         return result
     
     def _try_place_limit_order_immediately(self, symbol, side, amount, price):
@@ -506,25 +1172,22 @@ class OKXTraderV2:
         """
         try:
             # 🔴 将合约张数转换为币数量（OKX API 需要币数量，而不是合约张数）
-            contract_size, _ = self.get_contract_size(symbol)
-            coin_amount = float(amount) * contract_size  # 币数量 = 合约张数 × 合约规格
-            # 保留两位小数（OKX 要求）
-            coin_amount = round(coin_amount, 2)
+            contract_size, coin_amount = self._to_coin_amount(symbol, amount)
             
-            # 检查是否会立即成交
-            ticker = self.exchange.fetch_ticker(symbol)
+            # 检查是否会立即成交（开仓流程刚查过当前价，1秒内复用同一个ticker）
+            ticker = self._get_ticker(symbol)
             
             if side == 'buy':
                 best_ask = ticker.get('ask', ticker['last'])
                 if price >= best_ask:
-                    print(f"   ⚠️  限价单会立即成交 (限价${price:.2f} >= 卖一${best_ask:.2f})")
-                    print(f"   💡 无法挂限价单，将使用条件单")
+                    logger.warning("   ⚠️  限价单会立即成交 (限价$%.2f >= 卖一$%.2f)", price, best_ask)
+                    logger.info("   💡 无法挂限价单，将使用条件单")
                     return None
             else:
                 best_bid = ticker.get('bid', ticker['last'])
                 if price <= best_bid:
-                    print(f"   ⚠️  限价单会立即成交 (限价${price:.2f} <= 买一${best_bid:.2f})")
-                    print(f"   💡 无法挂限价单，将使用条件单")
+                    logger.warning("   ⚠️  限价单会立即成交 (限价$%.2f <= 买一$%.2f)", price, best_bid)
+                    logger.info("   💡 无法挂限价单，将使用条件单")
                     return None
             
             # 尝试挂限价单（使用Post-Only，如果会立即成交会被拒绝）
@@ -532,101 +1195,84 @@ class OKXTraderV2:
                 'postOnly': True  # 只做Maker
             }
             
-            if side == 'buy':
-                params['posSide'] = 'long'
-            else:
-                params['posSide'] = 'short'
-            
-            # 🔴 打印详细的挂单参数
-            print(f"\n   📋 【挂单参数详情】")
-            print(f"      Symbol: {symbol}")
-            print(f"      Side: {side}")
-            print(f"      合约张数: {amount} 张")
-            print(f"      合约规格: {contract_size} SOL/张")
-            print(f"      币数量: {coin_amount} SOL (合约张数{amount} × 规格{contract_size})")
-            print(f"      Price: ${price:.2f}")
-            print(f"      Params: {params}")
-            
-            # 获取账户余额信息
-            try:
-                balance_info = self.get_balance()
-                if balance_info:
-                    print(f"      💰 账户余额: 总余额=${balance_info.get('total', 0):.2f}, 可用=${balance_info.get('free', 0):.2f}, 已用=${balance_info.get('used', 0):.2f}")
-                
-                # 🔴 计算需要的保证金
-                leverage = getattr(self, 'leverage', TRADING_CONFIG.get('leverage', 1))
-                position_value = coin_amount * price  # 实际持仓价值（币数量 × 价格）
-                required_margin = position_value / leverage  # 所需保证金（持仓价值 ÷ 杠杆）
-                
-                print(f"      💰 持仓价值: ${position_value:.2f} (币数量{coin_amount} × 价格${price:.2f})")
-                print(f"      💰 所需保证金: ${required_margin:.2f} (持仓价值${position_value:.2f} ÷ {leverage}倍杠杆)")
-                if balance_info:
-                    free_balance = balance_info.get('free', 0)
-                    if free_balance < required_margin:
-                        print(f"      ⚠️  可用余额不足: 需要${required_margin:.2f}, 可用${free_balance:.2f}, 差额=${required_margin - free_balance:.2f}")
-                    else:
-                        print(f"      ✅ 可用余额充足: 需要${required_margin:.2f}, 可用${free_balance:.2f}, 剩余=${free_balance - required_margin:.2f}")
-            except Exception as e:
-                print(f"      ⚠️  获取账户信息失败: {e}")
-            
-            print(f"   {'-'*60}\n")
+            if self._uses_pos_side():
+                params['posSide'] = 'long' if side == 'buy' else 'short'
+            
+            # 🔴 挂单参数详情和余额/保证金诊断（额外调用一次余额接口）只在调试模式下输出
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("\n   📋 【挂单参数详情】")
+                logger.debug("      Symbol: %s", symbol)
+                logger.debug("      Side: %s", side)
+                logger.debug("      合约张数: %s 张", amount)
+                logger.debug("      合约规格: %s SOL/张", contract_size)
+                logger.debug("      币数量: %s SOL (合约张数%s × 规格%s)", coin_amount, amount, contract_size)
+                logger.debug("      Price: $%.2f", price)
+                logger.debug("      Params: %s", params)
+                self._debug_log_margin(amount, price, contract_size, coin_amount)
+                logger.debug(SUB_INNER_CLOSE)
             
             try:
                 # 🔴 使用币数量而不是合约张数
-                print(f"\n   📤 【OKX API调用详情】")
-                print(f"      CCXT方法: create_limit_order")
-                print(f"      参数:")
-                print(f"         symbol: {symbol}")
-                print(f"         side: {side}")
-                print(f"         amount: {coin_amount} (币数量，类型: {type(coin_amount).__name__})")
-                print(f"         price: {price} (类型: {type(price).__name__})")
-                print(f"         params: {params}")
-                print(f"      📊 计算过程:")
-                print(f"         - 合约张数(输入): {amount} 张")
-                print(f"         - 合约规格: {contract_size} SOL/张")
-                print(f"         - 币数量(计算): {coin_amount} SOL = {amount} × {contract_size}")
-                print(f"         - 价格: ${price:.2f}")
-                print(f"      📋 CCXT可能转换为OKX API:")
-                print(f"         POST /api/v5/trade/order")
-                print(f"         请求体可能包含:")
-                print(f"           - instId: {symbol}")
-                print(f"           - tdMode: cross (全仓)")
-                print(f"           - side: {side}")
-                print(f"           - ordType: limit")
-                print(f"           - sz: {coin_amount} (币数量)")
-                print(f"           - px: {price}")
-                print(f"           - posSide: {params.get('posSide', 'None')}")
-                print(f"           - postOnly: {params.get('postOnly', False)}")
-                print(f"   {'='*60}\n")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("\n   📤 【OKX API调用详情】")
+                    logger.debug("      CCXT方法: create_limit_order")
+                    logger.debug("      参数:")
+                    logger.debug("         symbol: %s", symbol)
+                    logger.debug("         side: %s", side)
+                    logger.debug("         amount: %s (币数量，类型: %s)", coin_amount, type(coin_amount).__name__)
+                    logger.debug("         price: %s (类型: %s)", price, type(price).__name__)
+                    logger.debug("         params: %s", params)
+                    logger.debug("      📊 计算过程:")
+                    logger.debug("         - 合约张数(输入): %s 张", amount)
+                    logger.debug("         - 合约规格: %s SOL/张", contract_size)
+                    logger.debug("         - 币数量(计算): %s SOL = %s × %s", coin_amount, amount, contract_size)
+                    logger.debug("         - 价格: $%.2f", price)
+                    logger.debug("      📋 CCXT可能转换为OKX API:")
+                    logger.debug("         POST /api/v5/trade/order")
+                    logger.debug("         请求体可能包含:")
+                    logger.debug("           - instId: %s", symbol)
+                    logger.debug("           - tdMode: cross (全仓)")
+                    logger.debug("           - side: %s", side)
+                    logger.debug("           - ordType: limit")
+                    logger.debug("           - sz: %s (币数量)", coin_amount)
+                    logger.debug("           - px: %s", price)
+                    logger.debug("           - posSide: %s", params.get('posSide', 'None'))
+                    logger.debug("           - postOnly: %s", params.get('postOnly', False))
+                    logger.debug(SEP_INNER_CLOSE)
                 
+                self._trade_bucket.take()
                 order = self.exchange.create_limit_order(symbol, side, coin_amount, price, params)
                 
-                print(f"   ✅ API调用成功，返回订单ID: {order.get('id', 'N/A')}")
+                logger.info("   ✅ API调用成功，返回订单ID: %s", order.get('id', 'N/A'))
             except Exception as e1:
                 error_msg = str(e1)
-                print(f"\n   ❌ API调用失败: {error_msg}")
-                print(f"   📋 错误详情: {type(e1).__name__}: {str(e1)}")
+                logger.error("\n   ❌ API调用失败: %s", error_msg)
+                logger.info("   📋 错误详情: %s: %s", type(e1).__name__, str(e1))
                 
-                if '51000' in error_msg or 'posSide' in error_msg:
-                    print(f"   🔄 检测到单向持仓模式，重试不带posSide...")
+                # 🔴 只有本次带了posSide才重试：已按单向持仓下单时51000是其他参数错误，重试同样会失败
+                if 'posSide' in params and ('51000' in error_msg or 'posSide' in error_msg):
+                    logger.info("   🔄 可能是单向持仓模式，重试不带posSide...")
                     retry_params = params.copy()
-                    del retry_params['posSide']
+                    retry_params.pop('posSide', None)
                     
-                    print(f"\n   📤 【OKX API重试调用详情】")
-                    print(f"      方法: create_limit_order")
-                    print(f"      symbol: {symbol}")
-                    print(f"      side: {side}")
-                    print(f"      amount: {coin_amount} (币数量)")
-                    print(f"      price: {price}")
-                    print(f"      params: {retry_params} (已移除posSide)")
-                    print(f"   {'='*60}\n")
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug("\n   📤 【OKX API重试调用详情】")
+                        logger.debug("      方法: create_limit_order")
+                        logger.debug("      symbol: %s", symbol)
+                        logger.debug("      side: %s", side)
+                        logger.debug("      amount: %s (币数量)", coin_amount)
+                        logger.debug("      price: %s", price)
+                        logger.debug("      params: %s (已移除posSide)", retry_params)
+                        logger.debug(SEP_INNER_CLOSE)
                     
                     # 🔴 重试时也使用币数量，不是合约张数
+                    self._trade_bucket.take()
                     order = self.exchange.create_limit_order(symbol, side, coin_amount, price, retry_params)
-                    print(f"   ✅ 重试成功，返回订单ID: {order.get('id', 'N/A')}")
+                    self._remember_one_way_mode()  # 🔴 重试成功才记住单向持仓模式
+                    logger.info("   ✅ 重试成功，返回订单ID: %s", order.get('id', 'N/A'))
                 elif '51008' in error_msg or 'post_only' in error_msg.lower() or 'Post only' in error_msg:
-                    print(f"   ⚠️  Post-Only被拒绝（订单会立即成交）")
-                    print(f"   💡 无法挂限价单，将使用条件单")
+                    logger.warning("   ⚠️  Post-Only被拒绝（订单会立即成交）")
+                    logger.info("   💡 无法挂限价单，将使用条件单")
                     return None
                 else:
                     raise e1
@@ -637,26 +1283,26 @@ class OKXTraderV2:
                 status = order_status.get('status', 'unknown')
                 
                 if status == 'closed':
-                    print(f"   ⚠️  限价单已成交！成交价: ${order_status.get('average', 'unknown')}")
+                    logger.warning("   ⚠️  限价单已成交！成交价: $%s", order_status.get('average', 'unknown'))
                     return order_status
                 elif status == 'canceled':
-                    print(f"   ⚠️  Post-Only限价单被系统撤销")
-                    print(f"   💡 无法挂限价单，将使用条件单")
+                    logger.warning("   ⚠️  Post-Only限价单被系统撤销")
+                    logger.info("   💡 无法挂限价单，将使用条件单")
                     return None
                 else:
-                    print(f"   ✅ 限价单已挂: ID={order['id']}, 状态={status}")
+                    logger.info("   ✅ 限价单已挂: ID=%s, 状态=%s", order['id'], status)
                     return order_status
-                    
+            
             except Exception as e:
-                print(f"   ⚠️  检查订单状态失败: {e}")
+                logger.warning("   ⚠️  检查订单状态失败: %s", e)
                 # 如果无法确认状态，返回订单（可能成功）
                 return order
-                
+        
         except Exception as e:
-            print(f"   ❌ 挂限价单失败: {e}")
+            logger.error("   ❌ 挂限价单失败: %s", e)
             return None
     
-    def _place_limit_order(self, symbol, side, amount, price, timeout=30, check_immediate_fill=True):
+    def _place_limit_order(self, symbol, side, amount, price, timeout=30, check_immediate_fill=True, reprice=None):
         """
         下限价单并等待成交
         
@@ -666,136 +1312,177 @@ class OKXTraderV2:
             amount: 合约张数（需要转换为币数量）
             price: 价格
             timeout: 超时时间（秒）
-            check_immediate_fill: 是否检查立即成交（开仓时True，止损止盈时False）
+            check_immediate_fill: 是否只做Maker（开仓时True：以Post-Only下单，会立即成交时由交易所撤单）
+            reprice: 可选，无参函数，返回True表示挂单价已落后于盘口，撤单返回None由上层按新价重挂
         
         Returns:
-            dict: 成交的订单信息，或 None
+            dict: 成交（含撤单前部分成交）的订单信息，或 None
         """
         try:
             # 🔴 将合约张数转换为币数量（OKX API 需要币数量，而不是合约张数）
-            contract_size, _ = self.get_contract_size(symbol)
-            coin_amount = float(amount) * contract_size  # 币数量 = 合约张数 × 合约规格
-            # 保留两位小数（OKX 要求）
-            coin_amount = round(coin_amount, 2)
+            contract_size, coin_amount = self._to_coin_amount(symbol, amount)
             
-            # 🔴 开仓时检查是否会立即成交
+            # 下限价单
+            params = {}
+            # 🔴 开仓时用Post-Only代替下单前查盘口：会立即成交时交易所直接撤单（等待循环里读到已取消返回None，让上层决定），
+            # 省一次行情请求，也没有“查完盘口到下单之间价格已变”的问题
             if check_immediate_fill:
-                ticker = self.exchange.fetch_ticker(symbol)
-                
-                if side == 'buy':
-                    best_ask = ticker.get('ask', ticker['last'])
-                    if price >= best_ask:
-                        print(f"   ⚠️  限价单会立即成交 (限价${price:.2f} >= 卖一${best_ask:.2f})")
-                        print(f"   💡 说明: 市场价格已穿过预期价格")
-                        # 🔴 不直接放弃，返回None让上层决定
-                        return None
-                else:
-                    best_bid = ticker.get('bid', ticker['last'])
-                    if price <= best_bid:
-                        print(f"   ⚠️  限价单会立即成交 (限价${price:.2f} <= 买一${best_bid:.2f})")
-                        print(f"   💡 说明: 市场价格已穿过预期价格")
-                        return None
-            
-            # 下限价单
-            params = {}
-            if side == 'buy':
-                params['posSide'] = 'long'
-            else:
-                params['posSide'] = 'short'
+                params['postOnly'] = True
+            if self._uses_pos_side():
+                params['posSide'] = 'long' if side == 'buy' else 'short'
             
             try:
                 # 🔴 使用币数量而不是合约张数
-                print(f"\n   📤 【OKX API调用详情】")
-                print(f"      CCXT方法: create_limit_order")
-                print(f"      参数:")
-                print(f"         symbol: {symbol}")
-                print(f"         side: {side}")
-                print(f"         amount: {coin_amount} (币数量，类型: {type(coin_amount).__name__})")
-                print(f"         price: {price} (类型: {type(price).__name__})")
-                print(f"         params: {params}")
-                print(f"      📊 计算过程:")
-                print(f"         - 合约张数(输入): {amount} 张")
-                print(f"         - 合约规格: {contract_size} SOL/张")
-                print(f"         - 币数量(计算): {coin_amount} SOL = {amount} × {contract_size}")
-                print(f"         - 价格: ${price:.2f}")
-                print(f"      📋 CCXT可能转换为OKX API:")
-                print(f"         POST /api/v5/trade/order")
-                print(f"         请求体可能包含:")
-                print(f"           - instId: {symbol}")
-                print(f"           - tdMode: cross (全仓)")
-                print(f"           - side: {side}")
-                print(f"           - ordType: limit")
-                print(f"           - sz: {coin_amount} (币数量)")
-                print(f"           - px: {price}")
-                print(f"           - posSide: {params.get('posSide', 'None')}")
-                print(f"   {'='*60}\n")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("\n   📤 【OKX API调用详情】")
+                    logger.debug("      CCXT方法: create_limit_order")
+                    logger.debug("      参数:")
+                    logger.debug("         symbol: %s", symbol)
+                    logger.debug("         side: %s", side)
+                    logger.debug("         amount: %s (币数量，类型: %s)", coin_amount, type(coin_amount).__name__)
+                    logger.debug("         price: %s (类型: %s)", price, type(price).__name__)
+                    logger.debug("         params: %s", params)
+                    logger.debug("      📊 计算过程:")
+                    logger.debug("         - 合约张数(输入): %s 张", amount)
+                    logger.debug("         - 合约规格: %s SOL/张", contract_size)
+                    logger.debug("         - 币数量(计算): %s SOL = %s × %s", coin_amount, amount, contract_size)
+                    logger.debug("         - 价格: $%.2f", price)
+                    logger.debug("      📋 CCXT可能转换为OKX API:")
+                    logger.debug("         POST /api/v5/trade/order")
+                    logger.debug("         请求体可能包含:")
+                    logger.debug("           - instId: %s", symbol)
+                    logger.debug("           - tdMode: cross (全仓)")
+                    logger.debug("           - side: %s", side)
+                    logger.debug("           - ordType: limit")
+                    logger.debug("           - sz: %s (币数量)", coin_amount)
+                    logger.debug("           - px: %s", price)
+                    logger.debug("           - posSide: %s", params.get('posSide', 'None'))
+                    logger.debug(SEP_INNER_CLOSE)
                 
+                self._trade_bucket.take()
                 order = self.exchange.create_limit_order(symbol, side, coin_amount, price, params)
                 
-                print(f"   ✅ API调用成功，返回订单ID: {order.get('id', 'N/A')}")
+                logger.info("   ✅ API调用成功，返回订单ID: %s", order.get('id', 'N/A'))
             except Exception as e1:
                 error_msg = str(e1)
-                print(f"\n   ❌ API调用失败: {error_msg}")
-                print(f"   📋 错误详情: {type(e1).__name__}: {str(e1)}")
+                logger.error("\n   ❌ API调用失败: %s", error_msg)
+                logger.info("   📋 错误详情: %s: %s", type(e1).__name__, str(e1))
                 
-                if '51000' in str(e1) or 'posSide' in str(e1):
-                    print(f"   🔄 检测到单向持仓模式")
+                if 'posSide' in params and ('51000' in error_msg or 'posSide' in error_msg):
+                    logger.info("   🔄 可能是单向持仓模式")
+                    params.pop('posSide', None)
                     # 🔴 重试时也使用币数量
-                    print(f"\n   📤 【OKX API重试调用详情】")
-                    print(f"      方法: create_limit_order")
-                    print(f"      symbol: {symbol}")
-                    print(f"      side: {side}")
-                    print(f"      amount: {coin_amount} (币数量)")
-                    print(f"      price: {price}")
-                    print(f"      params: {{}} (无posSide)")
-                    print(f"   {'='*60}\n")
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug("\n   📤 【OKX API重试调用详情】")
+                        logger.debug("      方法: create_limit_order")
+                        logger.debug("      symbol: %s", symbol)
+                        logger.debug("      side: %s", side)
+                        logger.debug("      amount: %s (币数量)", coin_amount)
+                        logger.debug("      price: %s", price)
+                        logger.debug("      params: %s (无posSide)", params)
+                        logger.debug(SEP_INNER_CLOSE)
                     
-                    order = self.exchange.create_limit_order(symbol, side, coin_amount, price)
-                    print(f"   ✅ 重试成功，返回订单ID: {order.get('id', 'N/A')}")
+                    self._trade_bucket.take()
+                    order = self.exchange.create_limit_order(symbol, side, coin_amount, price, params)
+                    self._remember_one_way_mode()  # 🔴 重试成功才记住单向持仓模式
+                    logger.info("   ✅ 重试成功，返回订单ID: %s", order.get('id', 'N/A'))
                 else:
                     raise e1
             
             order_id = order['id']
-            print(f"   ✅ 限价单已下: ID={order_id}, 价格=${price:.2f}")
+            logger.info("   ✅ 限价单已下: ID=%s, 价格=$%.2f", order_id, price)
             
             # 等待成交
-            print(f"   ⏳ 等待成交 (超时{timeout}秒)...")
+            logger.info("   ⏳ 等待成交 (超时%.0f秒)...", timeout)
             start_time = time.time()
+            sleep_s = 1.0
+            last_progress = 0
             
-            while time.time() - start_time < timeout:
-                time.sleep(1)  # 每1秒检查一次，提高响应速度
-                
+            # 🔴 订单推送在线时等推送唤醒（成交/撤销即时返回），REST只做低频兜底；推送不在线时按自适应间隔轮询
+            self._ensure_order_watcher()
+            waiter = self._order_waiters[str(order_id)] = threading.Event()
+            last_rest = start_time
+            try:
+                while time.time() - start_time < timeout:
+                    watcher = self.order_watcher
+                    push_online = watcher is not None and watcher.logged_in
+                    wait_s = ORDER_PUSH_POLL_S if push_online else sleep_s
+                    if reprice is not None:
+                        wait_s = min(wait_s, REPRICE_CHECK_S)
+                    remaining = timeout - (time.time() - start_time)
+                    woke = waiter.wait(min(wait_s, max(remaining, 0)))
+                    if woke:
+                        waiter.clear()  # REST偶尔比推送慢一步仍显示未成交，清掉标记避免空转查询
+                    
+                    # 🔴 追价挂单醒得更勤，但只在推送唤醒、推送不在线或到了兜底间隔时才查REST
+                    if woke or not push_online or time.time() - last_rest >= ORDER_PUSH_POLL_S:
+                        last_rest = time.time()
+                        order_info = self.exchange.fetch_order(order_id, symbol)
+                        status = order_info['status']
+                        
+                        if status == 'closed':
+                            logger.info("   ✅ 订单已成交: 成交价=$%.2f", order_info.get('average', price))
+                            return order_info
+                        elif status == 'canceled':
+                            if float(order_info.get('filled') or 0) > 0:
+                                logger.info("   ✅ 订单部分成交后被撤: 已成交%s", order_info['filled'])
+                                return order_info
+                            logger.error("   ❌ 订单已取消")
+                            return None
+                        
+                        # 🔴 自适应轮询：离挂单价越近查得越勤（最快0.2秒），越远越慢（最慢2秒）
+                        if not push_online:
+                            try:
+                                last = self._get_ticker(symbol, max_age=sleep_s)['last']
+                                sleep_s = min(2.0, max(0.2, abs(last - price) / price * 400))
+                            except Exception:
+                                sleep_s = 1.0
+                    
+                    if reprice is not None and reprice():
+                        logger.info("   🔄 盘口已移动，撤单按新价重挂...")
+                        break
+                    
+                    # 显示等待进度
+                    elapsed = time.time() - start_time
+                    remaining = timeout - elapsed
+                    if int(elapsed) // 3 > last_progress:  # 每3秒显示一次进度（轮询间隔不固定）
+                        last_progress = int(elapsed) // 3
+                        logger.info("   ⏳ 等待中... 剩余%.0f秒", remaining)
+                else:
+                    logger.info("   ⏱️  超时未成交，撤单...")
+            finally:
+                self._order_waiters.pop(str(order_id), None)
+            
+            # 超时未成交（或盘口已移动），撤单；撤单失败多半是刚好成交了，以订单实际状态为准
+            try:
+                self._cancel_order(order_id, symbol)
+            except Exception:
                 order_info = self.exchange.fetch_order(order_id, symbol)
-                status = order_info['status']
-                
-                if status == 'closed':
-                    print(f"   ✅ 订单已成交: 成交价=${order_info.get('average', price):.2f}")
+                if order_info['status'] == 'closed':
+                    logger.info("   ✅ 订单已成交: 成交价=$%.2f", order_info.get('average', price))
                     return order_info
-                elif status == 'canceled':
-                    print(f"   ❌ 订单已取消")
-                    return None
-                
-                # 显示等待进度
-                elapsed = time.time() - start_time
-                remaining = timeout - elapsed
-                if int(elapsed) % 3 == 0:  # 每3秒显示一次进度
-                    print(f"   ⏳ 等待中... 剩余{remaining:.0f}秒")
-            
-            # 超时未成交，撤单
-            print(f"   ⏱️  超时未成交，撤单...")
-            self.exchange.cancel_order(order_id, symbol)
-            return None
+                if float(order_info.get('filled') or 0) > 0:
+                    logger.info("   ✅ 订单已部分成交: 已成交%s", order_info['filled'])
+                    return order_info
+                raise
             
+            # 🔴 撤单前可能已部分成交：部分成交也算开仓成功，直接返回，避免上层按全量重挂导致仓位超量
+            order_info = self.exchange.fetch_order(order_id, symbol)
+            if float(order_info.get('filled') or 0) > 0:
+                logger.info("   ✅ 撤单前已部分成交: 已成交%s，不再重挂", order_info['filled'])
+                return order_info
+            return None
+        
         except Exception as e:
             error_msg = str(e)
             # 🔴 检测到"保证金不足"错误，停止重试
             if '51008' in error_msg or 'Insufficient' in error_msg or 'margin' in error_msg.lower():
-                print(f"   ❌ 下限价单失败: 保证金不足")
-                print(f"   💡 错误信息: {error_msg}")
-                print(f"   ⚠️  停止重试，请检查账户可用保证金")
+                logger.error("   ❌ 下限价单失败: 保证金不足")
+                logger.info("   💡 错误信息: %s", error_msg)
+                logger.warning("   ⚠️  停止重试，请检查账户可用保证金")
                 # 🔴 返回特殊标记，让上层知道是保证金不足
                 return {'error': 'insufficient_margin', 'message': error_msg}
-            print(f"   ❌ 下限价单失败: {e}")
+            logger.error("   ❌ 下限价单失败: %s", e)
             return None
     
     def _set_stop_loss_limit(self, symbol, side, trigger_price, amount):
@@ -811,31 +1498,48 @@ class OKXTraderV2:
         Returns:
             dict: 订单信息或None
         """
-        print(f"\n   🛡️  设置止损单: ${trigger_price:.2f}")
+        return self._bracket_leg(side, 'sl', symbol, trigger_price, amount)
+    
+    def _set_take_profit_limit(self, symbol, side, trigger_price, amount):
+        """设置止盈单（优先限价，失败后降级为条件单）"""
+        return self._bracket_leg(side, 'tp', symbol, trigger_price, amount)
+    
+    def _bracket_leg(self, direction, kind, symbol, trigger_price, amount):
+        """
+        挂止损/止盈减仓单（止损止盈共用流程）
+        
+        流程：Post-Only限价单 → 立即复查状态 → 失败则降级为条件限价单
+        
+        Args:
+            direction: 持仓方向 'long' 或 'short'
+            kind: 'sl'=止损, 'tp'=止盈
+            symbol: 交易对
+            trigger_price: 触发价格（同时作为限价单价格）
+            amount: 数量
+        
+        Returns:
+            dict: 订单信息或None
+        """
+        label, icon = _LEG_LABELS[kind]
+        order_side = _CLOSE_SIDE[direction]
+        
+        logger.info("\n   %s 设置%s单: $%.2f", icon, label, trigger_price)
         
         # Step 1: 先尝试普通限价单（省手续费）
         # 🔴 直接使用 trigger_price 作为限价单价格
-        print(f"   📊 方案1: 尝试限价单 价格=${trigger_price:.2f} (Maker手续费0.02%)")
+        logger.info("   📊 方案1: 尝试限价单 价格=$%.2f (Maker手续费0.02%%)", trigger_price)
         
         try:
-            # 🔴 使用 Post-Only 限价单：如果会立即成交，OKX会拒绝订单
-            ticker = self.exchange.fetch_ticker(symbol)
-            current_price = ticker['last']
-            
-            if side == 'long':
-                # 多单止损：卖出 @ trigger_price
-                order_side = 'sell'
-                # 检查：如果当前价已经低于止损价，说明已经触发了
-                if current_price <= trigger_price:
-                    print(f"   ⚠️  止损价已触发 (当前价${current_price:.2f} <= 止损价${trigger_price:.2f})")
-                    raise Exception("价格已触发，使用条件单")
-            else:
-                # 空单止损：买入 @ trigger_price
-                order_side = 'buy'
-                # 检查：如果当前价已经高于止损价，说明已经触发了
-                if current_price >= trigger_price:
-                    print(f"   ⚠️  止损价已触发 (当前价${current_price:.2f} >= 止损价${trigger_price:.2f})")
-                    raise Exception("价格已触发，使用条件单")
+            # 🔴 止损价已被越过时，Post-Only限价单挂在盘口另一侧不会被撤（要等价格反弹才成交），必须先查当前价直接用条件单；
+            # 止盈价被越过时Post-Only单会被交易所撤销，由下面的状态复查降级为条件单，省一次行情请求
+            if kind == 'sl':
+                triggered, cmp_text = _LEG_TRIGGERED[(direction, kind)]
+                ticker = self.exchange.fetch_ticker(symbol)
+                current_price = ticker['last']
+                
+                if triggered(current_price, trigger_price):
+                    logger.warning("   ⚠️  %s价已触发 (当前价$%.2f %s %s价$%.2f)", label, current_price, cmp_text, label, trigger_price)
+                    return self._bracket_leg_fallback(direction, kind, symbol, trigger_price, amount)
             
             # 🔴 尝试 Post-Only 限价单（OKX会自动拒绝会立即成交的订单）
             params = {
@@ -844,255 +1548,204 @@ class OKXTraderV2:
             }
             
             try:
-                params['posSide'] = side
+                if self._uses_pos_side():
+                    params['posSide'] = direction
+                self._trade_bucket.take()
                 order = self.exchange.create_limit_order(symbol, order_side, amount, trigger_price, params)
             except Exception as e1:
                 error_msg = str(e1)
                 # 检查是否是 posSide 错误
-                if '51000' in error_msg or 'posSide' in error_msg:
-                    print(f"   🔄 检测到单向持仓模式")
-                    del params['posSide']
+                if 'posSide' in params and ('51000' in error_msg or 'posSide' in error_msg):
+                    logger.info("   🔄 可能是单向持仓模式")
+                    params.pop('posSide', None)
+                    self._trade_bucket.take()
                     order = self.exchange.create_limit_order(symbol, order_side, amount, trigger_price, params)
+                    self._remember_one_way_mode()  # 🔴 重试成功才记住单向持仓模式
                 # 检查是否是 Post-Only 被拒绝（订单会立即成交）
                 elif '51008' in error_msg or 'post_only' in error_msg.lower() or 'Post only' in error_msg:
-                    print(f"   ⚠️  Post-Only被拒绝（订单会立即成交）")
-                    raise Exception("会立即成交，使用条件单")
-                else:
-                    raise e1
-            
-            print(f"   ✅ 限价止损单已设置: 价格=${trigger_price:.2f}, ID={order['id']}")
-            
-            # 🔴 立即检查订单状态，如果被撤销则降级为条件单
-            try:
-                print(f"   🔍 查询新创建止损单状态: {order['id']}")
-                order_status = self.exchange.fetch_order(order['id'], symbol)
-                print(f"   📊 新止损单API返回结果: {order_status}")
-                
-                status = order_status.get('status', 'unknown')
-                print(f"   🔍 止损单状态检查: {status}")
-                
-                if status == 'closed':
-                    print(f"   ⚠️  止损单已成交！成交价: ${order_status.get('average', 'unknown')}")
-                    self.stop_loss_order_id = order['id']
-                    self.stop_loss_order_type = 'limit'
-                    order['_order_type'] = 'limit'
-                    return order
-                elif status == 'canceled':
-                    print(f"   ⚠️  Post-Only止损单被系统撤销！原因: {order_status.get('info', {}).get('cancelSourceReason', 'unknown')}")
-                    print(f"   🔄 降级为条件单...")
-                    raise Exception("Post-Only被撤销，降级为条件单")
-                else:
-                    print(f"   ✅ 止损单状态正常: {status}")
-                    self.stop_loss_order_id = order['id']
-                    self.stop_loss_order_type = 'limit'
-                    order['_order_type'] = 'limit'
-                    return order
-                    
-            except Exception as e:
-                error_msg = str(e)
-                print(f"   ❌ 检查止损单状态失败: {error_msg}")
-                
-                if "Post-Only被撤销" in str(e):
-                    # 重新抛出异常，让外层catch处理降级逻辑
-                    raise e
+                    logger.warning("   ⚠️  Post-Only被拒绝（订单会立即成交）")
+                    return self._bracket_leg_fallback(direction, kind, symbol, trigger_price, amount)
                 else:
-                    # 其他错误，继续使用这个订单
-                    print(f"   ⚠️  无法确认订单状态，继续使用: {order['id']}")
-                    self.stop_loss_order_id = order['id']
-                    self.stop_loss_order_type = 'limit'
-                    order['_order_type'] = 'limit'
-                    return order
-            
+                    raise
         except Exception as e:
-            print(f"   ❌ 限价单失败: {e}")
+            # 非预期的接口异常（网络/权限等），同样降级为条件单兜底
+            logger.error("   ❌ 限价单失败: %s", e)
+            return self._bracket_leg_fallback(direction, kind, symbol, trigger_price, amount)
+        
+        logger.info("   ✅ 限价%s单已设置: 价格=$%.2f, ID=%s", label, trigger_price, order['id'])
+        
+        # 🔴 立即检查订单状态，如果被撤销则降级为条件单
+        status = None
+        try:
+            logger.info("   🔍 查询新创建%s单状态: %s", label, order['id'])
+            order_status = self.exchange.fetch_order(order['id'], symbol)
+            logger.debug("   📊 新%s单API返回结果: %s", label, order_status)
             
-            # Step 2: 降级为条件限价单（兜底方案）
-            print(f"   📊 方案2: 使用条件限价单 (触发后Maker手续费0.02%)")
-            try:
-                conditional_order = self._set_stop_loss_conditional(symbol, side, trigger_price, amount)
-                
-                if conditional_order:
-                    self.stop_loss_order_id = conditional_order['id']
-                    self.stop_loss_order_type = 'conditional_limit'
-                    print(f"   ✅ 条件止损单已设置: ID={conditional_order['id']}, 触发价=${trigger_price:.2f}")
-                    conditional_order['_order_type'] = 'conditional_limit'
-                    
-                    # 🔴 加入监听队列（价格到达 trigger_price ± 1% 时，撤条件单改挂限价单）
-                    self.pending_stop_loss[symbol] = {
-                        'conditional_order_id': conditional_order['id'],
-                        'trigger_price': trigger_price,
-                        'amount': amount,
-                        'side': side,
-                        'order_type': 'conditional_limit'  # 记录订单类型
-                    }
-                    print(f"   🔔 已加入监听队列: 价格到达 ${trigger_price * 0.99:.2f} - ${trigger_price * 1.01:.2f} 时优化为限价单")
-                    
-                    return conditional_order
-                else:
-                    print(f"   ❌ 条件单也失败了")
-                    return None
-                    
-            except Exception as e2:
-                print(f"   ❌ 条件单失败: {e2}")
-                return None
+            status = order_status.get('status', 'unknown')
+            logger.info("   🔍 %s单状态检查: %s", label, status)
+        except Exception as e:
+            # 无法确认状态时继续使用这个订单
+            logger.error("   ❌ 检查%s单状态失败: %s", label, e)
+            logger.warning("   ⚠️  无法确认订单状态，继续使用: %s", order['id'])
+        
+        if status == 'canceled':
+            logger.warning("   ⚠️  Post-Only%s单被系统撤销！原因: %s", label, order_status.get('info', {}).get('cancelSourceReason', 'unknown'))
+            logger.info("   🔄 降级为条件单...")
+            return self._bracket_leg_fallback(direction, kind, symbol, trigger_price, amount)
+        
+        if status == 'closed':
+            logger.warning("   ⚠️  %s单已成交！成交价: $%s", label, order_status.get('average', 'unknown'))
+        elif status is not None:
+            logger.info("   ✅ %s单状态正常: %s", label, status)
+        
+        self._record_leg(kind, symbol, order, 'limit')
+        return order
+    
+    def _bracket_leg_fallback(self, direction, kind, symbol, trigger_price, amount):
+        """止损/止盈限价单无法挂出时，降级为条件限价单（止损单同时加入监听队列）
+        
+        Returns:
+            dict: 条件单信息或None
+        """
+        label, _ = _LEG_LABELS[kind]
+        
+        # Step 2: 降级为条件限价单（兜底方案）
+        logger.info("   📊 方案2: 使用条件限价单 (触发后Maker手续费0.02%)")
+        try:
+            conditional_order = self._place_conditional_leg(direction, kind, symbol, trigger_price, amount)
+        except Exception as e2:
+            logger.error("   ❌ 条件单失败: %s", e2)
+            return None
+        
+        if not conditional_order:
+            logger.error("   ❌ 条件单也失败了")
+            return None
+        
+        self._record_leg(kind, symbol, conditional_order, 'conditional_limit')
+        logger.info("   ✅ 条件%s单已设置: ID=%s, 触发价=$%.2f", label, conditional_order['id'], trigger_price)
+        
+        if kind == 'sl':
+            # 🔴 加入监听队列（价格到达 trigger_price ± 1% 时，撤条件单改挂限价单）
+            self.pending_stop_loss[symbol] = PendingStopLoss(
+                conditional_order_id=str(conditional_order['id']),
+                trigger_price=trigger_price,
+                amount=amount,
+                side=direction,
+                order_type='conditional_limit'  # 记录订单类型
+            )
+            logger.info("   🔔 已加入监听队列: 价格到达 $%.2f - $%.2f 时优化为限价单", trigger_price * 0.99, trigger_price * 1.01)
+        
+        return conditional_order
+    
+    def _record_leg(self, kind, symbol, order, order_type):
+        """按交易对记录当前止损/止盈单ID及类型"""
+        with self._pending_lock:
+            if kind == 'sl':
+                self.stop_loss_orders[symbol] = (str(order['id']), order_type)  # 🔴 ID统一存为字符串，查询时直接按键比较
+            else:
+                self.take_profit_orders[symbol] = str(order['id'])
+            self._save_pending_state()
+        self._ensure_order_watcher()  # 止损/止盈单成交/撤销由推送实时清理记录
+        order['_order_type'] = order_type
     
     def _set_stop_loss_conditional(self, symbol, side, trigger_price, amount):
-        """设置条件止损单（兜底方案）
+        """兼容性方法：设置条件止损单（兜底方案）"""
+        return self._place_conditional_leg(side, 'sl', symbol, trigger_price, amount)
+    
+    def _place_conditional_leg(self, direction, kind, symbol, trigger_price, amount):
+        """设置条件止损/止盈单（兜底方案）
         
         Args:
+            direction: 持仓方向 'long' 或 'short'
+            kind: 'sl'=止损, 'tp'=止盈
             symbol: 交易对
-            side: 'long' 或 'short'
             trigger_price: 触发价格
             amount: 数量
         
         Returns:
             dict: 订单信息或None
         """
+        label, _ = _LEG_LABELS[kind]
+        
         if self.test_mode:
-            print(f"   🧪 【测试模式】模拟条件止损单")
-            return {'id': 'TEST_CONDITIONAL_SL', 'status': 'simulated'}
+            logger.info("   🧪 【测试模式】模拟条件%s单", label)
+            return {'id': f'TEST_CONDITIONAL_{kind.upper()}', 'status': 'simulated'}
         
         try:
             # 🔴 使用条件限价单（触发后以限价单成交，省手续费）
             # 委托价直接用 trigger_price（触发后挂该价格的限价单）
-            if side == 'long':
-                # 多单止损：触发后卖出 @ trigger_price
-                order_side = 'sell'
-            else:
-                # 空单止损：触发后买入 @ trigger_price
-                order_side = 'buy'
+            order_side = _CLOSE_SIDE[direction]
             
             params = {
-                'slTriggerPx': str(trigger_price),  # 止损触发价
-                'slOrdPx': str(trigger_price),      # 🔴 止损委托价（就用trigger_price）
+                f'{kind}TriggerPx': str(trigger_price),  # 止损/止盈触发价
+                f'{kind}OrdPx': str(trigger_price),      # 🔴 委托价（就用trigger_price）
                 'reduceOnly': True
             }
             
-            # 🔴 动态处理posSide参数
+            # 🔴 posSide按缓存的持仓模式添加，被拒时降级重试
             try:
-                params['posSide'] = side
+                if self._uses_pos_side():
+                    params['posSide'] = direction
+                self._trade_bucket.take()
                 order = self.exchange.create_order(
                     symbol, 'limit', order_side, amount, trigger_price, params
                 )
-                print(f"   ✅ 条件止损限价单已设置: 触发价=${trigger_price:.2f}, 委托价=${trigger_price:.2f}, ID={order['id']}")
-                return order
-                
             except Exception as e1:
                 error_msg = str(e1)
                 # 如果是posSide错误，重试不带posSide
-                if '51000' in error_msg or 'posSide' in error_msg:
-                    print(f"   🔄 检测到单向持仓模式，重试不带posSide...")
-                    del params['posSide']
+                if 'posSide' in params and ('51000' in error_msg or 'posSide' in error_msg):
+                    logger.info("   🔄 可能是单向持仓模式，重试不带posSide...")
+                    params.pop('posSide', None)
+                    self._trade_bucket.take()
                     order = self.exchange.create_order(
                         symbol, 'limit', order_side, amount, trigger_price, params
                     )
-                    print(f"   ✅ 条件止损限价单已设置: 触发价=${trigger_price:.2f}, 委托价=${trigger_price:.2f}, ID={order['id']}")
-                    return order
+                    self._remember_one_way_mode()  # 🔴 重试成功才记住单向持仓模式
                 else:
                     raise e1
             
+            self._algo_pending_cache = None  # 条件单列表已变化
+            logger.info("   ✅ 条件%s限价单已设置: 触发价=$%.2f, 委托价=$%.2f, ID=%s", label, trigger_price, trigger_price, order['id'])
+            return order
+        
         except Exception as e:
-            print(f"   ❌ 条件止损单失败: {e}")
+            logger.error("   ❌ 条件%s单失败: %s", label, e)
             return None
     
-    def _set_take_profit_limit(self, symbol, side, trigger_price, amount):
-        """设置止盈单（优先限价，失败后降级为条件单）"""
-        print(f"\n   💰 设置止盈单: ${trigger_price:.2f}")
-        
-        # Step 1: 先尝试普通限价单（省手续费）
-        # 🔴 直接使用 trigger_price 作为限价单价格
-        print(f"   📊 方案1: 尝试限价单 价格=${trigger_price:.2f} (Maker手续费0.02%)")
+    def _debug_log_margin(self, amount, limit_price, contract_size, coin_amount):
+        """打印账户余额与所需保证金对比（仅调试模式调用，会额外请求一次余额接口）
         
+        Args:
+            amount: 合约张数
+            limit_price: 挂单价格
+            contract_size: 合约规格
+            coin_amount: 下单用的币数量（与实际提交的sz一致）
+        """
         try:
-            # 🔴 获取订单簿，检查限价单是否会立即成交
-            ticker = self.exchange.fetch_ticker(symbol)
-            current_price = ticker['last']
-            
-            if side == 'long':
-                # 多单止盈：卖出 @ trigger_price
-                order_side = 'sell'
-                # 检查：如果当前价已经高于止盈价，说明已经触发了
-                if current_price >= trigger_price:
-                    print(f"   ⚠️  止盈价已触发 (当前价${current_price:.2f} >= 止盈价${trigger_price:.2f})")
-                    raise Exception("价格已触发，使用条件单")
-            else:
-                # 空单止盈：买入 @ trigger_price
-                order_side = 'buy'
-                # 检查：如果当前价已经低于止盈价，说明已经触发了
-                if current_price <= trigger_price:
-                    print(f"   ⚠️  止盈价已触发 (当前价${current_price:.2f} <= 止盈价${trigger_price:.2f})")
-                    raise Exception("价格已触发，使用条件单")
-            
-            # 🔴 尝试 Post-Only 限价单（OKX会自动拒绝会立即成交的订单）
-            params = {
-                'reduceOnly': True,
-                'postOnly': True  # 🔴 只做Maker，如果会立即成交则拒绝
-            }
-            
-            try:
-                params['posSide'] = side
-                order = self.exchange.create_limit_order(symbol, order_side, amount, trigger_price, params)
-            except Exception as e1:
-                error_msg = str(e1)
-                # 检查是否是 posSide 错误
-                if '51000' in error_msg or 'posSide' in error_msg:
-                    print(f"   🔄 检测到单向持仓模式")
-                    del params['posSide']
-                    order = self.exchange.create_limit_order(symbol, order_side, amount, trigger_price, params)
-                # 检查是否是 Post-Only 被拒绝（订单会立即成交）
-                elif '51008' in error_msg or 'post_only' in error_msg.lower() or 'Post only' in error_msg:
-                    print(f"   ⚠️  Post-Only被拒绝（订单会立即成交）")
-                    raise Exception("会立即成交，使用条件单")
+            balance_info = self.get_balance()
+            if balance_info:
+                logger.debug("      💰 账户余额: 总余额=$%.2f, 可用=$%.2f, 已用=$%.2f", balance_info.get('total', 0), balance_info.get('free', 0), balance_info.get('used', 0))
+            
+            # 🔴 计算需要的保证金（注意：amount 已经是计算好的合约张数）
+            leverage = self.leverage  # __init__ / set_leverage 中维护
+            
+            # 🔴 按实际提交的币数量计算持仓价值
+            position_value = coin_amount * limit_price  # 实际持仓价值（币数量 × 挂单价）
+            required_margin = position_value / leverage  # 所需保证金（持仓价值 ÷ 杠杆）
+            
+            logger.debug("      💰 合约张数: %s 张", amount)
+            logger.debug("      💰 合约规格: %s SOL/张", contract_size)
+            logger.debug("      💰 实际币数量: %.4f SOL (数量%s × 规格%s)", coin_amount, amount, contract_size)
+            logger.debug("      💰 持仓价值: $%.2f (币数量%.4f × 挂单价$%.2f)", position_value, coin_amount, limit_price)
+            logger.debug("      💰 所需保证金: $%.2f (持仓价值$%.2f ÷ %s倍杠杆)", required_margin, position_value, leverage)
+            if balance_info:
+                free_balance = balance_info.get('free', 0)
+                if free_balance < required_margin:
+                    logger.debug("      ⚠️  可用余额不足: 需要$%.2f, 可用$%.2f, 差额=$%.2f", required_margin, free_balance, required_margin - free_balance)
                 else:
-                    raise e1
-            
-            print(f"   ✅ 限价止盈单已设置: 价格=${trigger_price:.2f}, ID={order['id']}")
-            self.take_profit_order_id = order['id']
-            order['_order_type'] = 'limit'
-            return order
-            
+                    logger.debug("      ✅ 可用余额充足: 需要$%.2f, 可用$%.2f, 剩余=$%.2f", required_margin, free_balance, free_balance - required_margin)
         except Exception as e:
-            print(f"   ❌ 限价单失败: {e}")
-            
-            # Step 2: 降级为条件限价单（兜底方案）
-            print(f"   📊 方案2: 使用条件限价单 (触发后Maker手续费0.02%)")
-            try:
-                # 🔴 条件单的委托价也用 trigger_price（触发后以该价格限价成交）
-                if side == 'long':
-                    order_side = 'sell'
-                else:
-                    order_side = 'buy'
-                
-                params = {
-                    'tpTriggerPx': str(trigger_price),  # 止盈触发价
-                    'tpOrdPx': str(trigger_price),      # 🔴 止盈委托价（就用trigger_price）
-                    'reduceOnly': True
-                }
-                
-                # 动态处理posSide参数
-                try:
-                    params['posSide'] = side
-                    order = self.exchange.create_order(
-                        symbol, 'limit', order_side, amount, trigger_price, params
-                    )
-                except Exception as e1:
-                    if '51000' in str(e1) or 'posSide' in str(e1):
-                        print(f"   🔄 检测到单向持仓模式")
-                        del params['posSide']
-                        order = self.exchange.create_order(
-                            symbol, 'limit', order_side, amount, trigger_price, params
-                        )
-                    else:
-                        raise e1
-                
-                print(f"   ✅ 条件止盈单已设置: 触发价=${trigger_price:.2f}, 委托价=${trigger_price:.2f}, ID={order['id']}")
-                self.take_profit_order_id = order['id']
-                order['_order_type'] = 'conditional_limit'
-                return order
-                
-            except Exception as e2:
-                print(f"   ❌ 条件单失败: {e2}")
-                return None
+            logger.debug("      ⚠️  获取账户信息失败: %s", e)
     
     # 保留原有方法以兼容现有代码
     def get_latest_klines(self, symbol, timeframe='1m', limit=100):
@@ -1101,20 +1754,30 @@ class OKXTraderV2:
             klines = self.exchange.fetch_ohlcv(symbol, timeframe, limit=limit)
             return klines
         except Exception as e:
-            print(f"❌ 获取K线数据失败 ({symbol}): {e}")
+            logger.error("❌ 获取K线数据失败 (%s): %s", symbol, e)
             return []
     
     def get_balance(self):
-        """获取账户余额"""
+        """获取账户余额
+        
+        🔴 订单推送在线且 BALANCE_PUSH_MAX_AGE 秒内收到过余额推送时直接读推送缓存，否则请求REST
+        （首次查询后启动私有频道推送，之后的查询不再占用REST请求）
+        """
+        cached = self._balance_cache
+        watcher = self.order_watcher
+        if cached is not None and watcher is not None and watcher.logged_in and time.monotonic() - cached[0] < BALANCE_PUSH_MAX_AGE:
+            return dict(cached[1])
+        
         try:
             balance = self.exchange.fetch_balance()
+            self._ensure_order_watcher()
             return {
                 'total': balance['total'].get('USDT', 0),
                 'free': balance['free'].get('USDT', 0),
                 'used': balance['used'].get('USDT', 0),
             }
         except Exception as e:
-            print(f"❌ 获取账户余额失败: {e}")
+            logger.error("❌ 获取账户余额失败: %s", e)
             return None
     
     def get_account_info(self):
@@ -1128,7 +1791,7 @@ class OKXTraderV2:
                 'test_mode': self.test_mode
             }
         except Exception as e:
-            print(f"❌ 获取账户信息失败: {e}")
+            logger.error("❌ 获取账户信息失败: %s", e)
             return None
     
     def open_long_with_stop_orders(self, symbol, amount, stop_loss_price, take_profit_price):
@@ -1158,6 +1821,45 @@ class OKXTraderV2:
         Returns:
             dict: 订单信息
         """
+        return self._open_with_limit_price('long', symbol, amount, limit_price, stop_loss_price, take_profit_price)
+    
+    def open_short_with_limit_price(self, symbol, amount, limit_price, stop_loss_price=None, take_profit_price=None):
+        """
+        在指定价格（支撑位/阻力位）挂限价单开空单
+        
+        策略：
+        1. 先尝试在指定价格挂限价单（不等待，立即尝试）
+        2. 如果限价单无法挂单，立即降级为条件单
+        3. 条件单加入监听队列，价格接近时自动优化为限价单
+        
+        Args:
+            symbol: 交易对符号
+            amount: 数量
+            limit_price: 限价单价格（支撑位/阻力位价格）
+            stop_loss_price: 止损价格
+            take_profit_price: 止盈价格
+        
+        Returns:
+            dict: 订单信息
+        """
+        return self._open_with_limit_price('short', symbol, amount, limit_price, stop_loss_price, take_profit_price)
+    
+    def _open_with_limit_price(self, direction, symbol, amount, limit_price, stop_loss_price=None, take_profit_price=None):
+        """
+        在指定价格挂限价单开仓（多空共用流程）
+        
+        Args:
+            direction: 'long' 或 'short'
+            其余参数同 open_long_with_limit_price
+        
+        Returns:
+            dict: 订单信息
+        """
+        is_long = direction == 'long'
+        name = '多' if is_long else '空'
+        order_side = 'buy' if is_long else 'sell'
+        level_name = '支撑位' if is_long else '阻力位'
+        
         result = {
             'entry_order': None,
             'stop_loss_order': None,
@@ -1165,175 +1867,158 @@ class OKXTraderV2:
         }
         
         if self.test_mode:
-            print(f"🧪 【测试模式】模拟在限价 ${limit_price:.2f} 开多单: {symbol}, 数量: {amount}")
+            logger.info("🧪 【测试模式】模拟在限价 $%.2f 开%s单: %s, 数量: %s", limit_price, name, symbol, amount)
             result['entry_order'] = {'id': 'TEST_ENTRY_LIMIT', 'status': 'simulated'}
             return result
         
-        print(f"\n{'='*60}")
-        print(f"📌 在指定价格挂限价单开多单: {symbol}")
-        print(f"   限价: ${limit_price:.2f}")
-        print(f"{'='*60}")
+        logger.info(SEP_OPEN)
+        logger.info("📌 在指定价格挂限价单开%s单: %s", name, symbol)
+        logger.info("   限价: $%.2f", limit_price)
+        logger.info(SEP)
         
-        # 🔴 先检查当前价格与支撑位的关系
+        # 🔴 先检查当前价格与支撑位/阻力位的关系（查最新价并写入缓存，下面挂限价单时复用）
         try:
-            ticker = self.exchange.fetch_ticker(symbol)
+            ticker = self._get_ticker(symbol, max_age=0)
             current_price = ticker['last']
             
-            print(f"   📊 当前价格: ${current_price:.2f}, 支撑位: ${limit_price:.2f}")
+            logger.info("   📊 当前价格: $%.2f, %s: $%.2f", current_price, level_name, limit_price)
             
-            # 🔴 做多：如果当前价格 <= 支撑位，说明价格已经回调到位，可以立即开仓
-            if current_price <= limit_price:
-                print(f"   ✅ 当前价格${current_price:.2f}已经低于/等于支撑位${limit_price:.2f}")
-                print(f"   💡 价格已回调到位，立即开仓（使用买3/买4/买5价格）")
-                # 使用立即开仓模式（买3/买4/买5价格）
-                entry_order_result = self.open_long_with_limit_order(
-                    symbol, amount, stop_loss_price, take_profit_price
-                )
+            # 🔴 做多：当前价格 <= 支撑位说明已回调到位；做空：当前价格 >= 阻力位说明已反弹到位
+            reached = current_price <= limit_price if is_long else current_price >= limit_price
+            if reached:
+                if is_long:
+                    logger.info("   ✅ 当前价格$%.2f已经低于/等于支撑位$%.2f", current_price, limit_price)
+                    logger.info("   💡 价格已回调到位，立即开仓（使用买3/买4/买5价格）")
+                    entry_order_result = self.open_long_with_limit_order(
+                        symbol, amount, stop_loss_price, take_profit_price
+                    )
+                else:
+                    logger.info("   ✅ 当前价格$%.2f已经高于/等于阻力位$%.2f", current_price, limit_price)
+                    logger.info("   💡 价格已反弹到位，立即开仓（使用卖3/卖4/卖5价格）")
+                    entry_order_result = self.open_short_with_limit_order(
+                        symbol, amount, stop_loss_price, take_profit_price
+                    )
                 if entry_order_result.get('entry_order'):
-                    print(f"{'='*60}\n")
+                    logger.info(SEP_CLOSE)
                     return entry_order_result
                 else:
-                    print(f"   ⚠️  立即开仓失败，降级为条件单")
+                    logger.warning("   ⚠️  立即开仓失败，降级为条件单")
                     # 继续执行条件单逻辑
-            else:
+            elif is_long:
                 # 当前价格 > 支撑位，需要挂限价单等待价格回调
-                print(f"   📊 当前价格${current_price:.2f}高于支撑位${limit_price:.2f}")
-                print(f"   💡 需要挂限价单等待价格回调到支撑位")
+                logger.info("   📊 当前价格$%.2f高于支撑位$%.2f", current_price, limit_price)
+                logger.info("   💡 需要挂限价单等待价格回调到支撑位")
+            else:
+                # 当前价格 < 阻力位，需要挂限价单等待价格反弹
+                logger.info("   📊 当前价格$%.2f低于阻力位$%.2f", current_price, limit_price)
+                logger.info("   💡 需要挂限价单等待价格反弹到阻力位")
         except Exception as e:
-            print(f"   ⚠️  获取当前价格失败: {e}")
-            print(f"   💡 尝试挂限价单...")
+            logger.warning("   ⚠️  获取当前价格失败: %s", e)
+            logger.info("   💡 尝试挂限价单...")
         
-        # Step 1: 当前价格高于支撑位，尝试在支撑位挂限价单（等待价格回调）
-        print(f"   📊 方案1: 尝试限价单 价格=${limit_price:.2f} (Maker手续费0.02%)")
+        # Step 1: 尝试在支撑位/阻力位挂限价单（等待价格回调/反弹）
+        logger.info("   📊 方案1: 尝试限价单 价格=$%.2f (Maker手续费0.02%%)", limit_price)
         
         # 🔴 尝试立即挂限价单（不等待成交，只检查是否能挂单）
         entry_order = self._try_place_limit_order_immediately(
-            symbol, 'buy', amount, limit_price
+            symbol, order_side, amount, limit_price
         )
         
         if entry_order:
-            print(f"\n✅ 限价单已挂: 订单ID={entry_order['id']}")
+            logger.info("\n✅ 限价单已挂: 订单ID=%s", entry_order['id'])
             result['entry_order'] = entry_order
             
             # 🔴 不立即挂止损止盈单，等待开仓成交后再挂
             # 止损止盈价格会在开仓成交后通过定时检查机制挂单
-            print(f"   💡 止损止盈单将在开仓成交后自动挂单")
-            print(f"   📝 止损价格: ${stop_loss_price:.2f}" if stop_loss_price else "   📝 止损价格: 未设置")
-            print(f"   📝 止盈价格: ${take_profit_price:.2f}" if take_profit_price else "   📝 止盈价格: 未设置")
+            logger.info("   💡 止损止盈单将在开仓成交后自动挂单")
+            for label, price in (('止损', stop_loss_price), ('止盈', take_profit_price)):
+                if price:
+                    logger.info("   📝 %s价格: $%.2f", label, price)
+                else:
+                    logger.info("   📝 %s价格: 未设置", label)
             
-            print(f"{'='*60}\n")
+            logger.info(SEP_CLOSE)
             return result
         
         # Step 2: 限价单无法挂单，立即降级为条件单
-        print(f"\n   ⚠️  限价单无法挂单，立即降级为条件单")
-        print(f"   📊 方案2: 使用条件单 (触发后Maker手续费0.02%)")
+        logger.warning("\n   ⚠️  限价单无法挂单，立即降级为条件单")
+        logger.info("   📊 方案2: 使用条件单 (触发后Maker手续费0.02%)")
         
         try:
-            # 获取当前价格，计算触发价
-            ticker = self.exchange.fetch_ticker(symbol)
-            current_price = ticker['last']
-            
-            # 做多：当价格下跌到支撑位时触发
-            # 触发价应该略高于限价（例如：限价158.64，触发价158.65）
-            # 这样价格跌到158.65时触发，然后挂158.64的买单
+            # 做多：价格下跌到支撑位时触发，触发价略高于限价（例如：限价158.64，触发价158.65）
+            # 做空：价格上涨到阻力位时触发，触发价略低于限价（例如：限价158.64，触发价158.63）
             trigger_buffer = max(limit_price * 0.0005, 0.1)  # 0.05%或最小0.1
-            actual_trigger_price = limit_price + trigger_buffer
-            
-            print(f"   📊 多单条件单策略:")
-            print(f"      触发价: ${actual_trigger_price:.2f} (略高于限价${limit_price:.2f})")
-            print(f"      挂单价: ${limit_price:.2f}")
-            print(f"   💡 执行逻辑: 价格跌至${actual_trigger_price:.2f}时触发 → 挂${limit_price:.2f}的买单")
+            if is_long:
+                actual_trigger_price = limit_price + trigger_buffer
+                logger.info("   📊 多单条件单策略:")
+                logger.info("      触发价: $%.2f (略高于限价$%.2f)", actual_trigger_price, limit_price)
+                logger.info("      挂单价: $%.2f", limit_price)
+                logger.info("   💡 执行逻辑: 价格跌至$%.2f时触发 → 挂$%.2f的买单", actual_trigger_price, limit_price)
+            else:
+                actual_trigger_price = limit_price - trigger_buffer
+                logger.info("   📊 空单条件单策略:")
+                logger.info("      触发价: $%.2f (略低于限价$%.2f)", actual_trigger_price, limit_price)
+                logger.info("      挂单价: $%.2f", limit_price)
+                logger.info("   💡 执行逻辑: 价格涨至$%.2f时触发 → 挂$%.2f的卖单", actual_trigger_price, limit_price)
             
             # 🔴 将合约张数转换为币数量（OKX API 需要币数量）
-            contract_size, _ = self.get_contract_size(symbol)
-            coin_amount = float(amount) * contract_size  # 币数量 = 合约张数 × 合约规格
-            coin_amount = round(coin_amount, 2)  # 保留两位小数
+            contract_size, coin_amount = self._to_coin_amount(symbol, amount)
             
             # 🔴 使用OKX的algo_order API创建开仓条件单（计划委托）
             # 注意：这不是止损止盈条件单，而是开仓条件单
             algo_params = {
                 'instId': symbol,
                 'tdMode': 'cross',
-                'side': 'buy',
+                'side': order_side,
                 'ordType': 'conditional',  # 条件单类型
                 'sz': str(coin_amount),  # 🔴 币数量（不是合约张数）
                 'triggerPx': str(actual_trigger_price),  # 触发价
-                'orderPx': str(limit_price),  # 委托价（支撑位价格）
+                'orderPx': str(limit_price),  # 委托价（支撑位/阻力位价格）
             }
             
-            # 🔴 打印条件单参数详情
-            print(f"\n   📋 【条件单参数详情】")
-            print(f"      Symbol: {symbol}")
-            print(f"      Side: buy")
-            print(f"      合约张数: {amount} 张")
-            print(f"      合约规格: {contract_size} SOL/张")
-            print(f"      币数量: {coin_amount} SOL (合约张数{amount} × 规格{contract_size})")
-            print(f"      触发价: ${actual_trigger_price:.2f}")
-            print(f"      挂单价: ${limit_price:.2f}")
-            print(f"      Params: {algo_params}")
-            
-            # 获取账户余额信息
-            try:
-                balance_info = self.get_balance()
-                if balance_info:
-                    print(f"      💰 账户余额: 总余额=${balance_info.get('total', 0):.2f}, 可用=${balance_info.get('free', 0):.2f}, 已用=${balance_info.get('used', 0):.2f}")
-                
-                # 🔴 计算需要的保证金（注意：amount 已经是计算好的合约张数）
-                leverage = getattr(self, 'leverage', TRADING_CONFIG.get('leverage', 1))
-                
-                # 获取合约规格，计算实际持仓价值
-                contract_size, _ = self.get_contract_size(symbol)
-                coin_amount = float(amount) * contract_size  # 实际币数量
-                position_value = coin_amount * limit_price  # 实际持仓价值（币数量 × 挂单价）
-                required_margin = position_value / leverage  # 所需保证金（持仓价值 ÷ 杠杆）
-                
-                print(f"      💰 合约张数: {amount} 张")
-                print(f"      💰 合约规格: {contract_size} SOL/张")
-                print(f"      💰 实际币数量: {coin_amount:.4f} SOL (数量{amount} × 规格{contract_size})")
-                print(f"      💰 持仓价值: ${position_value:.2f} (币数量{coin_amount:.4f} × 挂单价${limit_price:.2f})")
-                print(f"      💰 所需保证金: ${required_margin:.2f} (持仓价值${position_value:.2f} ÷ {leverage}倍杠杆)")
-                if balance_info:
-                    free_balance = balance_info.get('free', 0)
-                    if free_balance < required_margin:
-                        print(f"      ⚠️  可用余额不足: 需要${required_margin:.2f}, 可用${free_balance:.2f}, 差额=${required_margin - free_balance:.2f}")
-                    else:
-                        print(f"      ✅ 可用余额充足: 需要${required_margin:.2f}, 可用${free_balance:.2f}, 剩余=${free_balance - required_margin:.2f}")
-            except Exception as e:
-                print(f"      ⚠️  获取账户信息失败: {e}")
-            
-            print(f"   {'-'*60}\n")
-            
-            # 动态处理posSide参数
+            # 🔴 条件单参数详情和余额/保证金诊断（额外调用一次余额接口）只在调试模式下输出
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("\n   📋 【条件单参数详情】")
+                logger.debug("      Symbol: %s", symbol)
+                logger.debug("      Side: %s", order_side)
+                logger.debug("      合约张数: %s 张", amount)
+                logger.debug("      合约规格: %s SOL/张", contract_size)
+                logger.debug("      币数量: %s SOL (合约张数%s × 规格%s)", coin_amount, amount, contract_size)
+                logger.debug("      触发价: $%.2f", actual_trigger_price)
+                logger.debug("      挂单价: $%.2f", limit_price)
+                logger.debug("      Params: %s", algo_params)
+                self._debug_log_margin(amount, limit_price, contract_size, coin_amount)
+                logger.debug(SUB_INNER_CLOSE)
+            
+            # 🔴 posSide按缓存的持仓模式添加，被拒时降级重试
             try:
-                algo_params['posSide'] = 'long'
+                if self._uses_pos_side():
+                    algo_params['posSide'] = direction
+                self._trade_bucket.take()
                 response = self.exchange.private_post_trade_order_algo(algo_params)
             except Exception as e1:
                 error_msg = str(e1)
-                if '51000' in error_msg or 'posSide' in error_msg:
-                    print(f"   🔄 检测到单向持仓模式，重试不带posSide...")
-                    if 'posSide' in algo_params:
-                        del algo_params['posSide']
+                if 'posSide' in algo_params and ('51000' in error_msg or 'posSide' in error_msg):
+                    logger.info("   🔄 可能是单向持仓模式，重试不带posSide...")
+                    algo_params.pop('posSide', None)
+                    self._trade_bucket.take()
                     response = self.exchange.private_post_trade_order_algo(algo_params)
+                    if response.get('code') == '0':
+                        self._remember_one_way_mode()  # 🔴 重试成功才记住单向持仓模式
                 else:
                     raise e1
             
+            self._algo_pending_cache = None  # 条件单列表已变化
+            
             # 检查响应
             if response.get('code') == '0' and response.get('data'):
                 order_data = response['data'][0]
-                conditional_order_id = order_data.get('algoId') or order_data.get('ordId')
-                order = {
-                    'id': conditional_order_id,
-                    'status': 'open',
-                    'type': 'conditional',
-                    'trigger_price': actual_trigger_price,
-                    'limit_price': limit_price
-                }
+                conditional_order_id = str(order_data.get('algoId') or order_data.get('ordId'))
             else:
                 error_msg = response.get('msg', 'Unknown error')
                 raise Exception(f"创建条件单失败: {error_msg}")
             
-            conditional_order_id = order['id']
-            print(f"   ✅ 条件单已设置: 触发价=${actual_trigger_price:.2f}, 挂单价=${limit_price:.2f}, ID={conditional_order_id}")
+            logger.info("   ✅ 条件单已设置: 触发价=$%.2f, 挂单价=$%.2f, ID=%s", actual_trigger_price, limit_price, conditional_order_id)
             
             result['entry_order'] = {
                 'id': conditional_order_id,
@@ -1344,330 +2029,251 @@ class OKXTraderV2:
             }
             
             # 🔴 加入监听队列，价格接近时自动优化为限价单
-            self.pending_entry_orders[symbol] = {
-                'conditional_order_id': conditional_order_id,
-                'limit_price': limit_price,
-                'amount': amount,
-                'direction': 'long',
-                'stop_loss_price': stop_loss_price,
-                'take_profit_price': take_profit_price,
-                'order_type': 'conditional'
-            }
-            print(f"   🔔 已加入监听队列: 价格到达 ${limit_price * 0.997:.2f} - ${limit_price * 1.003:.2f} 时优化为限价单")
+            self.pending_entry_orders[symbol] = PendingEntry(
+                conditional_order_id=conditional_order_id,
+                limit_price=limit_price,
+                amount=amount,
+                direction=direction,
+                stop_loss_price=stop_loss_price,
+                take_profit_price=take_profit_price,
+                order_type='conditional'
+            )
+            logger.info("   🔔 已加入监听队列: 价格到达 $%.2f - $%.2f 时优化为限价单", limit_price * 0.997, limit_price * 1.003)
+            self._ensure_order_watcher()  # 成交推送到达后立即挂止损止盈（轮询作为兜底）
             
             # 🔴 注意：条件单挂单时，止损止盈暂不设置（需要等订单成交后）
             # 止损止盈价格已保存在 pending_entry_orders 中，订单成交后会自动设置
-            print(f"   ⏳ 止损止盈将在开仓订单成交后自动设置")
+            logger.info("   ⏳ 止损止盈将在开仓订单成交后自动设置")
             
-            print(f"{'='*60}\n")
+            logger.info(SEP_CLOSE)
             return result
-            
+        
         except Exception as e:
-            print(f"   ❌ 条件单失败: {e}")
-            print(f"{'='*60}\n")
+            logger.error("   ❌ 条件单失败: %s", e)
+            logger.info(SEP_CLOSE)
             return result
     
-    def open_short_with_limit_price(self, symbol, amount, limit_price, stop_loss_price=None, take_profit_price=None):
+    def update_stop_loss(self, symbol, position_side, new_stop_loss, amount):
+        """兼容性方法：更新止损单（混合方案）
+        
+        V2版本逻辑：
+        0. 已有本交易对的止损单时先原地改单（一次请求，成功则直接返回）
+        1. 改单失败：取消所有当前的止损单（限价单/条件单）
+        2. 尝试挂新的限价单
+        3. 如果失败，挂条件单兜底，并加入监听队列
+        4. 每分钟检查队列，价格接近时优化为限价单
         """
-        在指定价格（支撑位/阻力位）挂限价单开空单
+        logger.info("\n🔄 V2更新止损单: %s %s $%.2f", symbol, position_side, new_stop_loss)
         
-        策略：
-        1. 先尝试在指定价格挂限价单（不等待，立即尝试）
-        2. 如果限价单无法挂单，立即降级为条件单
-        3. 条件单加入监听队列，价格接近时自动优化为限价单
+        # Step 0: 🔴 原地改单：比撤单+重挂少一次请求，且旧止损单一直有效，没有撤单后到新单挂出前的无保护窗口
+        result = self._amend_stop_loss(symbol, position_side, new_stop_loss, amount)
+        if result:
+            return result
         
-        Args:
-            symbol: 交易对符号
-            amount: 数量
-            limit_price: 限价单价格（支撑位/阻力位价格）
-            stop_loss_price: 止损价格
-            take_profit_price: 止盈价格
+        # Step 1: 取消所有当前的止损单
+        logger.info("   🗑️  取消旧止损单...")
+        self._cancel_stop_loss_orders(symbol)
+        
+        # Step 2: 尝试挂新的限价单
+        side = position_side  # 'long' or 'short'
+        result = self._set_stop_loss_limit(symbol, side, new_stop_loss, amount)
+        
+        # 如果成功挂上限价单，从监听队列移除
+        pending = self.pending_stop_loss.get(symbol)
+        if result and pending is not None:
+            # 检查是否是真正的限价单（不是条件单）
+            if result.get('id') != pending.conditional_order_id:
+                logger.info("   ✅ 限价单挂单成功，从监听队列移除")
+                self._remove_pending(self.pending_stop_loss, [(symbol, pending)])
+        
+        return result
+    
+    def _amend_stop_loss(self, symbol, direction, new_stop_loss, amount):
+        """原地修改本交易对当前止损单的价格和数量（条件单用 amend-algos，限价单用 amend-order）
         
         Returns:
-            dict: 订单信息
+            dict: 修改后的订单信息；没有记录的止损单、新止损价已越过（限价单）或改单失败时返回 None，由调用方撤单重挂
         """
-        result = {
-            'entry_order': None,
-            'stop_loss_order': None,
-            'take_profit_order': None
-        }
-        
         if self.test_mode:
-            print(f"🧪 【测试模式】模拟在限价 ${limit_price:.2f} 开空单: {symbol}, 数量: {amount}")
-            result['entry_order'] = {'id': 'TEST_ENTRY_LIMIT', 'status': 'simulated'}
-            return result
+            return None
         
-        print(f"\n{'='*60}")
-        print(f"📌 在指定价格挂限价单开空单: {symbol}")
-        print(f"   限价: ${limit_price:.2f}")
-        print(f"{'='*60}")
+        current = self.stop_loss_orders.get(symbol)
+        if current is None:
+            return None
+        order_id, order_type = current
         
-        # 🔴 先检查当前价格与阻力位的关系
         try:
-            ticker = self.exchange.fetch_ticker(symbol)
-            current_price = ticker['last']
-            
-            print(f"   📊 当前价格: ${current_price:.2f}, 阻力位: ${limit_price:.2f}")
-            
-            # 🔴 做空：如果当前价格 >= 阻力位，说明价格已经反弹到位，可以立即开仓
-            if current_price >= limit_price:
-                print(f"   ✅ 当前价格${current_price:.2f}已经高于/等于阻力位${limit_price:.2f}")
-                print(f"   💡 价格已反弹到位，立即开仓（使用卖3/卖4/卖5价格）")
-                # 使用立即开仓模式（卖3/卖4/卖5价格）
-                entry_order_result = self.open_short_with_limit_order(
-                    symbol, amount, stop_loss_price, take_profit_price
-                )
-                if entry_order_result.get('entry_order'):
-                    print(f"{'='*60}\n")
-                    return entry_order_result
-                else:
-                    print(f"   ⚠️  立即开仓失败，降级为条件单")
-                    # 继续执行条件单逻辑
+            if order_type == 'conditional_limit':
+                self._trade_bucket.take()
+                response = self.exchange.private_post_trade_amend_algos({
+                    'instId': symbol,
+                    'algoId': order_id,
+                    'newSz': str(amount),
+                    'newSlTriggerPx': str(new_stop_loss),
+                    'newSlOrdPx': str(new_stop_loss),  # 委托价与触发价相同，与 _place_conditional_leg 一致
+                })
             else:
-                # 当前价格 < 阻力位，需要挂限价单等待价格反弹
-                print(f"   📊 当前价格${current_price:.2f}低于阻力位${limit_price:.2f}")
-                print(f"   💡 需要挂限价单等待价格反弹到阻力位")
+                # 🔴 限价止损单：新止损价已被越过时限价单不会成交，需要改挂条件单，交给撤单重挂流程
+                triggered, _ = _LEG_TRIGGERED[(direction, 'sl')]
+                if triggered(self._get_ticker(symbol, max_age=0)['last'], new_stop_loss):
+                    return None
+                self._trade_bucket.take()
+                response = self.exchange.private_post_trade_amend_order({
+                    'instId': symbol,
+                    'ordId': order_id,
+                    'newSz': str(amount),
+                    'newPx': str(new_stop_loss),
+                })
         except Exception as e:
-            print(f"   ⚠️  获取当前价格失败: {e}")
-            print(f"   💡 尝试挂限价单...")
+            logger.warning("   ⚠️  原地改单失败，改为撤单重挂: %s", e)
+            return None
         
-        # Step 1: 当前价格低于阻力位，尝试在阻力位挂限价单（等待价格反弹）
-        print(f"   📊 方案1: 尝试限价单 价格=${limit_price:.2f} (Maker手续费0.02%)")
+        item = (response.get('data') or [{}])[0]
+        if response.get('code') != '0' or item.get('sCode') != '0':
+            logger.warning("   ⚠️  原地改单失败，改为撤单重挂: %s", item.get('sMsg') or response.get('msg'))
+            return None
         
-        # 🔴 尝试立即挂限价单（不等待成交，只检查是否能挂单）
-        entry_order = self._try_place_limit_order_immediately(
-            symbol, 'sell', amount, limit_price
-        )
+        self._algo_pending_cache = None  # 条件单/当前委托已变化
+        self._open_orders_snapshot = None
+        
+        # 监听队列中的是这张止损单时，按新止损价更新记录（价格接近新止损价时才优化）
+        with self._pending_lock:
+            pending = self.pending_stop_loss.get(symbol)
+            if pending is not None and pending.conditional_order_id == order_id:
+                self.pending_stop_loss[symbol] = PendingStopLoss(
+                    conditional_order_id=order_id,
+                    trigger_price=new_stop_loss,
+                    amount=amount,
+                    side=direction,
+                    order_type=order_type
+                )
         
-        if entry_order:
-            print(f"\n✅ 限价单已挂: 订单ID={entry_order['id']}")
-            result['entry_order'] = entry_order
-            
-            # 🔴 不立即挂止损止盈单，等待开仓成交后再挂
-            # 止损止盈价格会在开仓成交后通过定时检查机制挂单
-            print(f"   💡 止损止盈单将在开仓成交后自动挂单")
-            print(f"   📝 止损价格: ${stop_loss_price:.2f}" if stop_loss_price else "   📝 止损价格: 未设置")
-            print(f"   📝 止盈价格: ${take_profit_price:.2f}" if take_profit_price else "   📝 止盈价格: 未设置")
-            
-            print(f"{'='*60}\n")
-            return result
+        logger.info("   ✅ 已原地修改止损单: ID=%s, 新止损价=$%.2f", order_id, new_stop_loss)
+        return {'id': order_id, 'status': 'open', 'price': new_stop_loss, 'amount': amount, '_order_type': order_type}
+    
+    def cancel_all_stop_orders(self, symbol):
+        """兼容性方法：取消所有止损止盈单
         
-        # Step 2: 限价单无法挂单，立即降级为条件单
-        print(f"\n   ⚠️  限价单无法挂单，立即降级为条件单")
-        print(f"   📊 方案2: 使用条件单 (触发后Maker手续费0.02%)")
+        🔴 V2修复：只取消reduceOnly=True的订单（止损止盈单）
+        避免误删其他limit订单（如开仓限价单）
+        
+        该交易对没有任何止损/止盈记录（记录随监听队列持久化）时直接返回，不查询当前委托。
+        """
+        if self.test_mode:
+            logger.info("🧪 【测试模式】模拟取消所有止损单: %s", symbol)
+            return True
+        
+        if (symbol not in self.stop_loss_orders and symbol not in self.take_profit_orders
+                and symbol not in self.pending_stop_loss):
+            logger.info("📊 无需取消的止损止盈单")
+            return True
         
         try:
-            # 获取当前价格，计算触发价
-            ticker = self.exchange.fetch_ticker(symbol)
-            current_price = ticker['last']
-            
-            # 做空：当价格上涨到阻力位时触发
-            # 触发价应该略低于限价（例如：限价158.64，触发价158.63）
-            # 这样价格涨到158.63时触发，然后挂158.64的卖单
-            trigger_buffer = max(limit_price * 0.0005, 0.1)  # 0.05%或最小0.1
-            actual_trigger_price = limit_price - trigger_buffer
-            
-            print(f"   📊 空单条件单策略:")
-            print(f"      触发价: ${actual_trigger_price:.2f} (略低于限价${limit_price:.2f})")
-            print(f"      挂单价: ${limit_price:.2f}")
-            print(f"   💡 执行逻辑: 价格涨至${actual_trigger_price:.2f}时触发 → 挂${limit_price:.2f}的卖单")
-            
-            # 🔴 将合约张数转换为币数量（OKX API 需要币数量）
-            contract_size, _ = self.get_contract_size(symbol)
-            coin_amount = float(amount) * contract_size  # 币数量 = 合约张数 × 合约规格
-            coin_amount = round(coin_amount, 2)  # 保留两位小数
-            
-            # 🔴 使用OKX的algo_order API创建开仓条件单（计划委托）
-            # 注意：这不是止损止盈条件单，而是开仓条件单
-            algo_params = {
-                'instId': symbol,
-                'tdMode': 'cross',
-                'side': 'sell',
-                'ordType': 'conditional',  # 条件单类型
-                'sz': str(coin_amount),  # 🔴 币数量（不是合约张数）
-                'triggerPx': str(actual_trigger_price),  # 触发价
-                'orderPx': str(limit_price),  # 委托价（阻力位价格）
+            # V2版本：查询所有活跃的止损止盈单 {订单ID: 订单类型}
+            # 🔴 修复：只取消止损止盈单（reduceOnly=True 或止损类型的订单）
+            to_cancel = {
+                order['id']: 'limit' for order in self.exchange.fetch_open_orders(symbol)
+                if order.get('reduceOnly') or order.get('type') in _STOP_ORDER_TYPES
             }
             
-            # 🔴 打印条件单参数详情
-            print(f"\n   📋 【条件单参数详情】")
-            print(f"      Symbol: {symbol}")
-            print(f"      Side: sell")
-            print(f"      合约张数: {amount} 张")
-            print(f"      合约规格: {contract_size} SOL/张")
-            print(f"      币数量: {coin_amount} SOL (合约张数{amount} × 规格{contract_size})")
-            print(f"      触发价: ${actual_trigger_price:.2f}")
-            print(f"      挂单价: ${limit_price:.2f}")
-            print(f"      Params: {algo_params}")
-            
-            # 获取账户余额信息
-            try:
-                balance_info = self.get_balance()
-                if balance_info:
-                    print(f"      💰 账户余额: 总余额=${balance_info.get('total', 0):.2f}, 可用=${balance_info.get('free', 0):.2f}, 已用=${balance_info.get('used', 0):.2f}")
-                
-                # 🔴 计算需要的保证金（注意：amount 已经是计算好的合约张数）
-                leverage = getattr(self, 'leverage', TRADING_CONFIG.get('leverage', 1))
-                
-                # 获取合约规格，计算实际持仓价值
-                contract_size, _ = self.get_contract_size(symbol)
-                coin_amount = float(amount) * contract_size  # 实际币数量
-                position_value = coin_amount * limit_price  # 实际持仓价值（币数量 × 挂单价）
-                required_margin = position_value / leverage  # 所需保证金（持仓价值 ÷ 杠杆）
-                
-                print(f"      💰 合约张数: {amount} 张")
-                print(f"      💰 合约规格: {contract_size} SOL/张")
-                print(f"      💰 实际币数量: {coin_amount:.4f} SOL (数量{amount} × 规格{contract_size})")
-                print(f"      💰 持仓价值: ${position_value:.2f} (币数量{coin_amount:.4f} × 挂单价${limit_price:.2f})")
-                print(f"      💰 所需保证金: ${required_margin:.2f} (持仓价值${position_value:.2f} ÷ {leverage}倍杠杆)")
-                if balance_info:
-                    free_balance = balance_info.get('free', 0)
-                    if free_balance < required_margin:
-                        print(f"      ⚠️  可用余额不足: 需要${required_margin:.2f}, 可用${free_balance:.2f}, 差额=${required_margin - free_balance:.2f}")
-                    else:
-                        print(f"      ✅ 可用余额充足: 需要${required_margin:.2f}, 可用${free_balance:.2f}, 剩余=${free_balance - required_margin:.2f}")
-            except Exception as e:
-                print(f"      ⚠️  获取账户信息失败: {e}")
+            # 🔴 条件止损止盈单不在普通当前委托里：从条件单列表筛出该交易对的减仓条件单
+            algo_map = self._get_algo_pending(max_age=0) or {}
+            for algo_id, algo in algo_map.items():
+                if algo.get('instId') == symbol and algo.get('reduceOnly') == 'true':
+                    to_cancel[algo_id] = 'conditional_limit'
             
-            print(f"   {'-'*60}\n")
+            # 🔴 批量撤单：普通订单、条件单各一次请求
+            canceled = self._cancel_typed_orders(symbol, to_cancel, '止损止盈单')
+            canceled_count = len(canceled)
             
-            # 动态处理posSide参数
-            try:
-                algo_params['posSide'] = 'short'
-                response = self.exchange.private_post_trade_order_algo(algo_params)
-            except Exception as e1:
-                error_msg = str(e1)
-                if '51000' in error_msg or 'posSide' in error_msg:
-                    print(f"   🔄 检测到单向持仓模式，重试不带posSide...")
-                    if 'posSide' in algo_params:
-                        del algo_params['posSide']
-                    response = self.exchange.private_post_trade_order_algo(algo_params)
-                else:
-                    raise e1
+            # 撤掉的止损/止盈单不再记录
+            current = self.stop_loss_orders.get(symbol)
+            if current is not None and current[0] in canceled:
+                self._clear_stop_loss(symbol, current[0])
+            tp_id = self.take_profit_orders.get(symbol)
+            if tp_id is not None and tp_id in canceled:
+                self._clear_take_profit(symbol, tp_id)
             
-            # 检查响应
-            if response.get('code') == '0' and response.get('data'):
-                order_data = response['data'][0]
-                conditional_order_id = order_data.get('algoId') or order_data.get('ordId')
-                order = {
-                    'id': conditional_order_id,
-                    'status': 'open',
-                    'type': 'conditional',
-                    'trigger_price': actual_trigger_price,
-                    'limit_price': limit_price
-                }
+            if canceled_count > 0:
+                logger.info("✅ 共取消 %s 个止损止盈单", canceled_count)
             else:
-                error_msg = response.get('msg', 'Unknown error')
-                raise Exception(f"创建条件单失败: {error_msg}")
-            
-            conditional_order_id = order['id']
-            print(f"   ✅ 条件单已设置: 触发价=${actual_trigger_price:.2f}, 挂单价=${limit_price:.2f}, ID={conditional_order_id}")
-            
-            result['entry_order'] = {
-                'id': conditional_order_id,
-                'status': 'open',
-                'type': 'conditional',
-                'trigger_price': actual_trigger_price,
-                'limit_price': limit_price
-            }
-            
-            # 🔴 加入监听队列，价格接近时自动优化为限价单
-            self.pending_entry_orders[symbol] = {
-                'conditional_order_id': conditional_order_id,
-                'limit_price': limit_price,
-                'amount': amount,
-                'direction': 'short',
-                'stop_loss_price': stop_loss_price,
-                'take_profit_price': take_profit_price,
-                'order_type': 'conditional'
-            }
-            print(f"   🔔 已加入监听队列: 价格到达 ${limit_price * 0.997:.2f} - ${limit_price * 1.003:.2f} 时优化为限价单")
-            
-            print(f"{'='*60}\n")
-            return result
+                logger.info("📊 无需取消的止损止盈单")
             
+            return True
+        
         except Exception as e:
-            print(f"   ❌ 条件单失败: {e}")
-            print(f"{'='*60}\n")
-            return result
+            logger.warning("⚠️  取消止损单失败: %s", e)
+            return False
     
-    def update_stop_loss(self, symbol, position_side, new_stop_loss, amount):
-        """兼容性方法：更新止损单（混合方案）
-        
-        V2版本逻辑：
-        1. 取消所有当前的止损单（限价单/条件单）
-        2. 尝试挂新的限价单
-        3. 如果失败，挂条件单兜底，并加入监听队列
-        4. 每分钟检查队列，价格接近时优化为限价单
-        """
-        print(f"\n🔄 V2更新止损单: {symbol} {position_side} ${new_stop_loss:.2f}")
-        
-        # Step 1: 取消所有当前的止损单
-        print(f"   🗑️  取消旧止损单...")
-        self._cancel_stop_loss_orders(symbol)
+    def _cancel_typed_orders(self, symbol, to_cancel, label):
+        """按订单类型批量撤单：条件单走条件单API，其余走普通批量撤单，各一次请求
         
-        # Step 2: 尝试挂新的限价单
-        side = position_side  # 'long' or 'short'
-        result = self._set_stop_loss_limit(symbol, side, new_stop_loss, amount)
-        
-        # 如果成功挂上限价单，从监听队列移除
-        if result and symbol in self.pending_stop_loss:
-            # 检查是否是真正的限价单（不是条件单）
-            if result.get('id') != self.pending_stop_loss[symbol].get('conditional_order_id'):
-                print(f"   ✅ 限价单挂单成功，从监听队列移除")
-                del self.pending_stop_loss[symbol]
+        Args:
+            to_cancel: {订单ID: 订单类型}
+            label: 日志中的订单名称
         
-        return result
+        Returns:
+            set: 撤销成功的订单ID
+        """
+        algo_ids = [order_id for order_id, order_type in to_cancel.items() if order_type == 'conditional_limit']
+        order_ids = [order_id for order_id, order_type in to_cancel.items() if order_type != 'conditional_limit']
+        canceled = set()
+        if algo_ids:
+            self._open_orders_snapshot = None  # 当前委托已变化
+            try:
+                for order_id in self._cancel_conditional_orders(symbol, algo_ids):
+                    logger.info("✅ 已取消%s: ID=%s", label, order_id)
+                    canceled.add(order_id)
+            except Exception as e:
+                logger.warning("⚠️  取消%s%s失败: %s", label, algo_ids, e)
+        if order_ids:
+            self._open_orders_snapshot = None
+            canceled.update(self._cancel_orders_batch(symbol, order_ids, label=label))
+        return canceled
     
-    def cancel_all_stop_orders(self, symbol):
-        """兼容性方法：取消所有止损止盈单
+    def _cancel_orders_batch(self, symbol, order_ids, label='止损止盈单'):
+        """批量撤销普通订单（每批最多20个），批量接口报告失败的订单再逐个撤销
         
-        🔴 V2修复：只取消reduceOnly=True的订单（止损止盈单）
-        避免误删其他limit订单（如开仓限价单）
-        """
-        if self.test_mode:
-            print(f"🧪 【测试模式】模拟取消所有止损单: {symbol}")
-            return True
+        Args:
+            label: 日志中的订单名称
         
-        try:
-            # V2版本：查询并取消所有活跃的止损止盈单
-            open_orders = self.exchange.fetch_open_orders(symbol)
-            canceled_count = 0
-            
-            for order in open_orders:
-                # 🔴 修复：只取消reduceOnly=True的订单（止损止盈单）
-                order_type = order.get('type', '')
-                reduce_only = order.get('reduceOnly', False)
-                
-                # 判断是否是止损止盈单
-                is_stop_or_tp = (
-                    reduce_only or  # ← 关键：reduceOnly标志
-                    order_type in ['stop', 'stop_limit', 'stop_market']
+        Returns:
+            list: 撤销成功的订单ID
+        """
+        canceled = []
+        for i in range(0, len(order_ids), BATCH_CANCEL_SIZE):
+            chunk = order_ids[i:i + BATCH_CANCEL_SIZE]
+            failed = list(chunk)
+            try:
+                self._trade_bucket.take()
+                response = self.exchange.private_post_trade_cancel_batch_orders(
+                    [{'instId': symbol, 'ordId': str(order_id)} for order_id in chunk]
                 )
-                
-                if is_stop_or_tp:
-                    try:
-                        self.exchange.cancel_order(order['id'], symbol)
-                        canceled_count += 1
-                        print(f"✅ 已取消止损止盈单: ID={order['id']}, type={order_type}")
-                    except Exception as e:
-                        print(f"⚠️  取消订单{order['id']}失败: {e}")
-            
-            if canceled_count > 0:
-                print(f"✅ 共取消 {canceled_count} 个止损止盈单")
-            else:
-                print(f"📊 无需取消的止损止盈单")
-            
-            return True
+                done = {item.get('ordId') for item in response.get('data', []) if item.get('sCode') == '0'}
+                failed = [order_id for order_id in chunk if str(order_id) not in done]
+                for order_id in done:
+                    canceled.append(order_id)
+                    logger.info("✅ 已取消%s: ID=%s", label, order_id)
+            except Exception as e:
+                logger.warning("⚠️  批量撤单失败，逐个撤销: %s", e)
             
-        except Exception as e:
-            print(f"⚠️  取消止损单失败: {e}")
-            return False
+            for order_id in failed:
+                try:
+                    self._cancel_order(order_id, symbol)
+                    canceled.append(str(order_id))
+                    logger.info("✅ 已取消%s: ID=%s", label, order_id)
+                except Exception as e:
+                    logger.warning("⚠️  取消订单%s失败: %s", order_id, e)
+        return canceled
     
     def set_leverage(self, symbol, leverage, margin_mode='cross'):
-        """设置杠杆倍数"""
+        """设置杠杆倍数（同一交易对、保证金模式已设置成相同杠杆时直接返回，不再重复请求）"""
         if self.test_mode:
-            print(f"🧪 【测试模式】模拟设置杠杆: {symbol}, {leverage}x")
+            logger.info("🧪 【测试模式】模拟设置杠杆: %s, %sx", symbol, leverage)
+            return True
+        
+        if self._leverage_cache.get((symbol, margin_mode)) == leverage:
+            self.leverage = leverage
             return True
         
         try:
@@ -1680,84 +2286,241 @@ class OKXTraderV2:
             response = self.exchange.private_post_account_set_leverage(params)
             
             if response.get('code') == '0':
-                print(f"✅ 杠杆设置成功: {symbol}, {leverage}x")
+                logger.info("✅ 杠杆设置成功: %s, %sx", symbol, leverage)
                 self.leverage = leverage
+                self._leverage_cache[(symbol, margin_mode)] = leverage
                 return True
             else:
-                print(f"❌ 杠杆设置失败: {response.get('msg')}")
+                logger.error("❌ 杠杆设置失败: %s", response.get('msg'))
                 return False
-                
+        
         except Exception as e:
-            print(f"❌ 设置杠杆失败: {e}")
+            logger.error("❌ 设置杠杆失败: %s", e)
             return False
     
+    def invalidate_leverage(self, symbol):
+        """清除交易对的杠杆缓存（在交易所网页/其他程序改过杠杆或账户模式后调用，下次 set_leverage 重新请求）"""
+        for key in [key for key in self._leverage_cache if key[0] == symbol]:
+            del self._leverage_cache[key]
+    
     def _cancel_stop_loss_orders(self, symbol):
         """取消指定交易对的所有止损单（只取消止损，不取消止盈）
         
         🔴 关键：通过订单ID或价格判断是否是止损单
-        - 如果有记录的止损单ID（self.stop_loss_order_id），直接取消
+        - 如果有该交易对记录的止损单ID（self.stop_loss_orders），直接取消
         - 或者从pending_stop_loss队列中获取条件单ID
         """
         if self.test_mode:
-            print(f"   🧪 【测试模式】模拟取消止损单")
+            logger.info("   🧪 【测试模式】模拟取消止损单")
             # 清空监听队列中的记录
-            if symbol in self.pending_stop_loss:
-                del self.pending_stop_loss[symbol]
-            self.stop_loss_order_id = None
-            self.stop_loss_order_type = None
+            self.pending_stop_loss.pop(symbol, None)
+            self.stop_loss_orders.pop(symbol, None)
             return True
         
         try:
-            canceled_count = 0
-            
-            # 🔴 方案1：如果有记录止损单ID，直接取消
-            if self.stop_loss_order_id:
-                try:
-                    if self.stop_loss_order_type == 'conditional_limit':
-                        # 条件单：使用专用取消方法
-                        self._cancel_conditional_order(self.stop_loss_order_id, symbol)
-                    else:
-                        # 限价单：使用普通取消方法
-                        self.exchange.cancel_order(self.stop_loss_order_id, symbol)
-                    print(f"   ✅ 已取消止损单: {self.stop_loss_order_id}")
-                    self.stop_loss_order_id = None
-                    self.stop_loss_order_type = None
-                    canceled_count += 1
-                except Exception as e:
-                    print(f"   ⚠️  取消止损单{self.stop_loss_order_id}失败: {e}")
-            
-            # 🔴 方案2：如果有pending队列中的订单，也取消
-            if symbol in self.pending_stop_loss:
-                pending = self.pending_stop_loss[symbol]
-                order_id = pending.get('conditional_order_id')
-                order_type = pending.get('order_type', 'conditional_limit')
-                
-                if order_id:
-                    try:
-                        if order_type == 'conditional_limit':
-                            # 条件单：使用专用取消方法
-                            self._cancel_conditional_order(order_id, symbol)
-                        else:
-                            # 限价单：使用普通取消方法
-                            self.exchange.cancel_order(order_id, symbol)
-                        print(f"   ✅ 已取消止损单: {order_id}")
-                        canceled_count += 1
-                    except Exception as e:
-                        print(f"   ⚠️  取消止损单失败: {e}")
-                
+            # 🔴 汇总要撤的止损单ID {订单ID: 订单类型}：记录的止损单 + 监听队列中的条件单
+            # 两处通常是同一张条件单，按ID去重，避免重复撤单
+            to_cancel = {}
+            
+            # 方案1：该交易对记录的止损单（只取本交易对的，不会误撤其他交易对的止损单）
+            current = self.stop_loss_orders.get(symbol)
+            if current is not None:
+                to_cancel[current[0]] = current[1]
+            
+            # 方案2：监听队列中的条件单（推送线程可能同时移除记录，只取一次）
+            pending = self.pending_stop_loss.get(symbol)
+            if pending is not None and pending.conditional_order_id:
+                to_cancel.setdefault(str(pending.conditional_order_id), pending.order_type)
+            
+            # 🔴 按类型各发一次批量撤单：条件单走条件单API，其余走普通批量撤单
+            canceled = self._cancel_typed_orders(symbol, to_cancel, '止损单')
+            canceled_count = len(canceled)
+            
+            # 撤单成功才清空止损单记录（失败时保留，下次检查仍能查到）
+            if current is not None and current[0] in canceled:
+                self._clear_stop_loss(symbol, current[0])
+            if pending is not None:
                 # 清空队列
-                del self.pending_stop_loss[symbol]
+                self._remove_pending(self.pending_stop_loss, [(symbol, pending)])
             
             if canceled_count > 0:
-                print(f"   📊 共取消 {canceled_count} 个止损单")
+                logger.info("   📊 共取消 %s 个止损单", canceled_count)
             else:
-                print(f"   📊 无止损单需要取消")
+                logger.info("   📊 无止损单需要取消")
             
             return True
+        
+        except Exception as e:
+            logger.error("   ❌ 取消止损单失败: %s", e)
+            return False
+    
+    def _run_pending_checks(self, queue, check, last_prices, near_symbols, symbols=None):
+        """对监听队列快照逐个执行 check(symbol, 记录, last_prices, near_symbols)
+        
+        多个交易对时在线程池中并行执行，网络请求互相重叠，耗时≈单个交易对；只有一个时直接执行。
+        
+        Args:
+            symbols: 只检查这些交易对（None表示队列中全部）
+        
+        Returns:
+            list: 需要从队列移除的 (symbol, 记录)
+        """
+        items = tuple(item for item in queue.items() if symbols is None or item[0] in symbols)
+        if len(items) > 1:
+            if self._optimizer_executor is None:
+                self._optimizer_executor = ThreadPoolExecutor(max_workers=OPTIMIZER_WORKERS, thread_name_prefix='okx-opt')
+            removes = list(self._optimizer_executor.map(
+                lambda item: check(item[0], item[1], last_prices, near_symbols), items
+            ))
+        else:
+            removes = [check(symbol, pending, last_prices, near_symbols) for symbol, pending in items]
+        return [item for item, remove in zip(items, removes) if remove]
+    
+    def _optimize_entry(self, symbol, pending, last_prices, near_symbols):
+        """检查并优化单个开仓条件单（可在工作线程中并行执行）
+        
+        Returns:
+            bool: True表示该记录应从队列移除
+        """
+        try:
+            current_price = last_prices[symbol]
+            limit_price = pending.limit_price
+            
+            # 🔴 是否接近目标价已由 near_symbols 的预计算区间判断，价差百分比只在调试日志中计算
+            if logger.isEnabledFor(logging.DEBUG):
+                price_diff_pct = abs(current_price - limit_price) / current_price * 100
+                logger.debug("   📊 %s: 当前价$%.2f, 目标价$%.2f, 价差%.2f%%", symbol, current_price, limit_price, price_diff_pct)
+            
+            # 🔴 先检查订单是否还存在
+            order_id = pending.conditional_order_id
+            
+            if order_id:
+                try:
+                    # 查询条件单状态（本轮所有交易对共用一次查询）
+                    found_order = (self._get_algo_pending() or {}).get(order_id)
+                    
+                    order_exists = False
+                    if found_order:
+                        state = found_order.get('state', 'live')
+                        logger.info("   ✅ 找到条件单，状态: %s", state)
+                        order_exists = True
+                    
+                    if not order_exists:
+                        logger.warning("   ⚠️  条件单不存在（可能已触发成交），检查是否已持仓...")
+                        
+                        # 🔴 检查是否有持仓（如果条件单已触发成交，应该已经有持仓了）
+                        try:
+                            positions = self._get_positions_snapshot().get(symbol, [])
+                            has_position = False
+                            for pos in positions:
+                                try:
+                                    contracts = float(pos.get('contracts', 0) or 0)
+                                    size = float(pos.get('size', 0) or 0)
+                                except (ValueError, TypeError):
+                                    contracts = 0
+                                    size = 0
+                                
+                                if contracts > 0 or size > 0:
+                                    has_position = True
+                                    # 🔴 成交推送可能已经取走并处理了这条记录
+                                    if self._claim_pending_entry(symbol, order_id):
+                                        logger.info("   ✅ 检测到持仓，条件单已成交！立即设置止损止盈...")
+                                        self._arm_entry_protection(symbol, pending)
+                                    else:
+                                        logger.info("   ✅ 检测到持仓，止损止盈已由成交推送处理")
+                                    break
+                        except Exception as e:
+                            logger.warning("   ⚠️  检查持仓失败: %s", e)
+                        
+                        # 从队列移除（无论是否成功设置止损止盈）
+                        return True
+                
+                except ccxt.OrderNotFound:
+                    # 🔴 ccxt已把OKX的51603（订单不存在）映射为OrderNotFound
+                    logger.warning("   ⚠️  条件单不存在，从队列移除")
+                    return True
+                except Exception as e:
+                    if _is_missing_order(e):  # 订单状态查不到（51600未映射为OrderNotFound）
+                        logger.warning("   ⚠️  条件单不存在，从队列移除")
+                        return True
+                    else:
+                        logger.warning("   ⚠️  检查条件单状态失败: %s", e)
+                        return False
             
+            # 如果价差 ≤ 0.3%，尝试优化
+            if symbol in near_symbols:
+                logger.info("   💡 价格接近目标价（≤0.3%），尝试优化为限价单...")
+                
+                # 🔴 先检查：如果限价单会失败（价格已触发），就不要优化
+                direction = pending.direction
+                should_skip = False
+                
+                if direction == 'long':
+                    # 做多：如果当前价 <= 目标价，已经触发了
+                    if current_price <= limit_price:
+                        logger.warning("   ⚠️  价格已触发 (当前价$%.2f <= 目标价$%.2f)", current_price, limit_price)
+                        logger.info("   💡 保持条件单，不优化")
+                        should_skip = True
+                else:
+                    # 做空：如果当前价 >= 目标价，已经触发了
+                    if current_price >= limit_price:
+                        logger.warning("   ⚠️  价格已触发 (当前价$%.2f >= 目标价$%.2f)", current_price, limit_price)
+                        logger.info("   💡 保持条件单，不优化")
+                        should_skip = True
+                
+                if should_skip:
+                    return False
+                
+                # 取消条件单
+                cancel_success = False
+                try:
+                    if pending.conditional_order_id:
+                        self._cancel_conditional_order(pending.conditional_order_id, symbol)
+                        logger.info("   ✅ 已取消条件单: %s", pending.conditional_order_id)
+                        cancel_success = True
+                except Exception as e:
+                    logger.warning("   ⚠️  取消条件单失败: %s", e)
+                    logger.info("   💡 条件单可能已触发，跳过优化（保留在队列中，成交后由推送或下一轮检查设置止损止盈）")
+                    return False
+                
+                # 🔴 只有取消成功才重新执行挂单逻辑
+                if cancel_success:
+                    # 重新执行挂单逻辑（先挂限价单，失败就挂条件单）
+                    amount = pending.amount
+                    stop_loss_price = pending.stop_loss_price
+                    take_profit_price = pending.take_profit_price
+                    
+                    if direction == 'long':
+                        result = self.open_long_with_limit_price(
+                            symbol, amount, limit_price, stop_loss_price, take_profit_price
+                        )
+                    else:
+                        result = self.open_short_with_limit_price(
+                            symbol, amount, limit_price, stop_loss_price, take_profit_price
+                        )
+                    
+                    # 检查结果
+                    if result.get('entry_order'):
+                        entry_order = result['entry_order']
+                        if entry_order.get('type') == 'conditional':
+                            # 仍然是条件单，更新队列中的ID
+                            logger.info("   💡 降级为条件单，继续监听")
+                            self.pending_entry_orders[symbol].conditional_order_id = str(entry_order['id'])
+                            self.pending_entry_orders[symbol].order_type = 'conditional'
+                        else:
+                            # 成功挂上限价单：从队列移除
+                            logger.info("   ✅ 优化成功！已替换为限价单")
+                            return True
+                    else:
+                        # 失败：移除队列（可能已经被触发了）
+                        logger.warning("   ⚠️  挂单失败，从队列移除")
+                        return True
+        
         except Exception as e:
-            print(f"   ❌ 取消止损单失败: {e}")
+            logger.error("   ❌ 检查%s失败: %s", symbol, e)
             return False
+        
+        return False
     
     def check_and_optimize_entry_orders(self):
         """检查监听队列，优化开仓条件单为限价单（每10秒调用）
@@ -1770,182 +2533,228 @@ class OKXTraderV2:
             return
         
         current_time = datetime.now().strftime('%H:%M:%S')
-        print(f"\n[{current_time}] 🔍 检查待优化的开仓条件单（队列：{len(self.pending_entry_orders)}个）")
+        logger.info("\n[%s] 🔍 检查待优化的开仓条件单（队列：%s个）", current_time, len(self.pending_entry_orders))
         
-        for symbol, pending in list(self.pending_entry_orders.items()):
-            try:
-                # 获取当前价格
-                ticker = self.exchange.fetch_ticker(symbol)
-                current_price = ticker['last']
-                limit_price = pending['limit_price']
-                
-                # 计算价差百分比
-                price_diff_pct = abs(current_price - limit_price) / current_price * 100
-                
-                print(f"   📊 {symbol}: 当前价${current_price:.2f}, 目标价${limit_price:.2f}, 价差{price_diff_pct:.2f}%")
-                
-                # 🔴 先检查订单是否还存在
-                order_id = pending.get('conditional_order_id')
-                
-                if order_id:
-                    try:
-                        # 查询条件单状态
-                        params = {'ordType': 'conditional'}
-                        response = self.exchange.private_get_trade_orders_algo_pending(params)
-                        
-                        order_exists = False
-                        if response.get('code') == '0' and response.get('data'):
-                            for algo_data in response['data']:
-                                if str(algo_data.get('algoId', '')) == str(order_id):
-                                    state = algo_data.get('state', 'live')
-                                    print(f"   ✅ 找到条件单，状态: {state}")
+        # 🔴 最新价优先取WebSocket推送，缺失时才走REST
+        last_prices = self._get_last_prices(list(self.pending_entry_orders))
+        near_symbols = self.pending_entry_orders.near(last_prices)  # 向量化判断哪些接近目标价
+        self._positions_snapshot = None  # 需要时才批量查询一次持仓，本轮各交易对共用
+        
+        # 🔴 遍历快照（推送线程可能同时增删队列），多个交易对并行检查
+        to_remove = self._run_pending_checks(self.pending_entry_orders, self._optimize_entry, last_prices, near_symbols)
+        
+        self._remove_pending(self.pending_entry_orders, to_remove)
+        
+        if self.pending_entry_orders:
+            logger.info("   📋 待优化开仓队列: %s个", len(self.pending_entry_orders))
+        else:
+            logger.info("   ✅ 待优化开仓队列为空")
+    
+    def _optimize_stop_loss(self, symbol, pending, last_prices, near_symbols):
+        """检查并优化单个止损条件单（可在工作线程中并行执行）
+        
+        Returns:
+            bool: True表示该记录应从队列移除
+        """
+        try:
+            current_price = last_prices[symbol]
+            trigger_price = pending.trigger_price
+            
+            # 🔴 是否接近止损价已由 near_symbols 的预计算区间判断，价差百分比只在调试模式下计算
+            if logger.isEnabledFor(logging.DEBUG):
+                price_diff_pct = abs(current_price - trigger_price) / current_price * 100
+                logger.debug("   📊 %s: 当前价$%.2f, 止损价$%.2f, 价差%.2f%%", symbol, current_price, trigger_price, price_diff_pct)
+            
+            # 🔴 先检查订单是否还存在
+            order_id = pending.conditional_order_id
+            order_type = pending.order_type  # 默认条件单
+            
+            if order_id:
+                try:
+                    logger.debug("   🔍 查询订单状态: %s (类型: %s)", order_id, order_type)
+                    
+                    order_exists = False
+                    
+                    if order_type == 'conditional_limit':
+                        # 条件单：本轮所有交易对共用一次条件单列表查询（ordType是必须参数）
+                        try:
+                            algo_map = self._get_algo_pending()
+                            
+                            if algo_map:
+                                logger.debug("   📊 获取到 %s 个条件单", len(algo_map))
+                                found_order = algo_map.get(order_id)
+                                
+                                if found_order:
+                                    state = found_order.get('state', 'live')
+                                    logger.info("   ✅ 找到条件单，状态: %s", state)
                                     order_exists = True
-                                    break
+                                else:
+                                    # 在当前委托列表中找不到匹配的订单
+                                    logger.warning("   ⚠️  条件单不在当前委托列表中")
+                                    # 打印所有条件单ID用于调试
+                                    if logger.isEnabledFor(logging.DEBUG):
+                                        logger.debug("   📋 当前条件单ID列表: %s", list(algo_map))
+                            else:
+                                # 没有条件单
+                                logger.warning("   ⚠️  当前没有活跃的条件单")
                         
-                        if not order_exists:
-                            print(f"   ⚠️  条件单不存在（可能已触发成交），检查是否已持仓...")
-                            
-                            # 🔴 检查是否有持仓（如果条件单已触发成交，应该已经有持仓了）
-                            try:
-                                positions = self.exchange.fetch_positions([symbol])
-                                has_position = False
-                                for pos in positions:
-                                    try:
-                                        contracts = float(pos.get('contracts', 0) or 0)
-                                        size = float(pos.get('size', 0) or 0)
-                                    except (ValueError, TypeError):
-                                        contracts = 0
-                                        size = 0
-                                    
-                                    if contracts > 0 or size > 0:
-                                        has_position = True
-                                        print(f"   ✅ 检测到持仓，条件单已成交！立即设置止损止盈...")
-                                        
-                                        # 🔴 设置止损止盈
-                                        stop_loss_price = pending.get('stop_loss_price')
-                                        take_profit_price = pending.get('take_profit_price')
-                                        amount = pending.get('amount')
-                                        direction = pending.get('direction')
-                                        
-                                        if stop_loss_price:
-                                            print(f"   🛡️  设置止损单: ${stop_loss_price:.2f}")
-                                            self._set_stop_loss_limit(
-                                                symbol, direction, stop_loss_price, amount
-                                            )
-                                        
-                                        if take_profit_price:
-                                            print(f"   🎯 设置止盈单: ${take_profit_price:.2f}")
-                                            self._set_take_profit_limit(
-                                                symbol, direction, take_profit_price, amount
-                                            )
-                                        
-                                        print(f"   ✅ 止损止盈单已设置完成")
-                                        break
-                            except Exception as e:
-                                print(f"   ⚠️  检查持仓失败: {e}")
-                            
-                            # 从队列移除（无论是否成功设置止损止盈）
-                            del self.pending_entry_orders[symbol]
-                            continue
+                        except AttributeError:
+                            logger.warning("   ⚠️  exchange对象不支持条件单API")
+                        except Exception as e:
+                            logger.warning("   ⚠️  获取条件单列表失败: %s", e)
+                    
+                    elif order_type == 'limit':
+                        # 限价单：先查本轮共用的当前委托快照，不在其中才单独查询
+                        try:
+                            order_status = self._get_order_status(order_id, symbol)
+                            logger.debug("   📊 订单API返回结果: %s", order_status)
                             
-                    except Exception as e:
-                        error_msg = str(e)
-                        if "51603" in error_msg or "Order does not exist" in error_msg or "51600" in error_msg:
-                            print(f"   ⚠️  条件单不存在，从队列移除")
-                            del self.pending_entry_orders[symbol]
-                            continue
-                        else:
-                            print(f"   ⚠️  检查条件单状态失败: {e}")
-                            continue
-                
-                # 如果价差 ≤ 0.3%，尝试优化
-                if price_diff_pct <= 0.3:
-                    print(f"   💡 价格接近目标价（≤0.3%），尝试优化为限价单...")
+                            if order_status.get('status') in ['open', 'closed']:
+                                logger.info("   ✅ 限价单状态正常: %s", order_status.get('status'))
+                                order_exists = True
+                            elif order_status.get('status') in ['canceled']:
+                                logger.warning("   ⚠️  限价单已取消")
+                            else:
+                                logger.info("   📊 限价单状态: %s", order_status.get('status'))
+                        
+                        except Exception as e:
+                            logger.error("   ❌ 限价单查询失败: %s", e)
                     
-                    # 🔴 先检查：如果限价单会失败（价格已触发），就不要优化
-                    direction = pending['direction']
-                    should_skip = False
+                    # 如果订单不存在，从队列移除
+                    if not order_exists:
+                        logger.warning("   ⚠️  订单不存在，从队列移除")
+                        return True
+                
+                except ccxt.OrderNotFound:
+                    # 🔴 ccxt已把OKX的51603（订单不存在）映射为OrderNotFound
+                    logger.warning("   ⚠️  订单不存在，从队列移除")
+                    return True
+                except Exception as e:
+                    # 🔴 repr 同时带出异常类型和信息，格式化推迟到日志真正输出时
+                    logger.error("   ❌ 订单API错误详情: %r", e)
                     
-                    if direction == 'long':
-                        # 做多：如果当前价 <= 目标价，已经触发了
-                        if current_price <= limit_price:
-                            print(f"   ⚠️  价格已触发 (当前价${current_price:.2f} <= 目标价${limit_price:.2f})")
-                            print(f"   💡 保持条件单，不优化")
-                            should_skip = True
+                    if _is_missing_order(e):  # 订单状态查不到（51600未映射为OrderNotFound）
+                        logger.warning("   ⚠️  订单不存在，从队列移除")
+                        return True
                     else:
-                        # 做空：如果当前价 >= 目标价，已经触发了
-                        if current_price >= limit_price:
-                            print(f"   ⚠️  价格已触发 (当前价${current_price:.2f} >= 目标价${limit_price:.2f})")
-                            print(f"   💡 保持条件单，不优化")
-                            should_skip = True
-                    
-                    if should_skip:
-                        continue
-                    
-                    # 取消条件单
-                    cancel_success = False
-                    try:
-                        if pending['conditional_order_id']:
-                            self._cancel_conditional_order(pending['conditional_order_id'], symbol)
-                            print(f"   ✅ 已取消条件单: {pending['conditional_order_id']}")
-                            cancel_success = True
-                    except Exception as e:
-                        print(f"   ⚠️  取消条件单失败: {e}")
-                        print(f"   💡 条件单可能已触发，跳过优化")
-                        del self.pending_entry_orders[symbol]
-                        continue
-                    
-                    # 🔴 只有取消成功才重新执行挂单逻辑
-                    if cancel_success:
-                        # 重新执行挂单逻辑（先挂限价单，失败就挂条件单）
-                        amount = pending['amount']
-                        stop_loss_price = pending.get('stop_loss_price')
-                        take_profit_price = pending.get('take_profit_price')
-                        
-                        if direction == 'long':
-                            result = self.open_long_with_limit_price(
-                                symbol, amount, limit_price, stop_loss_price, take_profit_price
-                            )
-                        else:
-                            result = self.open_short_with_limit_price(
-                                symbol, amount, limit_price, stop_loss_price, take_profit_price
-                            )
-                        
-                        # 检查结果
-                        if result.get('entry_order'):
-                            entry_order = result['entry_order']
-                            if entry_order.get('type') == 'conditional':
-                                # 仍然是条件单，更新队列中的ID
-                                print(f"   💡 降级为条件单，继续监听")
-                                self.pending_entry_orders[symbol]['conditional_order_id'] = entry_order['id']
-                                self.pending_entry_orders[symbol]['order_type'] = 'conditional'
-                            else:
-                                # 成功挂上限价单：从队列移除
-                                print(f"   ✅ 优化成功！已替换为限价单")
-                                if symbol in self.pending_entry_orders:
-                                    del self.pending_entry_orders[symbol]
-                        else:
-                            # 失败：移除队列（可能已经被触发了）
-                            print(f"   ⚠️  挂单失败，从队列移除")
-                            if symbol in self.pending_entry_orders:
-                                del self.pending_entry_orders[symbol]
+                        logger.warning("   ⚠️  检查订单状态失败: %s", e)
+                        return False
+            
+            # 如果价差 ≤ 0.5%，尝试优化
+            if symbol in near_symbols:
+                logger.info("   💡 价格接近止损位（≤1%），尝试优化为限价单...")
                 
-            except Exception as e:
-                print(f"   ❌ 检查{symbol}失败: {e}")
-                continue
+                # 🔴 先检查：如果限价单会失败（价格已触发），就不要优化
+                # 获取当前市场价格
+                side = pending.side
+                should_skip = False
+                
+                if side == 'long':
+                    # 多单止损：如果当前价 <= 止损价，已经触发了
+                    if current_price <= trigger_price:
+                        logger.warning("   ⚠️  价格已触发止损 (当前价$%.2f <= 止损价$%.2f)", current_price, trigger_price)
+                        logger.info("   💡 保持条件单，不优化")
+                        should_skip = True
+                else:
+                    # 空单止损：如果当前价 >= 止损价，已经触发了
+                    if current_price >= trigger_price:
+                        logger.warning("   ⚠️  价格已触发止损 (当前价$%.2f >= 止损价$%.2f)", current_price, trigger_price)
+                        logger.info("   💡 保持条件单，不优化")
+                        should_skip = True
+                
+                if should_skip:
+                    return False
+                
+                # 取消订单（根据类型选择方法）
+                cancel_success = False
+                try:
+                    if pending.conditional_order_id:
+                        self._cancel_one(pending.conditional_order_id, order_type, symbol)
+                        logger.info("   ✅ 已取消订单: %s", pending.conditional_order_id)
+                        cancel_success = True
+                except Exception as e:
+                    logger.warning("   ⚠️  取消订单失败: %s", e)
+                    # 如果取消失败（可能已经被触发了），就不要继续挂单
+                    logger.info("   💡 订单可能已触发，跳过优化")
+                    return True
+                
+                # 🔴 只有取消成功才尝试挂限价单
+                if cancel_success:
+                    # 尝试挂限价单
+                    limit_order = self._set_stop_loss_limit(
+                        symbol,
+                        pending.side,
+                        trigger_price,
+                        pending.amount
+                    )
+                    
+                    # 🔴 降级为条件单时 _bracket_leg_fallback 已用新ID重新写入队列，这里只需决定是否移除
+                    remove, message = _STOP_OPTIMIZE_RESULT.get(
+                        limit_order.get('_order_type') if limit_order else None, _STOP_OPTIMIZE_FAILED
+                    )
+                    logger.info(message)
+                    return remove
         
-        if self.pending_entry_orders:
-            print(f"   📋 待优化开仓队列: {len(self.pending_entry_orders)}个")
-        else:
-            print(f"   ✅ 待优化开仓队列为空")
+        except Exception as e:
+            logger.error("   ❌ 检查%s失败: %s", symbol, e)
+            return False
+        
+        return False
     
     def check_and_optimize_stop_orders(self):
-        """检查监听队列，优化条件单为限价单（每10秒调用）
+        """检查监听队列，优化条件单为限价单（调用方按 next_check_interval() 的间隔调用）
         
         遍历pending_stop_loss队列：
         - 检查当前价格与止损价的差距
         - 如果 ≤ 0.3%，取消条件单，挂限价单
+        
+        上一轮检查仍在进行（网络慢）或距上一轮不足 OPTIMIZE_MIN_INTERVAL 秒时直接跳过，避免请求堆积
+        """
+        if not self._optimize_lock.acquire(blocking=False):
+            return
+        try:
+            now = time.monotonic()
+            if now - self._last_optimize_ts < OPTIMIZE_MIN_INTERVAL:
+                return
+            self._last_optimize_ts = now
+            self._check_and_optimize_stop_orders()
+        finally:
+            self._optimize_lock.release()
+    
+    def next_check_interval(self):
+        """建议的下一轮监听检查间隔（秒）
+        
+        - 两个队列都为空：OPTIMIZE_IDLE_INTERVAL
+        - 队列中出现上一轮没检查过的交易对，或上一轮取不到最新价：OPTIMIZE_MIN_INTERVAL（尽快检查）
+        - 否则按上一轮最近一个目标价的价差查 OPTIMIZE_INTERVALS，越接近检查越频繁
         """
+        symbols = set(self.pending_entry_orders) | set(self.pending_stop_loss)
+        if not symbols:
+            return OPTIMIZE_IDLE_INTERVAL
+        gap = self._min_price_gap
+        if gap is None or not symbols <= self._checked_symbols:
+            return OPTIMIZE_MIN_INTERVAL
+        for band, interval in OPTIMIZE_INTERVALS:
+            if gap <= band:
+                return interval
+        return OPTIMIZE_FAR_INTERVAL
+    
+    def _check_and_optimize_stop_orders(self):
+        """执行一轮监听检查（由 check_and_optimize_stop_orders 限频调用）"""
+        # 🔴 行情订阅跟随监听队列增减
+        self._sync_ticker_watcher()
+        
+        # 🔴 两个队列的最新价一次批量获取，开仓/止损检查直接复用缓存
+        symbols = frozenset(self.pending_entry_orders) | frozenset(self.pending_stop_loss)
+        last_prices = self._get_last_prices(list(symbols))
+        
+        # 🔴 记下最近一个目标价的价差，调用方据此决定下一轮检查间隔（next_check_interval）
+        gaps = [gap for gap in (self.pending_entry_orders.min_gap(last_prices), self.pending_stop_loss.min_gap(last_prices)) if gap is not None]
+        self._min_price_gap = min(gaps) if gaps else None
+        self._checked_symbols = symbols
+        
+        self._open_orders_snapshot = None  # 每轮检查重新获取一次当前委托
+        
         # 🔴 同时检查开仓条件单队列
         self.check_and_optimize_entry_orders()
         
@@ -1953,247 +2762,92 @@ class OKXTraderV2:
         current_time = datetime.now().strftime('%H:%M:%S')
         
         if not self.pending_stop_loss:
-            print(f"[{current_time}] 🔍 监听检查：待优化止损队列为空")
+            logger.info("[%s] 🔍 监听检查：待优化止损队列为空", current_time)
             return
         
-        print(f"\n[{current_time}] 🔍 检查待优化的止损单（队列：{len(self.pending_stop_loss)}个）")
+        logger.info("\n[%s] 🔍 检查待优化的止损单（队列：%s个）", current_time, len(self.pending_stop_loss))
         
-        # 🔴 打印队列详情
-        for sym, pending_info in self.pending_stop_loss.items():
-            print(f"   📋 队列详情: {sym} - 条件单ID: {pending_info.get('conditional_order_id')}, 触发价: ${pending_info.get('trigger_price')}, 方向: {pending_info.get('side')}")
+        # 🔴 队列详情只在调试日志中输出（遍历快照：推送线程可能同时删除记录）
+        if logger.isEnabledFor(logging.DEBUG):
+            for sym, pending_info in tuple(self.pending_stop_loss.items()):
+                logger.debug("   📋 队列详情: %s - 条件单ID: %s, 触发价: $%s, 方向: %s", sym, pending_info.conditional_order_id, pending_info.trigger_price, pending_info.side)
         
-        for symbol, pending in list(self.pending_stop_loss.items()):
-            try:
-                # 获取当前价格
-                ticker = self.exchange.fetch_ticker(symbol)
-                current_price = ticker['last']
-                trigger_price = pending['trigger_price']
-                
-                # 计算价差百分比
-                price_diff_pct = abs(current_price - trigger_price) / current_price * 100
-                
-                print(f"   📊 {symbol}: 当前价${current_price:.2f}, 止损价${trigger_price:.2f}, 价差{price_diff_pct:.2f}%")
-                
-                # 🔴 先检查订单是否还存在
-                order_id = pending.get('conditional_order_id')
-                order_type = pending.get('order_type', 'conditional_limit')  # 默认条件单
-                
-                if order_id:
-                    try:
-                        print(f"   🔍 查询订单状态: {order_id} (类型: {order_type})")
-                        
-                        order_exists = False
-                        
-                        if order_type == 'conditional_limit':
-                            # 条件单：根据API文档，ordType是必须参数
-                            # 1. 先获取所有条件单
-                            params = {
-                                'ordType': 'conditional',  # 必须参数：查询止盈止损单
-                            }
-                            
-                            try:
-                                # 获取所有当前活跃的条件单
-                                response = self.exchange.private_get_trade_orders_algo_pending(params)
-                                print(f"   📊 获取到 {len(response.get('data', []))} 个条件单")
-                                
-                                if response.get('code') == '0' and response.get('data'):
-                                    # 在结果中查找匹配的订单ID
-                                    found_order = None
-                                    for algo_data in response['data']:
-                                        algo_id = algo_data.get('algoId', '')
-                                        if str(algo_id) == str(order_id):
-                                            found_order = algo_data
-                                            break
-                                    
-                                    if found_order:
-                                        state = found_order.get('state', 'live')
-                                        print(f"   ✅ 找到条件单，状态: {state}")
-                                        order_exists = True
-                                    else:
-                                        # 在当前委托列表中找不到匹配的订单
-                                        print(f"   ⚠️  条件单不在当前委托列表中")
-                                        # 打印所有条件单ID用于调试
-                                        all_ids = [d.get('algoId') for d in response['data']]
-                                        print(f"   📋 当前条件单ID列表: {all_ids}")
-                                else:
-                                    # 没有条件单
-                                    print(f"   ⚠️  当前没有活跃的条件单")
-                                    print(f"   📊 API响应: {response}")
-                                    
-                            except AttributeError:
-                                print(f"   ⚠️  exchange对象不支持条件单API")
-                            except Exception as e:
-                                print(f"   ⚠️  获取条件单列表失败: {e}")
-                                
-                        elif order_type == 'limit':
-                            # 限价单：使用普通订单API
-                            try:
-                                order_status = self.exchange.fetch_order(order_id, symbol)
-                                print(f"   📊 订单API返回结果: {order_status}")
-                                
-                                if order_status.get('status') in ['open', 'closed']:
-                                    print(f"   ✅ 限价单状态正常: {order_status.get('status')}")
-                                    order_exists = True
-                                elif order_status.get('status') in ['canceled']:
-                                    print(f"   ⚠️  限价单已取消")
-                                else:
-                                    print(f"   📊 限价单状态: {order_status.get('status')}")
-                                    
-                            except Exception as e:
-                                error_msg = str(e)
-                                print(f"   ❌ 限价单查询失败: {error_msg}")
-                                
-                        # 如果订单不存在，从队列移除
-                        if not order_exists:
-                            print(f"   ⚠️  订单不存在，从队列移除")
-                            del self.pending_stop_loss[symbol]
-                            continue
-                            
-                    except Exception as e:
-                        error_msg = str(e)
-                        print(f"   ❌ 订单API错误详情: {error_msg}")
-                        print(f"   🔍 错误类型: {type(e).__name__}")
-                        
-                        if "51603" in error_msg or "Order does not exist" in error_msg or "51600" in error_msg:
-                            print(f"   ⚠️  订单不存在，从队列移除")
-                            del self.pending_stop_loss[symbol]
-                            continue
-                        else:
-                            print(f"   ⚠️  检查订单状态失败: {e}")
-                            continue
-                
-                # 如果价差 ≤ 1%，尝试优化
-                if price_diff_pct <= 0.5:
-                    print(f"   💡 价格接近止损位（≤1%），尝试优化为限价单...")
-                    
-                    # 🔴 先检查：如果限价单会失败（价格已触发），就不要优化
-                    # 获取当前市场价格
-                    side = pending['side']
-                    should_skip = False
-                    
-                    if side == 'long':
-                        # 多单止损：如果当前价 <= 止损价，已经触发了
-                        if current_price <= trigger_price:
-                            print(f"   ⚠️  价格已触发止损 (当前价${current_price:.2f} <= 止损价${trigger_price:.2f})")
-                            print(f"   💡 保持条件单，不优化")
-                            should_skip = True
-                    else:
-                        # 空单止损：如果当前价 >= 止损价，已经触发了
-                        if current_price >= trigger_price:
-                            print(f"   ⚠️  价格已触发止损 (当前价${current_price:.2f} >= 止损价${trigger_price:.2f})")
-                            print(f"   💡 保持条件单，不优化")
-                            should_skip = True
-                    
-                    if should_skip:
-                        continue
-                    
-                    # 取消订单（根据类型选择方法）
-                    cancel_success = False
-                    try:
-                        if pending['conditional_order_id']:
-                            if order_type == 'conditional_limit':
-                                # 条件单：使用专用取消方法
-                                self._cancel_conditional_order(pending['conditional_order_id'], symbol)
-                            else:
-                                # 限价单：使用普通取消方法
-                                self.exchange.cancel_order(pending['conditional_order_id'], symbol)
-                            print(f"   ✅ 已取消订单: {pending['conditional_order_id']}")
-                            cancel_success = True
-                    except Exception as e:
-                        print(f"   ⚠️  取消订单失败: {e}")
-                        # 如果取消失败（可能已经被触发了），就不要继续挂单
-                        print(f"   💡 订单可能已触发，跳过优化")
-                        del self.pending_stop_loss[symbol]
-                        continue
-                    
-                    # 🔴 只有取消成功才尝试挂限价单
-                    if cancel_success:
-                        # 尝试挂限价单
-                        limit_order = self._set_stop_loss_limit(
-                            symbol,
-                            pending['side'],
-                            trigger_price,
-                            pending['amount']
-                        )
-                        
-                        if limit_order and limit_order.get('_order_type') == 'limit':
-                            # 成功挂上限价单：从队列移除
-                            print(f"   ✅ 优化成功！已替换为限价单")
-                            del self.pending_stop_loss[symbol]
-                        elif limit_order and limit_order.get('_order_type') == 'conditional_limit':
-                            # 降级为条件单：更新ID和类型，继续监听
-                            print(f"   💡 降级为条件单，继续监听")
-                            self.pending_stop_loss[symbol]['conditional_order_id'] = limit_order['id']
-                            self.pending_stop_loss[symbol]['order_type'] = 'conditional_limit'
-                        else:
-                            # 失败：移除队列（可能已经被触发了）
-                            print(f"   ⚠️  挂单失败，从队列移除")
-                            del self.pending_stop_loss[symbol]
-                
-            except Exception as e:
-                print(f"   ❌ 检查{symbol}失败: {e}")
-                continue
+        # 🔴 一次拿到所有交易对的最新价（WebSocket推送优先），向量化判断哪些接近止损价
+        last_prices = self._get_last_prices(list(self.pending_stop_loss))
+        near_symbols = self.pending_stop_loss.near(last_prices)
+        
+        # 🔴 只核对离止损价较近（≤STOP_CHECK_BAND）的交易对，远离触发价的止损单本轮不查订单状态
+        check_symbols = self.pending_stop_loss.to_check(last_prices)
+        if logger.isEnabledFor(logging.DEBUG) and len(check_symbols) < len(self.pending_stop_loss):
+            logger.debug("   💤 %s个止损单离触发价较远，本轮跳过", len(self.pending_stop_loss) - len(check_symbols))
+        
+        # 🔴 遍历快照（成交推送的工作线程可能同时写入止损队列），多个交易对并行检查
+        to_remove = self._run_pending_checks(self.pending_stop_loss, self._optimize_stop_loss, last_prices, near_symbols, check_symbols)
+        
+        self._remove_pending(self.pending_stop_loss, to_remove)
         
         if self.pending_stop_loss:
-            print(f"   📋 待优化队列: {len(self.pending_stop_loss)}个")
+            logger.info("   📋 待优化队列: %s个", len(self.pending_stop_loss))
         else:
-            print(f"   ✅ 待优化队列为空")
-        
-        # 🔴 检查当前止损单状态
-        if self.stop_loss_order_id:
-            try:
-                print(f"   🔍 查询止损单状态: {self.stop_loss_order_id} (类型: {self.stop_loss_order_type})")
+            logger.info("   ✅ 待优化队列为空")
+        
+        # 🔴 订单推送在线时止损单结束会实时清理；推送未连接或发生过重连（断线期间可能漏推送）时才用REST核对
+        watcher = self.order_watcher
+        if watcher is not None and watcher.logged_in:
+            if watcher.login_count == self._order_push_login_seen:
+                return
+            self._order_push_login_seen = watcher.login_count
+        
+        # 🔴 逐个交易对核对当前止损单状态（遍历快照：推送线程可能同时清理记录）
+        for symbol, (order_id, order_type) in tuple(self.stop_loss_orders.items()):
+            self._check_stop_loss_order(symbol, order_id, order_type)
+    
+    def _check_stop_loss_order(self, symbol, order_id, order_type):
+        """REST核对单个止损单状态，已成交/已取消/不存在时清空该交易对的止损单记录"""
+        ended = False
+        try:
+            logger.info("   🔍 查询止损单状态: %s %s (类型: %s)", symbol, order_id, order_type)
+            
+            if order_type == 'conditional_limit':
+                # 条件单：使用条件单API（复用本轮查询结果）
+                algo_map = self._get_algo_pending()
                 
-                if self.stop_loss_order_type == 'conditional_limit':
-                    # 条件单：使用条件单API
-                    params = {'ordType': 'conditional'}
-                    response = self.exchange.private_get_trade_orders_algo_pending(params)
-                    
-                    if response.get('code') == '0' and response.get('data'):
-                        # 查找匹配的订单
-                        found = False
-                        for algo_data in response['data']:
-                            if str(algo_data.get('algoId', '')) == str(self.stop_loss_order_id):
-                                state = algo_data.get('state', 'live')
-                                print(f"   ✅ 条件单状态: {state}")
-                                found = True
-                                break
-                        
-                        if not found:
-                            print(f"   ⚠️  条件单不在当前委托列表中")
-                            self.stop_loss_order_id = None
-                            self.stop_loss_order_type = None
-                    else:
-                        print(f"   ⚠️  查询条件单失败: {response.get('msg')}")
-                else:
-                    # 限价单：使用普通订单API
-                    order_status = self.exchange.fetch_order(self.stop_loss_order_id, symbol)
-                    print(f"   📊 OKX API返回结果: {order_status}")
-                    
-                    status = order_status.get('status', 'unknown')
-                    print(f"   🔍 当前止损单状态: {status}")
-                    if status == 'closed':
-                        print(f"   ⚠️  止损单已成交！成交价: ${order_status.get('average', 'unknown')}")
-                        self.stop_loss_order_id = None  # 清空ID
-                        self.stop_loss_order_type = None
-                    elif status == 'canceled':
-                        print(f"   ⚠️  止损单已取消！")
-                        self.stop_loss_order_id = None  # 清空ID
-                        self.stop_loss_order_type = None
+                if algo_map:
+                    found_order = algo_map.get(order_id)
+                    if found_order:
+                        state = found_order.get('state', 'live')
+                        logger.info("   ✅ 条件单状态: %s", state)
                     else:
-                        print(f"   ✅ 止损单状态正常: {status}")
-                        
-            except Exception as e:
-                error_msg = str(e)
-                print(f"   ❌ OKX API错误详情: {error_msg}")
-                print(f"   🔍 错误类型: {type(e).__name__}")
+                        logger.warning("   ⚠️  条件单不在当前委托列表中")
+                        ended = True
+                elif algo_map is not None:
+                    logger.warning("   ⚠️  当前没有活跃的条件单")
+            else:
+                # 限价单：先查本轮共用的当前委托快照，不在其中才单独查询
+                order_status = self._get_order_status(order_id, symbol)
+                logger.debug("   📊 OKX API返回结果: %s", order_status)
                 
-                if "51603" in error_msg or "Order does not exist" in error_msg:
-                    print(f"   ⚠️  止损单不存在（可能已触发或取消）: {self.stop_loss_order_id}")
-                    self.stop_loss_order_id = None  # 清空ID
-                    self.stop_loss_order_type = None
+                status = order_status.get('status', 'unknown')
+                logger.info("   🔍 当前止损单状态: %s", status)
+                if status == 'closed':
+                    logger.warning("   ⚠️  止损单已成交！成交价: $%s", order_status.get('average', 'unknown'))
+                    ended = True
+                elif status == 'canceled':
+                    logger.warning("   ⚠️  止损单已取消！")
+                    ended = True
                 else:
-                    print(f"   ⚠️  检查止损单状态失败: {e}")
+                    logger.info("   ✅ 止损单状态正常: %s", status)
+        
+        except ccxt.OrderNotFound:
+            # 🔴 ccxt已把OKX的51603（订单不存在）映射为OrderNotFound
+            logger.warning("   ⚠️  止损单不存在（可能已触发或取消）: %s", order_id)
+            ended = True
+        except Exception as e:
+            logger.error("   ❌ OKX API错误详情: %r", e)
+            logger.warning("   ⚠️  检查止损单状态失败: %s", e)
+        
+        if ended:
+            self._clear_stop_loss(symbol, order_id)  # 清空ID
 
 if __name__ == '__main__':
     print("🧪 测试 OKX交易接口V2\n")
@@ -6,7 +6,7 @@
 包含：指标信号表、OKX订单表、OKX交易记录表、OKX止损止盈记录表
 """
 
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Float, DateTime, Text, ForeignKey, JSON, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -101,6 +101,10 @@ class OKXOrder(Base):
 class OKXTrade(Base):
     """OKX交易记录表"""
     __tablename__ = 'okx_trades'
+    __table_args__ = (
+        # 查询当前持仓的交易记录（status='open' + symbol）
+        Index('ix_okx_trades_status_symbol', 'status', 'symbol'),
+    )
     
     # 主键
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -212,6 +216,14 @@ def create_all_tables(engine):
     print("✅ 所有数据库表创建成功！")
 
 
+def create_indexes(engine):
+    """补建模型中定义、数据库中还没有的索引（表是用SQL手动建的，create_all 不会给已有的表加索引）"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+    print("✅ 数据库索引检查完成！")
+
+
 def drop_all_tables(engine):
     """删除所有表（谨慎使用）"""
     Base.metadata.drop_all(engine)
@@ -6,15 +6,37 @@
 提供数据的增删改查操作
 """
 
-from sqlalchemy import create_engine
+import logging
+import threading
+from contextlib import contextmanager
+from sqlalchemy import create_engine, update
 from sqlalchemy.orm import sessionmaker, scoped_session
 from datetime import datetime
 import json
+from log_setup import get_queued_logger
 from trading_database_models import (
     Base, IndicatorSignal, OKXOrder, OKXTrade, OKXStopOrder,
     create_all_tables
 )
 
+try:
+    import orjson  # 可选：指标JSON序列化比标准json快数倍
+except ImportError:
+    orjson = None
+
+# 日志经共用队列由后台线程输出，数据库写入路径上不做阻塞的stdout写；LOG_LEVEL 环境变量可调整级别（DEBUG 时输出每条指标信号）
+logger = get_queued_logger(__name__, logging.INFO)
+
+
+def _r2(value):
+    """价格/金额保留两位小数（None原样返回）"""
+    return None if value is None else round(value, 2)
+
+
+def _orjson_dumps(value):
+    """JSON列序列化：numpy数值直接输出，NaN写成null（标准json会写出MySQL不接受的NaN）"""
+    return orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS).decode()
+
 
 class TradingDatabaseService:
     """交易数据库服务"""
@@ -30,7 +52,10 @@ class TradingDatabaseService:
                     'user': 'root',
                     'password': 'your_password',
                     'database': 'trading_db',
-                    'charset': 'utf8mb4'
+                    'charset': 'utf8mb4',
+                    'pool_size': 5,         # 可选，连接池大小
+                    'max_overflow': 10,     # 可选，连接池满时允许临时多开的连接数
+                    'pool_recycle': 1800    # 可选，连接最长复用时间（秒）
                 }
         """
         # 使用默认配置或自定义配置
@@ -57,12 +82,29 @@ class TradingDatabaseService:
             f"?charset={db_config.get('charset', 'utf8mb4')}"
         )
         
-        self.engine = create_engine(connection_string, echo=False, pool_pre_ping=True)
-        self.SessionLocal = scoped_session(sessionmaker(bind=self.engine))
+        # 🔴 连接池：可在配置中用 pool_size/max_overflow 调整；空闲连接定期回收，避免被远端数据库超时断开后首个请求报错
+        # pymysql 的 executemany 会把 INSERT ... VALUES 自动合并成多行插入，批量保存无需额外参数
+        # 🔴 安装了orjson时JSON列（指标字典）用它序列化/解析
+        json_options = {'json_serializer': _orjson_dumps, 'json_deserializer': orjson.loads} if orjson is not None else {}
+        self.engine = create_engine(
+            connection_string,
+            echo=False,
+            pool_pre_ping=True,
+            pool_size=db_config.get('pool_size', 5),
+            max_overflow=db_config.get('max_overflow', 10),
+            pool_recycle=db_config.get('pool_recycle', 1800),
+            **json_options
+        )
+        # 🔴 提交后不让对象属性过期：提交后读取ID、打印字段不再触发一次刷新查询
+        self.SessionLocal = scoped_session(sessionmaker(bind=self.engine, expire_on_commit=False))
+        
+        # 🔴 当前持仓交易记录缓存 {symbol: OKXTrade或None}：交易记录只由本服务开/平，开平时失效，其余时间不再查库
+        self._open_trades = {}
+        self._open_trades_lock = threading.RLock()
         
         # 不自动创建表（表已经通过SQL创建）
         # create_all_tables(self.engine)
-        print(f"✅ 交易数据库服务初始化成功: {db_config['host']}:{db_config['port']}/{db_config['database']}")
+        logger.info("✅ 交易数据库服务初始化成功: %s:%s/%s", db_config['host'], db_config['port'], db_config['database'])
     
     def get_session(self):
         """获取数据库会话"""
@@ -72,8 +114,57 @@ class TradingDatabaseService:
         """关闭会话"""
         session.close()
     
+    @contextmanager
+    def _txn(self):
+        """事务上下文：正常结束时提交，异常时回滚并继续抛出，最后归还连接
+        
+        会话来自 scoped_session，同一线程内一直复用同一个会话对象
+        """
+        session = self.SessionLocal()
+        try:
+            yield session
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+    
     # ==================== 指标信号表操作 ====================
     
+    def _build_indicator_signal(self, timestamp, symbol, timeframe,
+                                open_price, high_price, low_price, close_price, volume,
+                                indicators_dict, signal_type=None, signal_reason=None,
+                                position=None, entry_price=None, stop_loss_level=None,
+                                take_profit_level=None):
+        """构建指标信号记录（参数同 save_indicator_signal）"""
+        # 🔴 价格保留两位小数
+        open_price = _r2(open_price)
+        high_price = _r2(high_price)
+        low_price = _r2(low_price)
+        close_price = _r2(close_price)
+        entry_price = _r2(entry_price)
+        stop_loss_level = _r2(stop_loss_level)
+        take_profit_level = _r2(take_profit_level)
+        
+        return IndicatorSignal(
+            timestamp=timestamp,
+            symbol=symbol,
+            timeframe=timeframe,
+            open_price=open_price,
+            high_price=high_price,
+            low_price=low_price,
+            close_price=close_price,
+            volume=volume,
+            indicators=indicators_dict,  # SQLAlchemy会自动转为JSON
+            signal_type=signal_type,
+            signal_reason=signal_reason,
+            position=position,
+            entry_price=entry_price,
+            stop_loss_level=stop_loss_level,
+            take_profit_level=take_profit_level
+        )
+    
     def save_indicator_signal(self, timestamp, symbol, timeframe, 
                              open_price, high_price, low_price, close_price, volume,
                              indicators_dict, signal_type=None, signal_reason=None,
@@ -98,48 +189,48 @@ class TradingDatabaseService:
         Returns:
             signal_id: 保存的信号ID
         """
-        session = self.get_session()
         try:
-            # 🔴 价格保留两位小数
-            open_price = round(open_price, 2) if open_price is not None else None
-            high_price = round(high_price, 2) if high_price is not None else None
-            low_price = round(low_price, 2) if low_price is not None else None
-            close_price = round(close_price, 2) if close_price is not None else None
-            entry_price = round(entry_price, 2) if entry_price is not None else None
-            stop_loss_level = round(stop_loss_level, 2) if stop_loss_level is not None else None
-            take_profit_level = round(take_profit_level, 2) if take_profit_level is not None else None
-            
-            signal = IndicatorSignal(
-                timestamp=timestamp,
-                symbol=symbol,
-                timeframe=timeframe,
-                open_price=open_price,
-                high_price=high_price,
-                low_price=low_price,
-                close_price=close_price,
-                volume=volume,
-                indicators=indicators_dict,  # SQLAlchemy会自动转为JSON
-                signal_type=signal_type,
-                signal_reason=signal_reason,
-                position=position,
-                entry_price=entry_price,
-                stop_loss_level=stop_loss_level,
-                take_profit_level=take_profit_level
+            signal = self._build_indicator_signal(
+                timestamp, symbol, timeframe,
+                open_price, high_price, low_price, close_price, volume,
+                indicators_dict, signal_type, signal_reason,
+                position, entry_price, stop_loss_level, take_profit_level
             )
             
-            session.add(signal)
-            session.commit()
+            with self._txn() as session:
+                session.add(signal)
             signal_id = signal.id
             
-            print(f"✅ 保存指标信号: ID={signal_id}, 时间={timestamp}, 信号={signal_type}")
+            logger.debug("✅ 保存指标信号: ID=%s, 时间=%s, 信号=%s", signal_id, timestamp, signal_type)
             return signal_id
             
         except Exception as e:
-            session.rollback()
-            print(f"❌ 保存指标信号失败: {e}")
+            logger.error("❌ 保存指标信号失败: %s", e)
             return None
-        finally:
-            self.close_session(session)
+    
+    def save_indicator_signals_bulk(self, rows):
+        """批量保存指标信号（一次提交，executemany批量插入，不逐条往返）
+        
+        Args:
+            rows: save_indicator_signal 参数字典的列表
+        
+        Returns:
+            int: 保存的条数（批量插入不回填ID），失败返回0
+        """
+        if not rows:
+            return 0
+        
+        try:
+            signals = [self._build_indicator_signal(**row) for row in rows]
+            with self._txn() as session:
+                session.bulk_save_objects(signals)
+            
+            logger.info("✅ 批量保存指标信号: %s条", len(rows))
+            return len(rows)
+        
+        except Exception as e:
+            logger.error("❌ 批量保存指标信号失败: %s", e)
+            return 0
     
     # ==================== OKX订单表操作 ====================
     
@@ -152,12 +243,11 @@ class TradingDatabaseService:
         Returns:
             order_db_id: 数据库中的订单ID
         """
-        session = self.get_session()
         try:
             # 🔴 价格保留两位小数
-            price = round(price, 2) if price is not None else None
-            average_price = round(average_price, 2) if average_price is not None else None
-            invested_amount = round(invested_amount, 2) if invested_amount is not None else None
+            price = _r2(price)
+            average_price = _r2(average_price)
+            invested_amount = _r2(invested_amount)
             
             order = OKXOrder(
                 order_id=order_id,
@@ -178,26 +268,26 @@ class TradingDatabaseService:
                 filled_time=filled_time
             )
             
-            session.add(order)
-            session.commit()
+            with self._txn() as session:
+                session.add(order)
             order_db_id = order.id
             
-            print(f"✅ 保存OKX订单: ID={order_db_id}, OKX订单ID={order_id}, 类型={order_type}")
+            logger.info("✅ 保存OKX订单: ID=%s, OKX订单ID=%s, 类型=%s", order_db_id, order_id, order_type)
             return order_db_id
             
         except Exception as e:
-            session.rollback()
-            print(f"❌ 保存OKX订单失败: {e}")
+            logger.error("❌ 保存OKX订单失败: %s", e)
             return None
-        finally:
-            self.close_session(session)
     
     def update_okx_order_status(self, order_id, status, filled=None, average_price=None, filled_time=None):
         """更新OKX订单状态"""
-        session = self.get_session()
         try:
-            order = session.query(OKXOrder).filter_by(order_id=order_id).first()
-            if order:
+            with self._txn() as session:
+                order = session.query(OKXOrder).filter_by(order_id=order_id).first()
+                if not order:
+                    logger.warning("⚠️  未找到订单: %s", order_id)
+                    return False
+                
                 order.status = status
                 if filled is not None:
                     order.filled = filled
@@ -205,19 +295,12 @@ class TradingDatabaseService:
                     order.average_price = average_price
                 if filled_time is not None:
                     order.filled_time = filled_time
-                
-                session.commit()
-                print(f"✅ 更新订单状态: {order_id} -> {status}")
-                return True
-            else:
-                print(f"⚠️  未找到订单: {order_id}")
-                return False
+            
+            logger.info("✅ 更新订单状态: %s -> %s", order_id, status)
+            return True
         except Exception as e:
-            session.rollback()
-            print(f"❌ 更新订单状态失败: {e}")
+            logger.error("❌ 更新订单状态失败: %s", e)
             return False
-        finally:
-            self.close_session(session)
     
     # ==================== OKX交易记录表操作 ====================
     
@@ -231,11 +314,10 @@ class TradingDatabaseService:
         Returns:
             trade_id: 交易记录ID
         """
-        session = self.get_session()
         try:
             # 🔴 价格保留两位小数
-            entry_price = round(entry_price, 2) if entry_price is not None else None
-            invested_amount = round(invested_amount, 2) if invested_amount is not None else None
+            entry_price = _r2(entry_price)
+            invested_amount = _r2(invested_amount)
             
             trade = OKXTrade(
                 symbol=symbol,
@@ -250,19 +332,18 @@ class TradingDatabaseService:
                 open_reason=open_reason  # 🔴 保存开仓原因
             )
             
-            session.add(trade)
-            session.commit()
+            with self._open_trades_lock:
+                with self._txn() as session:
+                    session.add(trade)
+                self._open_trades.pop(symbol, None)
             trade_id = trade.id
             
-            print(f"✅ 创建交易记录: ID={trade_id}, {position_side}, 价格={entry_price}")
+            logger.info("✅ 创建交易记录: ID=%s, %s, 价格=%s", trade_id, position_side, entry_price)
             return trade_id
             
         except Exception as e:
-            session.rollback()
-            print(f"❌ 创建交易记录失败: {e}")
+            logger.error("❌ 创建交易记录失败: %s", e)
             return None
-        finally:
-            self.close_session(session)
     
     def close_okx_trade(self, trade_id, exit_order_id, exit_price, exit_time,
                        exit_reason, exit_signal_id=None,
@@ -283,72 +364,90 @@ class TradingDatabaseService:
         Returns:
             bool: 是否成功
         """
-        session = self.get_session()
         try:
-            trade = session.query(OKXTrade).filter_by(id=trade_id).first()
-            if not trade:
-                print(f"⚠️  未找到交易记录: {trade_id}")
-                return False
-            
             # 🔴 价格保留两位小数
-            exit_price = round(exit_price, 2) if exit_price is not None else None
-            entry_fee = round(entry_fee, 2) if entry_fee is not None else 0
-            exit_fee = round(exit_fee, 2) if exit_fee is not None else 0
-            funding_fee = round(funding_fee, 2) if funding_fee is not None else 0
-            
-            # 更新平仓信息
-            trade.exit_order_id = exit_order_id
-            trade.exit_price = exit_price
-            trade.exit_time = exit_time
-            trade.exit_reason = exit_reason
-            trade.exit_signal_id = exit_signal_id
-            
-            # 更新费用
-            trade.entry_fee = entry_fee
-            trade.exit_fee = exit_fee
-            trade.funding_fee = funding_fee
-            trade.total_fee = round(entry_fee + exit_fee + funding_fee, 2)
+            exit_price = _r2(exit_price)
+            entry_fee = _r2(entry_fee or 0)
+            exit_fee = _r2(exit_fee or 0)
+            funding_fee = _r2(funding_fee or 0)
+            total_fee = round(entry_fee + exit_fee + funding_fee, 2)
             
-            # 计算盈亏（保留两位小数）
-            if trade.position_side == 'long':
-                trade.profit_loss = round((exit_price - trade.entry_price) * trade.amount * 0.01, 2)  # 0.01 ETH/张
-            else:  # short
-                trade.profit_loss = round((trade.entry_price - exit_price) * trade.amount * 0.01, 2)
-            
-            trade.net_profit_loss = round(trade.profit_loss - trade.total_fee, 2)
-            trade.profit_loss_pct = round((trade.profit_loss / trade.invested_amount) * 100, 2)
-            trade.return_rate = round((trade.net_profit_loss / trade.invested_amount) * 100, 2)
-            
-            # 计算持仓时长
-            holding_duration = (exit_time - trade.entry_time).total_seconds()
-            trade.holding_duration = int(holding_duration)
-            
-            # 更新状态
-            trade.status = 'closed'
+            with self._txn() as session:
+                # 🔴 只查计算盈亏需要的开仓字段，盈亏/收益率/持仓时长在Python端按原公式计算，再一条UPDATE写回
+                trade = session.query(
+                    OKXTrade.position_side, OKXTrade.entry_price, OKXTrade.amount,
+                    OKXTrade.invested_amount, OKXTrade.entry_time
+                ).filter_by(id=trade_id).first()
+                if not trade:
+                    logger.warning("⚠️  未找到交易记录: %s", trade_id)
+                    return False
+                
+                # 计算盈亏（保留两位小数）
+                if trade.position_side == 'long':
+                    profit_loss = round((exit_price - trade.entry_price) * trade.amount * 0.01, 2)  # 0.01 ETH/张
+                else:  # short
+                    profit_loss = round((trade.entry_price - exit_price) * trade.amount * 0.01, 2)
+                net_profit_loss = round(profit_loss - total_fee, 2)
+                return_rate = round((net_profit_loss / trade.invested_amount) * 100, 2)
+                
+                session.execute(
+                    update(OKXTrade)
+                    .where(OKXTrade.id == trade_id)
+                    .values(
+                        # 更新平仓信息
+                        exit_order_id=exit_order_id,
+                        exit_price=exit_price,
+                        exit_time=exit_time,
+                        exit_reason=exit_reason,
+                        exit_signal_id=exit_signal_id,
+                        # 更新费用
+                        entry_fee=entry_fee,
+                        exit_fee=exit_fee,
+                        funding_fee=funding_fee,
+                        total_fee=total_fee,
+                        # 盈亏
+                        profit_loss=profit_loss,
+                        net_profit_loss=net_profit_loss,
+                        profit_loss_pct=round((profit_loss / trade.invested_amount) * 100, 2),
+                        return_rate=return_rate,
+                        # 持仓时长（秒）
+                        holding_duration=int((exit_time - trade.entry_time).total_seconds()),
+                        # 更新状态
+                        status='closed'
+                    )
+                    .execution_options(synchronize_session=False)
+                )
             
-            session.commit()
+            self._forget_open_trade(trade_id)
             
-            print(f"✅ 关闭交易记录: ID={trade_id}, 盈亏={trade.net_profit_loss:.2f} USDT, 收益率={trade.return_rate:.2f}%")
+            logger.info("✅ 关闭交易记录: ID=%s, 盈亏=%.2f USDT, 收益率=%.2f%%", trade_id, net_profit_loss, return_rate)
             return True
             
         except Exception as e:
-            session.rollback()
-            print(f"❌ 关闭交易记录失败: {e}")
+            logger.error("❌ 关闭交易记录失败: %s", e)
             return False
-        finally:
-            self.close_session(session)
     
     def get_open_trade(self, symbol=None):
-        """获取当前打开的交易记录"""
-        session = self.get_session()
-        try:
-            query = session.query(OKXTrade).filter_by(status='open')
-            if symbol:
-                query = query.filter_by(symbol=symbol)
-            trade = query.first()
-            return trade
-        finally:
-            self.close_session(session)
+        """获取当前打开的交易记录
+        
+        按交易对查询时结果（包括没有持仓）会被缓存，直到该交易对开仓或其交易记录被平仓
+        """
+        if not symbol:
+            with self._txn() as session:
+                return session.query(OKXTrade).filter_by(status='open').first()
+        
+        with self._open_trades_lock:
+            if symbol not in self._open_trades:
+                with self._txn() as session:
+                    self._open_trades[symbol] = session.query(OKXTrade).filter_by(status='open', symbol=symbol).first()
+            return self._open_trades[symbol]
+    
+    def _forget_open_trade(self, trade_id):
+        """交易记录平仓后，清除缓存中对应的交易对"""
+        with self._open_trades_lock:
+            for symbol, trade in list(self._open_trades.items()):
+                if trade is not None and trade.id == trade_id:
+                    del self._open_trades[symbol]
     
     # ==================== OKX止损止盈记录表操作 ====================
     
@@ -365,12 +464,11 @@ class TradingDatabaseService:
         Returns:
             stop_order_id: 止损止盈记录ID
         """
-        session = self.get_session()
         try:
             # 🔴 价格保留两位小数
-            trigger_price = round(trigger_price, 2) if trigger_price is not None else None
-            order_price = round(order_price, 2) if order_price is not None else None
-            old_trigger_price = round(old_trigger_price, 2) if old_trigger_price is not None else None
+            trigger_price = _r2(trigger_price)
+            order_price = _r2(order_price)
+            old_trigger_price = _r2(old_trigger_price)
             
             stop_order = OKXStopOrder(
                 order_id=order_id,
@@ -388,73 +486,62 @@ class TradingDatabaseService:
                 update_reason=update_reason
             )
             
-            session.add(stop_order)
-            session.commit()
+            with self._txn() as session:
+                session.add(stop_order)
             stop_order_id = stop_order.id
             
             if old_trigger_price:
-                print(f"✅ 保存止损止盈记录（更新）: ID={stop_order_id}, 类型={order_type}, {old_trigger_price:.2f}->{trigger_price:.2f}")
+                logger.info("✅ 保存止损止盈记录（更新）: ID=%s, 类型=%s, %.2f->%.2f", stop_order_id, order_type, old_trigger_price, trigger_price)
             else:
-                print(f"✅ 保存止损止盈记录: ID={stop_order_id}, 类型={order_type}, 触发价={trigger_price}")
+                logger.info("✅ 保存止损止盈记录: ID=%s, 类型=%s, 触发价=%s", stop_order_id, order_type, trigger_price)
             return stop_order_id
             
         except Exception as e:
-            session.rollback()
-            print(f"❌ 保存止损止盈记录失败: {e}")
+            logger.error("❌ 保存止损止盈记录失败: %s", e)
             return None
-        finally:
-            self.close_session(session)
     
     def update_stop_order(self, order_id, new_trigger_price, update_reason, signal_id=None):
         """更新止损止盈单（动态更新时调用）"""
-        session = self.get_session()
         try:
-            stop_order = session.query(OKXStopOrder).filter_by(order_id=order_id).first()
-            if stop_order:
+            with self._txn() as session:
+                stop_order = session.query(OKXStopOrder).filter_by(order_id=order_id).first()
+                if not stop_order:
+                    logger.warning("⚠️  未找到止损止盈单: %s", order_id)
+                    return False
+                
                 stop_order.old_trigger_price = stop_order.trigger_price
                 stop_order.trigger_price = new_trigger_price
                 stop_order.update_reason = update_reason
                 stop_order.update_count += 1
                 if signal_id:
                     stop_order.signal_id = signal_id
-                
-                session.commit()
-                print(f"✅ 更新止损止盈单: {order_id}, {stop_order.old_trigger_price:.2f} -> {new_trigger_price:.2f}")
-                return True
-            else:
-                print(f"⚠️  未找到止损止盈单: {order_id}")
-                return False
+            
+            logger.info("✅ 更新止损止盈单: %s, %.2f -> %.2f", order_id, stop_order.old_trigger_price, new_trigger_price)
+            return True
         except Exception as e:
-            session.rollback()
-            print(f"❌ 更新止损止盈单失败: {e}")
+            logger.error("❌ 更新止损止盈单失败: %s", e)
             return False
-        finally:
-            self.close_session(session)
     
     def update_stop_order_status(self, order_id, status, triggered_at=None, canceled_at=None):
         """更新止损止盈单状态"""
-        session = self.get_session()
         try:
-            stop_order = session.query(OKXStopOrder).filter_by(order_id=order_id).first()
-            if stop_order:
+            with self._txn() as session:
+                stop_order = session.query(OKXStopOrder).filter_by(order_id=order_id).first()
+                if not stop_order:
+                    logger.warning("⚠️  未找到止损止盈单: %s", order_id)
+                    return False
+                
                 stop_order.status = status
                 if triggered_at:
                     stop_order.triggered_at = triggered_at
                 if canceled_at:
                     stop_order.canceled_at = canceled_at
-                
-                session.commit()
-                print(f"✅ 更新止损止盈单状态: {order_id} -> {status}")
-                return True
-            else:
-                print(f"⚠️  未找到止损止盈单: {order_id}")
-                return False
+            
+            logger.info("✅ 更新止损止盈单状态: %s -> %s", order_id, status)
+            return True
         except Exception as e:
-            session.rollback()
-            print(f"❌ 更新止损止盈单状态失败: {e}")
+            logger.error("❌ 更新止损止盈单状态失败: %s", e)
             return False
-        finally:
-            self.close_session(session)
     
     # ==================== 简化方法名（别名） ====================
     